@@ -4,6 +4,11 @@ from math import sin, cos, radians
 
 from utils import format, my_eval
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 class Alignment:
     r'''Applies a rotation and translation to a point.
@@ -27,6 +32,8 @@ class Alignment:
     def set_angle(self, angle):
         self.angle = angle
         self.radians = radians(angle)
+        self.sin = sin(self.radians)
+        self.cos = cos(self.radians)
 
     def rotate(self, pt):
         s, c = self.sin, self.cos
@@ -52,6 +59,79 @@ class Alignment:
     def unalign(self, pts):
         return [self.unalign_pt(p) for p in pts]
 
+    def align_array(self, points, offsets=None, size=None, origin=(0, 0)):
+        r'''Aligns a whole block of tiles at once.
+
+        `points` is (number of tiles, points per tile, 2).  If `offsets` is given, it is
+        (number of tiles, 2) and each tile's offset is added to its points before they
+        are aligned.
+
+        Returns aligned_points, mask.  If `size` (width, height) is given, `mask` has a
+        True/False for each tile saying whether it is visible in the area of that size
+        with its lower-left corner at `origin` (see render.Render_target.visible).
+        Otherwise, `mask` is None.
+
+        Uses NumPy if it's installed, otherwise aligns the points one at a time.
+        '''
+        if np is None:
+            if offsets is not None:
+                points = [[(x + x_off, y + y_off) for x, y in tile_points]
+                          for tile_points, (x_off, y_off) in zip(points, offsets)]
+            aligned_points = [self.align(tile_points) for tile_points in points]
+            if size is None:
+                return aligned_points, None
+            return aligned_points, [visible(tile_points, size, origin)
+                                    for tile_points in aligned_points]
+        points = np.asarray(points, dtype=float)
+        if offsets is not None:
+            points = points + np.asarray(offsets, dtype=float)[:, np.newaxis, :]
+        x, y = points[..., 0], points[..., 1]
+        aligned_points = np.empty_like(points)
+        aligned_points[..., 0] = x * self.cos - y * self.sin + float(self.x_offset)
+        aligned_points[..., 1] = x * self.sin + y * self.cos + float(self.y_offset)
+        if size is None:
+            return aligned_points, None
+        return aligned_points, visible_mask(aligned_points, size, origin)
+
+    def unalign_array(self, points):
+        r'''The inverse of align_array (without offsets or size).  `points` is (..., 2).
+
+        Returns the unaligned points.
+        '''
+        if np is None:
+            if points and isinstance(points[0][0], (tuple, list)):
+                return [self.unalign(tile_points) for tile_points in points]
+            return self.unalign(points)
+        points = np.asarray(points, dtype=float)
+        x = points[..., 0] - float(self.x_offset)
+        y = points[..., 1] - float(self.y_offset)
+        unaligned_points = np.empty_like(points)
+        unaligned_points[..., 0] = x * self.cos + y * self.sin
+        unaligned_points[..., 1] = y * self.cos - x * self.sin
+        return unaligned_points
+
+
+def visible(points, size, origin=(0, 0)):
+    r'''Same as render.Render_target.visible for a canvas of `size` (width, height),
+    with its lower-left corner at `origin`.
+    '''
+    left, bottom = origin
+    right, top = left + size[0], bottom + size[1]
+    return any(x > left for x, _ in points) and any(x < right for x, _ in points) and \
+           any(y > bottom for _, y in points) and any(y < top for _, y in points)
+
+
+def visible_mask(aligned_points, size, origin=(0, 0)):
+    r'''Returns a bool array with whether each tile in `aligned_points` (number of tiles,
+    points per tile, 2) is visible on a canvas of `size` (width, height), with its
+    lower-left corner at `origin`.
+    '''
+    left, bottom = float(origin[0]), float(origin[1])
+    right, top = left + float(size[0]), bottom + float(size[1])
+    x, y = aligned_points[..., 0], aligned_points[..., 1]
+    return (x > left).any(axis=-1) & (x < right).any(axis=-1) & \
+           (y > bottom).any(axis=-1) & (y < top).any(axis=-1)
+
 
 
 if __name__ == "__main__":
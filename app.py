@@ -1,10 +1,10 @@
 # app.py
 
-from math import hypot
 from tkinter import *
 from tkinter.ttk import *
 
 from utils import f_to_str
+from render import Render_target
 
 
 class App(Frame):
@@ -36,7 +36,11 @@ class App(Frame):
                 self.canvas.create_my_rectangle("test yellow", 30.25, 12, 2, 2, "yellow")
 
 
-class MyCanvasBase(Canvas):
+class MyCanvasBase(Canvas, Render_target):
+    def __init__(self, parent, **kwargs):
+        Canvas.__init__(self, parent, **kwargs)
+        self.image_items = {}   # {item: fn() returning its image at the current scale}
+
     def create_my_rectangle(self, caller, left_x, bottom_y, width, height, color,
                             tags=()):
         #print(f"create_my_rectangle({caller=}, left_x={f_to_str(left_x)}, "
@@ -72,51 +76,142 @@ class MyCanvasBase(Canvas):
         return self.create_image(x, y, anchor=SW,
                                  image=image, tags=tags + ("math",))
 
-    def create_canvas(self, caller, pos, size, tags=()):
-        new_canvas = MyNestedCanvas(self, size, bd=0, bg=self.current_grout_color)
-        new_canvas.current_grout_color = self.current_grout_color
-        x_px, y_px = self.math_coord(pos)
-        print(f"create_canvas {caller=}, pos={f_to_str(pos)}, pos_px=({x_px}, {y_px}), "
-              f"size={f_to_str(size)}")
-        item = self.create_window(x_px, y_px, anchor=SW,
-                                  window=new_canvas, tags=tags)
-        return new_canvas, item
-
-    def visible(self, points):
-        r'''True if there are points to the right of 0, left of width_in,
-        above 0, and below height_in.
-
-        These don't have to be the same point.  For example one point might be x < 0,
-	which counts for left of width_in, but not right of 0.  Another point might
-        be > width_in, which counts the other way.
+    def erase_all(self):
+        self.delete("all")
+        self.image_items = {}
+
+    def erase_tiles(self):
+        self.delete("section")
+        self.delete("tile")
+        self.image_items = {item: get_image for item, get_image in self.image_items.items()
+                                            if self.type(item)}
+
+    def set_grout_color(self, color):
+        self.itemconfig("grout", fill=color)
+        self.current_grout_color = color
+
+    def clip_to_wall(self, width_in, height_in):
+        r'''Covers the canvas outside of the wall with the canvas background color.
         '''
-        to_right = to_left = to_top = to_bottom = False
-        for x, y in points:
-            if x > 0: to_right = True
-            if x < self.width_in: to_left = True
-            if y > 0: to_top = True
-            if y < self.height_in: to_bottom = True
-        return all((to_left, to_right, to_top, to_bottom))
+        bg_color = self.cget('background')
+        width, height = self.size()
+
+        # clip above grout background, across entire canvas
+        if height > self.in_to_px(height_in):
+            self.create_my_rectangle(
+              "grout clip above", 0, height_in,
+              self.px_to_in(width), self.px_to_in(height) - height_in,
+              bg_color, ("background", "topmost", "clip"))
+
+        # clip to the right of grout background
+        if width > self.in_to_px(width_in):
+            self.create_my_rectangle(
+              "grout clip right", width_in, 0,
+              self.px_to_in(width) - width_in, height_in,
+              bg_color, ("background", "topmost", "clip"))
+
+    def create_panel_image(self, caller, panel, tags=()):
+        item = self.create_my_image(caller, panel.get_image(self.my_scale), (0, 0),
+                                    panel.pos, tags)
+        self.image_items[item] = lambda: panel.get_image(self.my_scale)
+        return item
+
+    def lower_below_topmost(self, tag_or_id):
+        if self.find_withtag("topmost"):
+            self.tag_lower(tag_or_id, "topmost")
+
+    def create_tiles(self, placed_tiles, section=False):
+        r'''Creates all of the tiles, then lowers them below the "topmost" items in one go.
+
+        Tiles that aren't in a section are lowered below all of the sections.
+        '''
+        tags = ('section',) if section else ('tile',)
+        for placed in placed_tiles:
+            if placed.color is None and placed.clip is not None:
+                # cropped to its section
+                clipped = placed.tile.get_clipped_image(placed.angle, placed.points,
+                                                        placed.clip)
+                if clipped is None:
+                    continue
+                sw_corner, image = clipped
+                item = self.create_my_image("plan", image, (0, 0), sw_corner, tags=tags)
+                self.image_items[item] = \
+                  lambda placed=placed: placed.tile.get_clipped_image(
+                                          placed.angle, placed.points, placed.clip)[1]
+            elif placed.color is None:
+                sw_offset, image = placed.tile.get_image(placed.angle, placed.points)
+                item = self.create_my_image("plan", image, sw_offset, placed.points[0],
+                                            tags=tags)
+                self.image_items[item] = \
+                  lambda placed=placed: placed.tile.get_image(placed.angle, placed.points)[1]
+            else:
+                self.create_my_polygon("plan", placed.color, *placed.points, tags=tags)
+        if placed_tiles:
+            if section or not self.find_withtag("section"):
+                self.lower_below_topmost(tags[0])
+            else:
+                self.tag_lower("tile", "section")
+
+    def create_section_grout(self, pos, size):
+        self.create_my_rectangle("section", pos[0], pos[1], size[0], size[1],
+                                 self.current_grout_color, ("section", "grout"))
+        self.lower_below_topmost("section")
+
+    def rescale(self, factor, y_origin=0):
+        r'''Rescales everything drawn here by `factor` around pixel (0, y_origin).
+
+        Tk scales the coordinates of all of the items, but not the images themselves,
+        so those are redone here (at the new scale).
+        '''
+        self.scale("all", 0, y_origin, factor, factor)
+        for item, get_image in self.image_items.items():
+            self.itemconfig(item, image=get_image())
 
 
 class MyCanvas(MyCanvasBase):
+    # milliseconds to wait for more <Configure> events before redrawing
+    resize_delay = 100
+
     def __init__(self, parent, **kwargs):
         MyCanvasBase.__init__(self, parent, **kwargs)
         self.bind("<Configure>", self.on_resize)
         self.my_width = self.winfo_reqwidth() - 2     # pixels
         self.my_height = self.winfo_reqheight() - 2   # pixels
         self.my_scale = 10  # pixels/tile-inch
+        self.resize_job = None
         print(f"MyCanvas.__init__: {self.size()=}")
 
     def on_resize(self, event):
-        dheight = event.height - self.my_height
-        print(f"{event.height=}, {self.my_height=}, {dheight=}")
-        self.my_width = event.width
-        self.my_height = event.height
-        self.config(width=event.width, height=event.height)
-        print(f"on_resize: ({event.width=}, {event.height=}, "
+        r'''Dragging the window edge sends a burst of <Configure> events.  These are
+        coalesced into one call to `resized` once they stop for resize_delay msecs.
+        '''
+        self.new_size = event.width, event.height
+        if self.resize_job is not None:
+            self.after_cancel(self.resize_job)
+        self.resize_job = self.after(self.resize_delay, self.resized)
+
+    def resized(self):
+        r'''Fits what's drawn to the new canvas size.
+
+        The layout doesn't need to be redone, since what's visible is decided in wall
+        inches, which don't change.  So everything drawn is just rescaled and moved
+        to the new size in one go (see rescale), and the clipping outside of the
+        wall redone.
+        '''
+        self.resize_job = None
+        old_height, old_scale = self.my_height, self.my_scale
+        self.my_width, self.my_height = self.new_size
+        self.config(width=self.my_width, height=self.my_height)
+        print(f"resized: {self.size()=}, "
               f"({self.winfo_reqwidth()=}, {self.winfo_reqheight()=}")
-        #self.move("math", 0, dheight)
+        if not hasattr(self, 'width_in'):
+            # nothing drawn to scale yet
+            return
+        self.fit_scale()
+        self.delete("clip")
+        self.rescale(self.my_scale / old_scale, old_height)
+        self.move("all", 0, self.my_height - old_height)
+        self.clip_to_wall(self.width_in, self.height_in)
 
     def in_to_px(self, in_):
         return float(in_) * self.my_scale
@@ -125,15 +220,17 @@ class MyCanvas(MyCanvasBase):
         return px / self.my_scale
 
     def set_scale(self, width_in, height_in):
-        self.width_in = width_in
-        self.height_in = height_in
-        self.diagonal = hypot(width_in, height_in)
-        self.boundary = (0, 0), (width_in, 0), (width_in, height_in), (0, height_in)
+        self.set_size(width_in, height_in)
+        self.fit_scale()
+        print(f"set_scale(width_in={f_to_str(width_in)}, height_in={f_to_str(height_in)}) "
+              f"{self.my_scale=:.3f}")
+
+    def fit_scale(self):
+        r'''Sets my_scale to fit width_in x height_in in the canvas.
+        '''
         width, height = self.size()
         self.my_scale = min(width / float(self.width_in),
                             height / float(self.height_in))
-        print(f"set_scale(width_in={f_to_str(width_in)}, height_in={f_to_str(height_in)}) "
-              f"{self.my_scale=:.3f}")
         print(f"new size in inches: "
               f"{self.px_to_in(width):.3f} W x {self.px_to_in(height):.3f} H")
 
@@ -152,38 +249,6 @@ class MyCanvas(MyCanvasBase):
         return self.in_to_px(point[0]), self.my_height - self.in_to_px(point[1])
 
 
-class MyNestedCanvas(MyCanvasBase):
-    def __init__(self, parent, size, **kwargs):
-        MyCanvasBase.__init__(self, parent,
-                              width=parent.in_to_px(size[0]),
-                              height=parent.in_to_px(size[1]),
-                              **kwargs)
-        self.parent = parent
-        width_in, height_in = size
-        self.width_in = min(width_in, parent.width_in)
-        self.height_in = min(height_in, parent.height_in)
-        self.diagonal = hypot(self.width_in, self.height_in)
-        self.boundary = ((0, 0), (self.width_in, 0), (self.width_in, self.height_in),
-                         (0, self.height_in))
-        print(f"MyNestedCanvas, {self.parent=}, "
-              f"size={f_to_str((self.width_in, self.height_in))}")
-
-    def in_to_px(self, in_):
-        return self.parent.in_to_px(in_)
-
-    def px_to_in(self, px):
-        return self.parent.px_to_in(px)
-
-    def math_coord(self, point):
-        r'''Flips Y coord from video coord to math coord.
-
-        So that 0 is at the bottom and it grows up.
-
-        Also converts from inches to pixels.
-        '''
-        return self.in_to_px(point[0]), self.in_to_px(self.height_in - point[1])
-
-
 def fix(thing, row=None, col=None, **kwargs):
     #thing.pack(expand=True, fill="both")
     if row is not None:
@@ -0,0 +1,150 @@
+# batch.py
+
+r'''Lays out many plans at once from the command line, to compare them.
+
+    python batch.py [--wall PATTERN] [--plan PATTERN] [--jobs N] [--images DIR] [--fast]
+
+The data files are loaded once, then the plans are laid out (without Tk) spread over
+a pool of processes.  For each plan this prints how long the layout took, how many
+tiles it uses whole and cut (see takeoff.py), and how much is cut off.  With
+--images, each layout is also written to DIR as a PNG file (see export.py).
+'''
+
+import os
+import io
+import contextlib
+from fnmatch import fnmatchcase
+from time import perf_counter
+from collections import namedtuple
+from multiprocessing import Pool
+
+import app
+from render import Memory_canvas, lay_out
+from takeoff import count_tiles
+from export import export_png
+
+
+Result = namedtuple('Result', 'wall plan seconds whole cut area waste image error')
+
+
+def load_data(exact=None):
+    r'''Loads the data files (see doit.load), unless they're already loaded.
+
+    The traces asked for in the yaml files are turned off (see Plan.traces), since
+    the output of the processes would be mixed together.  Anything else the plans
+    print (like warnings) still shows.
+
+    Runs in each worker process.  When the processes are forked, they already have the
+    data loaded by the main process.
+    '''
+    from plan import Plan
+    import doit
+
+    if exact is not None:
+        Plan.exact = exact
+    Plan.traces = False
+    if not hasattr(app, 'Settings'):
+        with contextlib.redirect_stdout(io.StringIO()):
+            doit.load(Memory_canvas())
+
+
+def select_plans(wall_pattern='*', plan_pattern='*'):
+    r'''Returns [(wall_name, plan_name)] for the plans in settings.yaml matching the
+    patterns (see fnmatch).
+    '''
+    return [(wall_name, plan_name)
+            for wall_name, wall_settings in app.Settings['wall_settings'].items()
+             if fnmatchcase(wall_name, wall_pattern)
+            for plan_name in wall_settings['plans']
+             if fnmatchcase(plan_name, plan_pattern)]
+
+
+def run_plan(wall_name, plan_name, image_dir=None, scale=10):
+    r'''Lays out one plan, returning a Result.
+    '''
+    start = perf_counter()
+    try:
+        wall = app.Walls[wall_name]
+        plan = app.Settings['wall_settings'][wall_name]['plans'][plan_name]
+        canvas = lay_out(wall, plan)
+        seconds = perf_counter() - start
+        counts = count_tiles(canvas, wall)
+        image = None
+        if image_dir is not None:
+            image = os.path.join(image_dir,
+                                 f"{wall_name}-{plan_name}.png".replace(' ', '_'))
+            export_png(canvas, image, scale)
+    except Exception as e:
+        return Result(wall_name, plan_name, perf_counter() - start, 0, 0, 0, 0, None,
+                      repr(e))
+    return Result(wall_name, plan_name, seconds,
+                  sum(count.whole for count in counts), sum(count.cut for count in counts),
+                  float(sum(count.area for count in counts)),
+                  float(sum(count.waste for count in counts)),
+                  image, None)
+
+
+def run_plans(plans, jobs=None, image_dir=None, scale=10, exact=None):
+    r'''Generates a Result for each (wall_name, plan_name) in `plans`, as they finish.
+
+    Uses `jobs` processes (default os.cpu_count()), or just this process if `jobs`
+    is 1.
+    '''
+    args = [(wall_name, plan_name, image_dir, scale) for wall_name, plan_name in plans]
+    if jobs == 1:
+        load_data(exact)
+        for arg in args:
+            yield run_plan(*arg)
+    else:
+        with Pool(jobs, initializer=load_data, initargs=(exact,)) as pool:
+            yield from pool.imap_unordered(run_plan_args, args)
+
+
+def run_plan_args(args):
+    return run_plan(*args)
+
+
+def print_result(result):
+    name = f"{result.wall}: {result.plan}"
+    if result.error is not None:
+        print(f"{name:40} failed after {result.seconds:.2f} secs: {result.error}")
+    else:
+        print(f"{name:40} {result.seconds:6.2f} secs {result.whole:5} whole "
+              f"{result.cut:5} cut {result.waste / 144:7.2f} sq ft waste")
+
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--wall", default='*', help="pattern of wall names, default all")
+    parser.add_argument("--plan", default='*', help="pattern of plan names, default all")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="number of processes, default one per cpu")
+    parser.add_argument("--images", metavar="DIR",
+                        help="write a PNG file for each plan to DIR")
+    parser.add_argument("--scale", type=float, default=10,
+                        help="pixels per inch in the images, default 10")
+    parser.add_argument("--fast", action="store_true",
+                        help="place tiles using floats rather than Fractions")
+
+    args = parser.parse_args()
+    exact = False if args.fast else None
+
+    start = perf_counter()
+    load_data(exact)
+    plans = select_plans(args.wall, args.plan)
+    if args.images is not None:
+        os.makedirs(args.images, exist_ok=True)
+    print(f"laying out {len(plans)} plans")
+    results = []
+    for result in run_plans(plans, args.jobs, args.images, args.scale, exact):
+        print_result(result)
+        results.append(result)
+    print()
+    print("by wall, then waste:")
+    for result in sorted(results, key=lambda result: (result.error is not None,
+                                                      result.wall, result.waste)):
+        print_result(result)
+    print(f"done in {perf_counter() - start:.1f} seconds")
@@ -0,0 +1,118 @@
+# clip.py
+
+r'''Polygon clipping.
+
+Polygons are sequences of (x, y) points.  The arithmetic is done in whatever the
+points are in, so Fractions stay exact.
+'''
+
+
+def clip_to_rect(points, left, bottom, right, top):
+    r'''Clips the polygon with `points` to the rectangle (Sutherland-Hodgman).
+
+    Returns the points of the clipped polygon, or None if none of it is inside the
+    rectangle.  Returns `points` itself if all of it is inside the rectangle.
+    '''
+    if all(left <= x <= right and bottom <= y <= top for x, y in points):
+        return points
+    points = clip_edge(points, lambda pt: pt[0] >= left, lambda p, q: x_cross(p, q, left))
+    points = clip_edge(points, lambda pt: pt[0] <= right, lambda p, q: x_cross(p, q, right))
+    points = clip_edge(points, lambda pt: pt[1] >= bottom, lambda p, q: y_cross(p, q, bottom))
+    points = clip_edge(points, lambda pt: pt[1] <= top, lambda p, q: y_cross(p, q, top))
+    return cleanup(points)
+
+
+def clip_to_half_plane(points, a, b):
+    r'''Clips the polygon with `points` to the left of the line from point a to b.
+
+    Returns the points of the clipped polygon, or None if none of it is left of the
+    line.  Returns `points` itself if all of it is left of (or on) the line.
+    '''
+    (ax, ay), (bx, by) = a, b
+    def side(pt):
+        return (bx - ax) * (pt[1] - ay) - (by - ay) * (pt[0] - ax)
+    if all(side(pt) >= 0 for pt in points):
+        return points
+    def cross(p, q):
+        p_side, q_side = side(p), side(q)
+        t = p_side / (p_side - q_side)
+        return p[0] + (q[0] - p[0]) * t, p[1] + (q[1] - p[1]) * t
+    return cleanup(clip_edge(points, lambda pt: side(pt) >= 0, cross))
+
+
+def cut_out(points, hole):
+    r'''Cuts the convex polygon `hole` (counterclockwise) out of the polygon with `points`.
+
+    Returns the pieces left as a list of polygons, which is empty if the hole covers
+    all of it, and [points] if the hole doesn't overlap it (just touching doesn't
+    count).
+
+    Each piece is the part of the polygon outside of one of the hole's edges, but
+    inside all of the edges before it.
+    '''
+    pieces = []
+    rest = points
+    for a, b in zip(hole, hole[1:] + hole[:1]):
+        outside = clip_to_half_plane(rest, b, a)
+        if outside is points:
+            return [points]
+        if outside is not None:
+            pieces.append(outside)
+        rest = clip_to_half_plane(rest, a, b)
+        if rest is None:
+            # nothing inside of the hole
+            return [points]
+    return pieces
+
+
+def cleanup(points):
+    r'''Drops the repeated points left where a polygon was cut at a corner.
+
+    Returns None if there's nothing left of the polygon.
+    '''
+    points = [pt for i, pt in enumerate(points) if pt != points[i - 1]]
+    if len(points) < 3 or area(points) == 0:
+        return None
+    return points
+
+
+def clip_edge(points, inside, cross):
+    r'''Clips the polygon with `points` to one edge.
+
+    inside(pt) is True if `pt` is on the inside of the edge, and cross(p, q) is where
+    the line from p to q crosses the edge.
+    '''
+    ans = []
+    if not points:
+        return ans
+    prev = points[-1]
+    prev_inside = inside(prev)
+    for pt in points:
+        pt_inside = inside(pt)
+        if pt_inside:
+            if not prev_inside:
+                ans.append(cross(prev, pt))
+            ans.append(pt)
+        elif prev_inside:
+            ans.append(cross(prev, pt))
+        prev, prev_inside = pt, pt_inside
+    return ans
+
+
+def area(points):
+    r'''The area of the polygon with `points` (shoelace formula).
+    '''
+    return abs(sum(x0 * y1 - x1 * y0
+                   for (x0, y0), (x1, y1) in zip(points, points[1:] + points[:1]))) / 2
+
+
+def x_cross(p, q, x):
+    r'''Where the line from p to q crosses `x`.
+    '''
+    return x, p[1] + (q[1] - p[1]) * (x - p[0]) / (q[0] - p[0])
+
+
+def y_cross(p, q, y):
+    r'''Where the line from p to q crosses `y`.
+    '''
+    return p[0] + (q[0] - p[0]) * (y - p[1]) / (q[1] - p[1]), y
@@ -0,0 +1,134 @@
+# cuts.py
+
+r'''The cut list: how each tile laid out on a wall has to be cut to fit.
+
+The tiles recorded on a render.Memory_canvas are drawn whole, and left to the wall's
+clipping and panels to hide what doesn't show.  Here each tile is clipped to the
+wall, and has the wall's opaque panels (and the sections drawn over it) cut out of
+it, leaving just the pieces of tile that actually go on the wall.
+'''
+
+from math import cos, sin, radians
+from fractions import Fraction
+from collections import namedtuple
+
+from utils import f_to_str
+from clip import clip_to_rect, cut_out, area
+
+
+# The pieces of one tile after cutting:
+#
+#   placed   - the render.Placed_tile
+#   pieces   - polygons (in wall inches) left of the tile
+#   area     - the area of the pieces
+#   cut_area - the area cut off of the tile (0 if the tile wasn't cut, see
+#              Area_tolerance)
+#   dims     - (width, height) of what's left of the tile (all of the pieces
+#              together), in the tile's orientation (not turned on the wall)
+Cut = namedtuple('Cut', 'placed pieces area cut_area dims')
+
+# Areas (in square inches) this small are just float noise: pieces this small are
+# dropped, and tiles with this little cut off aren't cut.
+Area_tolerance = 1e-6
+
+
+def cut_tiles(canvas, wall):
+    r'''Returns a Cut for each of the tiles on `canvas` (a render.Memory_canvas) that
+    shows on `wall`.
+
+    This is done in floats, even if the tiles were placed in Fractions.
+    '''
+    width_in, height_in = float(wall.grout[0]), float(wall.grout[1])
+    section_holes = [to_floats([(x, y), (x + width, y), (x + width, y + height),
+                                (x, y + height)])
+                     for (x, y), (width, height) in canvas.sections]
+    panel_holes = {}   # {panel name: outline}
+    cuts = []
+    for i, placed in enumerate(canvas.tiles):
+        points = clip_to_rect(to_floats(placed.points), 0, 0, width_in, height_in)
+        if points is not None and placed.clip is not None:
+            # an image tile in a section
+            points = clip_to_rect(points, *map(float, placed.clip))
+        if points is None:
+            continue
+        pieces = [points]
+        holes = []
+        for panel in wall.panel_index.overlapping(points):
+            if panel.name not in panel_holes:
+                panel_holes[panel.name] = to_floats(panel.outline())
+            holes.append(panel_holes[panel.name])
+        if i < canvas.num_unsectioned:
+            holes.extend(section_holes)
+        for hole in holes:
+            pieces = [piece for p in pieces for piece in cut_out(p, hole)]
+        # Slivers left by float noise along the edges aren't pieces of tile.
+        pieces = [piece for piece in pieces if area(piece) > Area_tolerance]
+        if not pieces:
+            continue
+        # The tile may already have been cut before it got here (clipped to its
+        # section), so what's left is always compared to the whole tile.
+        pieces_area = sum(area(piece) for piece in pieces)
+        cut_area = float(area(placed.tile.points)) - pieces_area
+        if cut_area <= Area_tolerance:
+            cut_area = 0
+        cuts.append(Cut(placed, pieces, pieces_area, cut_area,
+                        dims([pt for piece in pieces for pt in piece], placed.angle)))
+    return cuts
+
+
+def to_floats(points):
+    return [(float(x), float(y)) for x, y in points]
+
+
+def dims(points, angle):
+    r'''Returns the width, height of the polygon with `points` after turning it back
+    `angle` degrees.
+    '''
+    if angle:
+        c, s = cos(radians(angle)), sin(radians(angle))
+        points = [(x * c + y * s, y * c - x * s) for x, y in points]
+    return (max(x for x, _ in points) - min(x for x, _ in points),
+            max(y for _, y in points) - min(y for _, y in points))
+
+
+def sixteenths(x):
+    return Fraction(round(x * 16), 16)
+
+
+def print_cut_list(cuts):
+    r'''Prints how many of each tile are used whole, and the sizes of the cut ones.
+    '''
+    whole = {}
+    cut = {}
+    for c in cuts:
+        name = c.placed.tile.name
+        if c.cut_area > 0:
+            cut.setdefault(name, []).append(c)
+        else:
+            whole[name] = whole.get(name, 0) + 1
+    for name in sorted(whole.keys() | cut.keys()):
+        print(f"{name}: {whole.get(name, 0)} whole, {len(cut.get(name, ()))} cut")
+        for c in cut.get(name, ()):
+            width, height = c.dims
+            print(f"    {f_to_str(sixteenths(width))} x {f_to_str(sixteenths(height))}"
+                  f" (area {f_to_str(float(c.area))})")
+
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import app
+    import doit
+    from render import Memory_canvas, lay_out
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("wall")
+    parser.add_argument("plan")
+
+    args = parser.parse_args()
+
+    doit.load(Memory_canvas())
+    wall = app.Walls[args.wall]
+    canvas = lay_out(wall, app.Settings['wall_settings'][args.wall]['plans'][args.plan])
+    print_cut_list(cut_tiles(canvas, wall))
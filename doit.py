@@ -1,5 +1,6 @@
 # doit.py
 
+import os.path
 from operator import attrgetter
 from itertools import zip_longest
 from functools import partial
@@ -7,14 +8,19 @@ import tkinter as tk
 from tkinter import simpledialog, ttk
 
 import app
-from utils import fraction, f_to_str, eval_color
+import utils
+from utils import (fraction, f_to_str, eval_color, prewarm_exps, load_exp_cache,
+                   save_exp_cache, Exp_cache, file_signature)
 from colors import read_colors
 from shapes import read_shapes
 from tiles import read_tiles
 from layouts import read_layouts
 from walls import read_walls
 from settings import read_settings
+from steps import clear_cache
+from plan import Plan
 from place_trace import dump_stats
+from image_cache import Images
 
 
 
@@ -140,7 +146,7 @@ def run_set_angle():
         angle = values[0]
         print(f"do_angle {angle=}")
         app.Plan.alignment.set_angle(angle)
-        app.Plan.create()
+        app.Plan.create(realigned=True)
 
     run_dialog("Angle", do_angle, [app.Plan.alignment.angle], (
                   ("angle", angle_entry),))
@@ -153,7 +159,7 @@ def run_set_x_offset():
         x_offset = values[0]
         print(f"do_x_offset {x_offset=}")
         app.Plan.alignment.x_offset = x_offset
-        app.Plan.create()
+        app.Plan.create(realigned=True)
 
     run_dialog("X_offset", do_x_offset, [f_to_str(app.Plan.alignment.x_offset)], (
                   ("x_offset", fraction_entry),))
@@ -165,31 +171,87 @@ def run_set_y_offset():
         y_offset = values[0]
         print(f"do_y_offset {y_offset=}")
         app.Plan.alignment.y_offset = y_offset
-        app.Plan.create()
+        app.Plan.create(realigned=True)
 
     run_dialog("Y_offset", do_y_offset, [f_to_str(app.Plan.alignment.y_offset)], (
                   ("y_offset", fraction_entry),))
 
 
+Data_files = ('colors.csv', 'shapes.yaml', 'tiles.yaml', 'layouts.yaml', 'walls.yaml',
+              'settings.yaml')
+
+File_signatures = {}   # {filename: utils.file_signature} as of the last load
+
+
+def load(canvas=None):
+    r'''Reads the data files that have changed since the last load (all of them the
+    first time), and rebuilds what depends on them:
+
+        colors.csv    -> tiles, walls
+        shapes.yaml   -> tiles
+        tiles.yaml    -> tiles
+        layouts.yaml  -> compiled layouts, plans
+        walls.yaml    -> walls
+        settings.yaml -> plans
+
+    Tiles and walls that haven't changed are kept (see tiles.read_tiles and
+    walls.read_walls).  Image files that have changed since they were loaded are
+    dropped from image_cache.Images, and the tiles and walls using them are rebuilt.
+    Plans are always rebuilt from settings.yaml, but keep their compiled layouts
+    unless layouts.yaml changed.
+
+    Pass a `canvas` (e.g., a render.Memory_canvas) to use this without Tk.
+    '''
+    if canvas is not None:
+        app.canvas = canvas
+    if not len(Exp_cache):
+        load_exp_cache()
+    signatures = {filename: file_signature(os.path.join(utils.Data_dir, filename))
+                  for filename in Data_files}
+    # a missing file (None) is read anyway, to report it
+    changed = {filename for filename in Data_files
+                        if signatures[filename] is None or
+                           File_signatures.get(filename) != signatures[filename]}
+    changed_images = Images.forget_changed()
+    if 'colors.csv' in changed:
+        app.Colors = read_colors()
+    if 'shapes.yaml' in changed:
+        app.Shapes = read_shapes()
+        prewarm_exps(app.Shapes, "<shapes.yaml>")
+    if changed & {'colors.csv', 'shapes.yaml', 'tiles.yaml'} or changed_images:
+        app.Tiles = read_tiles(old_tiles=getattr(app, 'Tiles', None))
+    if 'layouts.yaml' in changed:
+        app.Layouts = read_layouts()
+        prewarm_exps(app.Layouts, "<layouts.yaml>")
+        clear_cache()
+        old_settings = None
+    else:
+        old_settings = getattr(app, 'Settings', None)
+    if changed & {'colors.csv', 'walls.yaml'} or changed_images:
+        app.Walls = read_walls(old_walls=None if 'colors.csv' in changed
+                                              else getattr(app, 'Walls', None))
+    app.Settings = read_settings(old_settings=old_settings)
+    if 'settings.yaml' in changed:
+        prewarm_exps([plan.layout for ws in app.Settings['wall_settings'].values()
+                                   for plan in ws['plans'].values()],
+                     "<settings.yaml>")
+    app.Wall_name = None
+    app.Wall = None
+    app.Plan_name = None
+    app.Plan = None
+    File_signatures.update(signatures)
+    save_exp_cache()
+
+
 def init():
     print("doit.init called")
 
-    app.Colors = read_colors()
-    app.Shapes = read_shapes()
-    app.Tiles = read_tiles()
-    app.Layouts = read_layouts()
-    app.Walls = read_walls()
-    app.Settings = read_settings()
+    load()
     wall = app.myapp.submenus['Wall']
     wall.delete(0, 'end')
     for name in sorted(app.Walls.keys()):
         wall.add_command(label=name, command=partial(create_wall, name))
 
-    app.Wall_name = None
-    app.Wall = None
-    app.Plan_name = None
-    app.Plan = None
-
 
 def reload():
     wall_name = app.Wall_name
@@ -209,8 +271,12 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
     #parser.add_argument("grout_gap", type=fraction, help="I or I.N/D or N/D")
+    parser.add_argument("--fast", action="store_true",
+                        help="place tiles using floats rather than Fractions")
 
     args = parser.parse_args()
+    if args.fast:
+        Plan.exact = False
 
     def choose_color():
         print(f"choose_color -> {colorchooser.askcolor()}")
@@ -0,0 +1,681 @@
+# export.py
+
+r'''Exports a laid-out wall to image files.
+
+export_png and export_tiff draw what's been laid out on a render.Memory_canvas.  They
+draw the image in horizontal strips, writing each strip to the file before drawing the
+next, so that a big wall at a high resolution doesn't need the whole image in memory.
+The strips can also be drawn by a pool of processes.
+
+Svg_canvas and Pdf_canvas are render targets that write everything drawn on them
+straight to an SVG or PDF file at true size (in inches), rather than keeping it in
+memory (see export_svg and export_pdf).
+
+    python export.py [--scale N] [--jobs N] wall plan FILENAME.png|.tif|.svg|.pdf
+
+Things are drawn in the same order that they're stacked on the Tk canvas: the grout,
+the tiles that aren't in sections, the sections (their grout, then their tiles), and
+finally the wall's panels over everything.
+'''
+
+import os.path
+import io
+import zlib
+import struct
+import base64
+import shutil
+import tempfile
+import contextlib
+from math import ceil, floor
+from multiprocessing import Pool
+from PIL import Image, ImageDraw, ImageColor
+
+import app
+from render import Render_target, lay_out, clip_image
+from image_cache import Images
+
+
+Strip_height = 256      # pixels
+
+
+def export_png(canvas, filename, scale=10, strip_height=Strip_height, jobs=1):
+    r'''Writes what's on `canvas` to `filename` as a PNG image, `scale` pixels/inch.
+
+    The strips are drawn by `jobs` processes (None for one per cpu).
+    '''
+    width, height = image_size(canvas, scale)
+    with open(filename, 'wb') as out:
+        out.write(b"\x89PNG\r\n\x1a\n")
+        write_chunk(out, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        pixels_per_meter = round(scale / 0.0254)
+        write_chunk(out, b"pHYs", struct.pack(">IIB", pixels_per_meter, pixels_per_meter, 1))
+        compressor = zlib.compressobj()
+        for strip in strips(canvas, scale, strip_height, jobs):
+            data = strip.tobytes()
+            row_bytes = width * 3
+            rows = b''.join(b"\x00" + data[i:i + row_bytes]    # filter type 0 (None)
+                            for i in range(0, len(data), row_bytes))
+            compressed = compressor.compress(rows)
+            if compressed:
+                write_chunk(out, b"IDAT", compressed)
+        write_chunk(out, b"IDAT", compressor.flush())
+        write_chunk(out, b"IEND", b"")
+
+
+def write_chunk(out, chunk_type, data):
+    out.write(struct.pack(">I", len(data)))
+    out.write(chunk_type)
+    out.write(data)
+    out.write(struct.pack(">I", zlib.crc32(chunk_type + data)))
+
+
+def export_tiff(canvas, filename, scale=10, strip_height=Strip_height, jobs=1):
+    r'''Writes what's on `canvas` to `filename` as a TIFF image, `scale` pixels/inch.
+
+    Each strip is a (deflate compressed) TIFF strip.  The strips are drawn by `jobs`
+    processes (None for one per cpu).
+    '''
+    width, height = image_size(canvas, scale)
+    with open(filename, 'wb') as out:
+        out.write(b"II*\x00\x00\x00\x00\x00")     # IFD offset filled in below
+        offsets = []
+        byte_counts = []
+        for strip in strips(canvas, scale, strip_height, jobs):
+            data = zlib.compress(strip.tobytes())
+            offsets.append(out.tell())
+            byte_counts.append(len(data))
+            out.write(data)
+        if out.tell() % 2:
+            out.write(b"\x00")
+
+        # The values that don't fit in the IFD entries go before the IFD.
+        def values(format, *values):
+            offset = out.tell()
+            out.write(struct.pack(f"<{len(values)}{format}", *values))
+            return offset
+
+        bits_per_sample = values('H', 8, 8, 8)
+        resolution = values('I', round(scale * 1000), 1000)
+        strip_offsets = values('I', *offsets) if len(offsets) > 1 else offsets[0]
+        strip_byte_counts = values('I', *byte_counts) if len(byte_counts) > 1 \
+                                                      else byte_counts[0]
+        SHORT, LONG, RATIONAL = 3, 4, 5
+        entries = (
+            (256, LONG, 1, width),                      # ImageWidth
+            (257, LONG, 1, height),                     # ImageLength
+            (258, SHORT, 3, bits_per_sample),           # BitsPerSample
+            (259, SHORT, 1, 8),                         # Compression, deflate
+            (262, SHORT, 1, 2),                         # PhotometricInterpretation, RGB
+            (273, LONG, len(offsets), strip_offsets),   # StripOffsets
+            (277, SHORT, 1, 3),                         # SamplesPerPixel
+            (278, LONG, 1, strip_height),               # RowsPerStrip
+            (279, LONG, len(offsets), strip_byte_counts),  # StripByteCounts
+            (282, RATIONAL, 1, resolution),             # XResolution
+            (283, RATIONAL, 1, resolution),             # YResolution
+            (284, SHORT, 1, 1),                         # PlanarConfiguration
+            (296, SHORT, 1, 2),                         # ResolutionUnit, inch
+        )
+        ifd = out.tell()
+        out.write(struct.pack("<H", len(entries)))
+        for tag, field_type, count, value in entries:
+            if field_type == SHORT and count == 1:
+                out.write(struct.pack("<HHIHH", tag, field_type, count, value, 0))
+            else:
+                out.write(struct.pack("<HHII", tag, field_type, count, value))
+        out.write(struct.pack("<I", 0))              # no more IFDs
+        out.seek(4)
+        out.write(struct.pack("<I", ifd))
+
+
+def image_size(canvas, scale):
+    return ceil(float(canvas.width_in) * scale), ceil(float(canvas.height_in) * scale)
+
+
+def strips(canvas, scale, strip_height=Strip_height, jobs=1):
+    r'''Generates the horizontal strips of the image of `canvas`, top to bottom.
+
+    Each strip is an Image `strip_height` pixels high (except maybe the last one).
+    These are drawn by `jobs` processes (None for one per cpu), or just this process if
+    `jobs` is 1.
+    '''
+    _, height = image_size(canvas, scale)
+    tops = range(0, height, strip_height)
+    if jobs == 1:
+        for top in tops:
+            yield draw_strip(canvas, scale, top, strip_height)
+    else:
+        with Pool(jobs, initializer=set_strip_args,
+                  initargs=(canvas, scale, strip_height)) as pool:
+            yield from pool.imap(draw_strip_at, tops)
+
+
+Strip_args = None       # (canvas, scale, strip_height) in the worker processes
+
+
+def set_strip_args(canvas, scale, strip_height):
+    global Strip_args
+    Strip_args = canvas, scale, strip_height
+
+
+def draw_strip_at(top):
+    canvas, scale, strip_height = Strip_args
+    return draw_strip(canvas, scale, top, strip_height)
+
+
+def draw_strip(canvas, scale, top, strip_height):
+    r'''Draws the strip of the image of `canvas` starting `top` pixels down.
+
+    Returns it as an Image.
+
+    PIL doesn't draw shapes that stick out above (or to the left of) an image quite
+    the same as it draws them on the image, and it doesn't always draw them the same
+    when they're moved left or right.  So to come out the same as drawing the whole
+    image at once, no matter where the strips start, shapes close to the top (or
+    left) of the strip are drawn on their own masks, placed the same way in the whole
+    image whatever strip they're in.
+    '''
+    width, height = image_size(canvas, scale)
+    strip_height = min(strip_height, height - top)
+    image = Image.new('RGB', (width, strip_height), rgb(canvas.current_grout_color))
+    draw = ImageDraw.Draw(image)
+
+    # what's in the strip, in inches
+    strip_top = (height - top) / scale
+    strip_bottom = (height - top - strip_height) / scale
+
+    def px(point):
+        return float(point[0]) * scale, height - float(point[1]) * scale - top
+
+    def whole_px(point):
+        return float(point[0]) * scale, height - float(point[1]) * scale
+
+    def fill(shape, points, color, border=2):
+        r'''Draws a 'polygon' or 'ellipse' (given its bounding box) with `points` in
+        pixels in the whole image.
+        '''
+        left = min(x for x, _ in points)
+        top_px = min(y for _, y in points)
+        if left >= border and top_px - top >= border:
+            getattr(draw, shape)([(x, y - top) for x, y in points], fill=rgb(color))
+        else:
+            # the mask's NW corner in the whole image
+            mask_x = min(floor(left) - border, 0)
+            mask_y = floor(top_px) - border
+            right = max(x for x, _ in points)
+            bottom = min(max(y for _, y in points), top + strip_height)
+            mask = Image.new('L', (floor(right) - mask_x + 2, floor(bottom) - mask_y + 2))
+            getattr(ImageDraw.Draw(mask), shape)(
+              [(x - mask_x, y - mask_y) for x, y in points], fill=255)
+            image.paste(rgb(color), (mask_x, mask_y - top), mask)
+
+    def draw_tiles(tiles):
+        for placed in tiles:
+            if placed.color is None:
+                paste_tile(image, placed, px, scale)
+            elif any(strip_bottom <= y for _, y in placed.points) and \
+                 any(y <= strip_top for _, y in placed.points):
+                fill('polygon', [whole_px(pt) for pt in placed.points], placed.color)
+
+    def draw_rectangle(pos, size, color):
+        r'''Rectangles (which can be big) are clipped to the strip by hand instead.
+        '''
+        left, top_px = px((pos[0], pos[1] + size[1]))
+        right, bottom = px((pos[0] + size[0], pos[1]))
+        if bottom >= 0 and top_px <= strip_height:
+            draw.rectangle((left, max(top_px, -1), right, min(bottom, strip_height + 1)),
+                           fill=rgb(color))
+
+    draw_tiles(canvas.tiles[:canvas.num_unsectioned])
+    for pos, size in canvas.sections:
+        draw_rectangle(pos, size, canvas.current_grout_color)
+    draw_tiles(canvas.tiles[canvas.num_unsectioned:])
+    for caller, shape, color, pos, size in canvas.panels:
+        if caller == "grout_bg":
+            continue
+        if shape == 'rect':
+            draw_rectangle(pos, size, color)
+        elif shape == 'circle':
+            r = size / 2
+            top_left = whole_px((pos[0] - r, pos[1] + r))
+            bottom_right = whole_px((pos[0] + r, pos[1] - r))
+            if bottom_right[1] >= top and top_left[1] <= top + strip_height:
+                fill('ellipse', [top_left, bottom_right], color)
+        else:
+            panel_image = get_panel_image(color, size, scale)
+            left, top_px = px((pos[0], pos[1] + size[1]))
+            image.paste(panel_image, (round(left), round(top_px)))
+    return image
+
+
+def paste_tile(image, placed, px, scale):
+    r'''Pastes an Image_tile's image with its SW corner at the SW corner of its points.
+    '''
+    tile_image = get_tile_image(placed, scale)
+    if tile_image is None:
+        return
+    tile_image, (left, bottom) = tile_image
+    x, y = px((left, bottom))
+    corner = round(x), round(y) - tile_image.height
+    if 'A' in tile_image.getbands():
+        image.paste(tile_image, corner, tile_image)
+    else:
+        image.paste(tile_image, corner)
+
+
+def get_tile_image(placed, scale):
+    r'''Returns an Image_tile's image (turned placed.angle) at `scale` pixels/inch, and
+    where its SW corner goes (the SW corner of its points).
+
+    The image is cropped to placed.clip, if it has one (see render.clip_image).
+    Returns None if none of it is left.
+    '''
+    tile = placed.tile
+    tile_image = Images.get((tile.image_file, tile.rotation), tile.load_image,
+                            (round(float(tile.in_width) * scale),
+                             round(float(tile.in_height) * scale)),
+                            placed.angle)
+    left = min(x for x, _ in placed.points)
+    bottom = min(y for _, y in placed.points)
+    if placed.clip is not None:
+        return clip_image(tile_image, (left, bottom), scale, placed.clip)
+    return tile_image, (left, bottom)
+
+
+def get_panel_image(image_file, size, scale):
+    r'''Returns an Image_panel's image at `scale` pixels/inch.
+    '''
+    return Images.get((image_file,), lambda: Image.open(os.path.join('images', image_file)),
+                      (round(float(size[0]) * scale), round(float(size[1]) * scale)))
+
+
+def rgb(color):
+    r'''Converts a Tk color to an (r, g, b) tuple, gray if PIL doesn't know the color.
+    '''
+    try:
+        return ImageColor.getrgb(color)[:3]
+    except ValueError:
+        return 128, 128, 128
+
+
+def num(x):
+    r'''Formats `x` for SVG or PDF, to 1/10000 inch.
+    '''
+    ans = f"{float(x):.4f}".rstrip('0').rstrip('.')
+    return '0' if ans == '-0' else ans
+
+
+class Stream_canvas(Render_target):
+    r'''The base class for render targets that write to a file as things are drawn.
+
+    Each layer (the tiles that aren't in sections, the sections, and the panels) is
+    written to its own temporary file as it's drawn.  These are put together, in
+    order, into `filename` by `close`.  The grout is drawn in its final color (like
+    on the Tk canvas, where setting the grout color changes all of the grout).
+
+    Image tiles and panels are written at `image_scale` pixels/inch.
+
+    Subclasses provide:
+
+        mode                      - 'w+' or 'w+b', for the temporary files
+        polygon(layer, color, points)
+        rectangle(layer, color, left_x, bottom_y, width, height)
+        circle(layer, color, pos, diameter)
+        image(layer, key, image, pos, size) - `key` is the same for the same image
+        close()
+    '''
+    def __init__(self, filename, image_scale=100):
+        self.filename = filename
+        self.image_scale = image_scale
+        self.set_size(0, 0)
+        self.current_grout_color = 'black'
+        self.tiles = tempfile.TemporaryFile(self.mode)
+        self.sections = tempfile.TemporaryFile(self.mode)
+        self.panels = tempfile.TemporaryFile(self.mode)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}: {self.filename}>"
+
+    def set_scale(self, width_in, height_in):
+        self.set_size(width_in, height_in)
+
+    def erase_all(self):
+        self.erase(self.panels)
+        self.erase_tiles()
+
+    def erase_tiles(self):
+        self.erase(self.tiles)
+        self.erase(self.sections)
+
+    def erase(self, layer):
+        layer.seek(0)
+        layer.truncate()
+
+    def set_grout_color(self, color):
+        self.current_grout_color = color
+
+    def clip_to_wall(self, width_in, height_in):
+        r'''The page is the size of the wall, so nothing shows outside of it.
+        '''
+        pass
+
+    def create_my_rectangle(self, caller, left_x, bottom_y, width, height, color,
+                            tags=()):
+        if caller != "grout_bg":
+            self.rectangle(self.panels, color, left_x, bottom_y, width, height)
+
+    def create_my_circle(self, caller, color, pos, diameter, tags=()):
+        self.circle(self.panels, color, pos, diameter)
+
+    def create_panel_image(self, caller, panel, tags=()):
+        self.image(self.panels, (panel.image_file,),
+                   get_panel_image(panel.image_file, panel.size, self.image_scale),
+                   panel.pos, panel.size)
+
+    def create_tiles(self, placed_tiles, section=False):
+        layer = self.sections if section else self.tiles
+        for placed in placed_tiles:
+            if placed.color is None:
+                tile = placed.tile
+                tile_image = get_tile_image(placed, self.image_scale)
+                if tile_image is None:
+                    continue
+                image, pos = tile_image
+                key = tile.image_file, tile.rotation, placed.angle
+                if placed.clip is not None:
+                    # cropped differently for each tile
+                    key += (placed.points[0], placed.clip)
+                self.image(layer, key, image,
+                           pos, (image.width / self.image_scale,
+                                 image.height / self.image_scale))
+            else:
+                self.polygon(layer, placed.color, placed.points)
+
+    def create_section_grout(self, pos, size):
+        self.rectangle(self.sections, None, pos[0], pos[1], size[0], size[1])
+
+    def copy_layers(self, out, grout=None):
+        r'''Copies the layers, in order, to `out`.
+
+        If `grout` is given, lines equal to grout[0] are replaced by grout[1].
+        '''
+        for layer in self.tiles, self.sections, self.panels:
+            layer.seek(0)
+            if grout is None:
+                for line in layer:
+                    out.write(line)
+            else:
+                for line in layer:
+                    out.write(grout[1] if line == grout[0] else line)
+            layer.close()
+
+
+class Svg_canvas(Stream_canvas):
+    r'''Writes an SVG file, in inches.
+
+    Grout has class="grout", colored by the style sheet.  Each image is written once
+    (in the <defs>) and <use>d for each tile.
+    '''
+    mode = 'w+'
+
+    def __init__(self, filename, image_scale=100):
+        super().__init__(filename, image_scale)
+        self.defs = tempfile.TemporaryFile(self.mode)
+        self.image_ids = {}     # {key: id}
+
+    def erase_all(self):
+        super().erase_all()
+        self.erase(self.defs)
+        self.image_ids = {}
+
+    def fill(self, color):
+        if color is None:
+            return 'class="grout"'
+        return 'fill="#{:02x}{:02x}{:02x}"'.format(*rgb(color))
+
+    def y(self, y):
+        return num(self.height_in - y)
+
+    def polygon(self, layer, color, points):
+        points = ' '.join(f"{num(x)},{self.y(y)}" for x, y in points)
+        layer.write(f'<polygon {self.fill(color)} points="{points}"/>\n')
+
+    def rectangle(self, layer, color, left_x, bottom_y, width, height):
+        layer.write(f'<rect {self.fill(color)} x="{num(left_x)}" '
+                    f'y="{self.y(bottom_y + height)}" '
+                    f'width="{num(width)}" height="{num(height)}"/>\n')
+
+    def circle(self, layer, color, pos, diameter):
+        layer.write(f'<circle {self.fill(color)} cx="{num(pos[0])}" cy="{self.y(pos[1])}" '
+                    f'r="{num(diameter / 2)}"/>\n')
+
+    def image(self, layer, key, image, pos, size):
+        if key not in self.image_ids:
+            self.image_ids[key] = f"image{len(self.image_ids) + 1}"
+            png = io.BytesIO()
+            image.save(png, 'PNG')
+            self.defs.write(f'<image id="{self.image_ids[key]}" '
+                            f'width="{num(size[0])}" height="{num(size[1])}" '
+                            f'preserveAspectRatio="none" href="data:image/png;base64,'
+                            f'{base64.b64encode(png.getvalue()).decode("ascii")}"/>\n')
+        layer.write(f'<use href="#{self.image_ids[key]}" x="{num(pos[0])}" '
+                    f'y="{self.y(pos[1] + size[1])}"/>\n')
+
+    def close(self):
+        width, height = num(self.width_in), num(self.height_in)
+        with open(self.filename, 'w') as out:
+            out.write(f'<svg xmlns="http://www.w3.org/2000/svg" '
+                      f'width="{width}in" height="{height}in" '
+                      f'viewBox="0 0 {width} {height}">\n')
+            out.write('<style>.grout {{ fill: #{:02x}{:02x}{:02x} }}</style>\n'
+                        .format(*rgb(self.current_grout_color)))
+            out.write('<defs>\n')
+            self.defs.seek(0)
+            for line in self.defs:
+                out.write(line)
+            self.defs.close()
+            out.write('</defs>\n')
+            self.rectangle(out, None, 0, 0, self.width_in, self.height_in)
+            self.copy_layers(out)
+            out.write('</svg>\n')
+
+
+class Pdf_canvas(Stream_canvas):
+    r'''Writes a one page PDF file, the size of the wall.
+
+    The page is scaled to draw in inches (72 points/inch).  The PDF is put together in
+    a temporary file: each image is written as an image XObject as soon as it's first
+    drawn, and the drawing itself goes into the page's content stream when the canvas
+    is closed.  Only then is `filename` written (see close).
+    '''
+    mode = 'w+b'
+    grout = b"% grout\n"     # replaced by the grout color in the content stream
+
+    def __init__(self, filename, image_scale=100):
+        super().__init__(filename, image_scale)
+        self.out = tempfile.TemporaryFile(self.mode)
+        self.out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self.offsets = []       # offset of each object in self.out, by number - 1
+        self.image_names = {}   # {key: name}
+        self.image_objects = {} # {name: object number}
+
+    def begin_object(self):
+        r'''Starts the next object in self.out, returning its number.
+        '''
+        self.offsets.append(self.out.tell())
+        number = len(self.offsets)
+        self.out.write(f"{number} 0 obj\n".encode('ascii'))
+        return number
+
+    def write_object(self, body):
+        number = self.begin_object()
+        self.out.write(body.encode('ascii') + b"\nendobj\n")
+        return number
+
+    def write_stream(self, dictionary, data):
+        number = self.begin_object()
+        self.out.write(f"<< {dictionary} /Length {len(data)} >>\nstream\n"
+                         .encode('ascii'))
+        self.out.write(data)
+        self.out.write(b"\nendstream\nendobj\n")
+        return number
+
+    def fill(self, layer, color):
+        if color is None:
+            layer.write(self.grout)
+        else:
+            layer.write(self.color(color))
+
+    def color(self, color):
+        r, g, b = rgb(color)
+        return f"{num(r / 255)} {num(g / 255)} {num(b / 255)} rg\n".encode('ascii')
+
+    def polygon(self, layer, color, points):
+        self.fill(layer, color)
+        (x, y), *rest = points
+        layer.write((f"{num(x)} {num(y)} m " +
+                     ''.join(f"{num(x)} {num(y)} l " for x, y in rest) +
+                     "h f\n").encode('ascii'))
+
+    def rectangle(self, layer, color, left_x, bottom_y, width, height):
+        self.fill(layer, color)
+        layer.write(f"{num(left_x)} {num(bottom_y)} {num(width)} {num(height)} re f\n"
+                      .encode('ascii'))
+
+    def circle(self, layer, color, pos, diameter):
+        r'''Four Bezier curves, one for each quarter of the circle.
+        '''
+        self.fill(layer, color)
+        x, y = float(pos[0]), float(pos[1])
+        r = float(diameter) / 2
+        k = 0.5523 * r
+        layer.write(f"{num(x + r)} {num(y)} m "
+                    f"{num(x + r)} {num(y + k)} {num(x + k)} {num(y + r)} "
+                      f"{num(x)} {num(y + r)} c "
+                    f"{num(x - k)} {num(y + r)} {num(x - r)} {num(y + k)} "
+                      f"{num(x - r)} {num(y)} c "
+                    f"{num(x - r)} {num(y - k)} {num(x - k)} {num(y - r)} "
+                      f"{num(x)} {num(y - r)} c "
+                    f"{num(x + k)} {num(y - r)} {num(x + r)} {num(y - k)} "
+                      f"{num(x + r)} {num(y)} c h f\n".encode('ascii'))
+
+    def image(self, layer, key, image, pos, size):
+        if key not in self.image_names:
+            name = f"Im{len(self.image_names) + 1}"
+            self.image_names[key] = name
+            self.image_objects[name] = self.write_image(image)
+        layer.write(f"q {num(size[0])} 0 0 {num(size[1])} {num(pos[0])} {num(pos[1])} cm "
+                    f"/{self.image_names[key]} Do Q\n".encode('ascii'))
+
+    def write_image(self, image):
+        r'''Writes `image` as an image XObject, returning its object number.
+        '''
+        smask = ''
+        if 'A' in image.getbands():
+            image = image.convert('RGBA')
+            mask = self.write_stream(f"/Type /XObject /Subtype /Image "
+                                     f"/Width {image.width} /Height {image.height} "
+                                     f"/ColorSpace /DeviceGray /BitsPerComponent 8 "
+                                     f"/Filter /FlateDecode",
+                                     zlib.compress(image.getchannel('A').tobytes()))
+            smask = f" /SMask {mask} 0 R"
+        return self.write_stream(f"/Type /XObject /Subtype /Image "
+                                 f"/Width {image.width} /Height {image.height} "
+                                 f"/ColorSpace /DeviceRGB /BitsPerComponent 8 "
+                                 f"/Filter /FlateDecode{smask}",
+                                 zlib.compress(image.convert('RGB').tobytes()))
+
+    def close(self):
+        # The content stream's length isn't known until it's been written, so it's
+        # written as a separate object after the stream.
+        contents = self.begin_object()
+        self.out.write(f"<< /Length {contents + 1} 0 R >>\nstream\n".encode('ascii'))
+        start = self.out.tell()
+        grout_color = self.color(self.current_grout_color)
+        self.out.write(b"72 0 0 72 0 0 cm\n")
+        self.rectangle(self.out, self.current_grout_color, 0, 0,
+                       self.width_in, self.height_in)
+        self.copy_layers(self.out, (self.grout, grout_color))
+        length = self.out.tell() - start
+        self.out.write(b"\nendstream\nendobj\n")
+        self.write_object(str(length))
+        images = ' '.join(f"/{name} {number} 0 R"
+                          for name, number in self.image_objects.items())
+        pages = len(self.offsets) + 2
+        page = self.write_object(
+                 f"<< /Type /Page /Parent {pages} 0 R "
+                 f"/MediaBox [0 0 {num(self.width_in * 72)} {num(self.height_in * 72)}] "
+                 f"/Resources << /XObject << {images} >> >> /Contents {contents} 0 R >>")
+        assert self.write_object(f"<< /Type /Pages /Kids [{page} 0 R] /Count 1 >>") \
+                 == pages
+        catalog = self.write_object(f"<< /Type /Catalog /Pages {pages} 0 R >>")
+        xref = self.out.tell()
+        self.out.write(f"xref\n0 {len(self.offsets) + 1}\n0000000000 65535 f \n"
+                         .encode('ascii'))
+        for offset in self.offsets:
+            self.out.write(f"{offset:010} 00000 n \n".encode('ascii'))
+        self.out.write(f"trailer\n<< /Size {len(self.offsets) + 1} /Root {catalog} 0 R >>\n"
+                       f"startxref\n{xref}\n%%EOF\n".encode('ascii'))
+
+        # Written to a .tmp file, then renamed, so that `filename` is never left with
+        # part of a PDF in it.
+        self.out.seek(0)
+        with open(f"{self.filename}.tmp", 'wb') as out:
+            shutil.copyfileobj(self.out, out)
+        self.out.close()
+        os.replace(f"{self.filename}.tmp", self.filename)
+
+
+def export_svg(wall, plan, filename, image_scale=100):
+    r'''Lays out `plan` on `wall`, writing it to `filename` as an SVG file.
+    '''
+    canvas = Svg_canvas(filename, image_scale)
+    lay_out(wall, plan, canvas)
+    canvas.close()
+
+
+def export_pdf(wall, plan, filename, image_scale=100):
+    r'''Lays out `plan` on `wall`, writing it to `filename` as a PDF file.
+    '''
+    canvas = Pdf_canvas(filename, image_scale)
+    lay_out(wall, plan, canvas)
+    canvas.close()
+
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import doit
+    from render import Memory_canvas
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=float, default=None,
+                        help="pixels per inch for PNG and TIFF files (default 10), "
+                             "and images in SVG and PDF files (default 100)")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="number of processes drawing PNG and TIFF files, default 1")
+    parser.add_argument("wall")
+    parser.add_argument("plan")
+    parser.add_argument("filename", help="ending in .png, .tif, .tiff, .svg or .pdf")
+
+    args = parser.parse_args()
+    extension = os.path.splitext(args.filename)[1].lower()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        doit.load(Memory_canvas())
+    wall = app.Walls[args.wall]
+    plan = app.Settings['wall_settings'][args.wall]['plans'][args.plan]
+    with contextlib.redirect_stdout(io.StringIO()):
+        if extension == '.png':
+            export_png(lay_out(wall, plan), args.filename, args.scale or 10,
+                       jobs=args.jobs)
+        elif extension in ('.tif', '.tiff'):
+            export_tiff(lay_out(wall, plan), args.filename, args.scale or 10,
+                        jobs=args.jobs)
+        elif extension == '.svg':
+            export_svg(wall, plan, args.filename, args.scale or 100)
+        elif extension == '.pdf':
+            export_pdf(wall, plan, args.filename, args.scale or 100)
+        else:
+            parser.error(f"unknown file type: {args.filename}")
+    print(f"wrote {args.filename}")
@@ -0,0 +1,162 @@
+# image_cache.py
+
+r'''A cache of scaled and rotated images shared by all Image_tiles and Image_panels.
+
+Each source image is kept as a mip pyramid (the full size image, then half that, then
+a quarter, ...), so that scaling an image starts from the smallest level that's still
+at least as big as needed, rather than from the full size image.  These levels are
+what's kept between window sizes, since a new size reuses the same level as long as
+it's less than twice as big.
+
+The last Recent_images images made (scaled and rotated to exact pixel sizes) are
+kept too, since the same image is often asked for many times in a row (e.g., for
+each tile exported).
+
+The pyramids and images are kept up to Memory_budget bytes, dropping the least
+recently used images first, then the least recently used pyramids.
+
+When an image file changes, its images are dropped by Image_cache.forget_changed (see
+doit.load).
+'''
+
+import os
+from collections import OrderedDict
+
+from utils import file_signature
+
+
+Memory_budget = 256 * 2**20     # bytes
+Recent_images = 64
+
+
+def image_bytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+def image_signature(image_file):
+    r'''The utils.file_signature of `image_file` in the images directory.
+    '''
+    return file_signature(os.path.join('images', image_file))
+
+
+class Pyramid:
+    r'''An image with successively halved copies of it, made as needed.
+    '''
+    def __init__(self, image):
+        self.levels = [image]
+        self.memory = image_bytes(image)    # bytes in all of the levels
+
+    def level_for(self, width, height):
+        r'''Returns the smallest level at least `width` x `height` pixels.
+        '''
+        i = 0
+        while True:
+            level = self.levels[i]
+            if level.width // 2 < max(width, 1) or level.height // 2 < max(height, 1):
+                return level
+            i += 1
+            if i == len(self.levels):
+                self.levels.append(level.reduce(2))
+                self.memory += image_bytes(self.levels[-1])
+
+
+class Image_cache:
+    r'''Pyramids keyed by source, and the last Recent_images images made from them
+    keyed by (source, size, angle).
+
+    The `source` is a tuple starting with the image file name, with anything else
+    the full size image depends on (e.g., the tile's rotation).
+    '''
+    def __init__(self, memory_budget=Memory_budget, recent_images=Recent_images):
+        self.memory_budget = memory_budget
+        self.recent_images = recent_images
+        self.pyramids = OrderedDict()   # {source: Pyramid}
+        self.images = OrderedDict()     # {(source, size, angle): image}
+        self.memory = 0                 # bytes in self.pyramids and self.images
+        self.signatures = {}            # {image file: utils.file_signature when loaded}
+        self.hits = self.misses = 0
+
+    def __repr__(self):
+        return f"<Image_cache: {len(self.pyramids)} sources, {len(self.images)} images, " \
+               f"{self.memory / 2**20:.1f}MB, {self.hits} hits, {self.misses} misses>"
+
+    def get(self, source, load_image, size, angle=0):
+        r'''Returns the `source` image resized to `size` (width, height in pixels), then
+        rotated `angle` degrees (counterclockwise, expanding the image to fit).
+
+        load_image() is called to get the full size image the first time `source` is
+        seen (or if its pyramid has been dropped since).
+        '''
+        key = source, size, angle
+        if key in self.images:
+            self.hits += 1
+            self.images.move_to_end(key)
+            return self.images[key]
+        self.misses += 1
+        image = self.resample(source, load_image, size)
+        if angle != 0:
+            image = image.rotate(angle, expand=True)
+        self.images[key] = image
+        self.memory += image_bytes(image)
+        while len(self.images) > self.recent_images:
+            self.memory -= image_bytes(self.images.popitem(last=False)[1])
+        self.trim(source)
+        return image
+
+    def resample(self, source, load_image, size):
+        r'''Returns the `source` image resized to `size`, from its pyramid.
+        '''
+        pyramid = self.pyramids.get(source)
+        if pyramid is None:
+            pyramid = self.pyramids[source] = Pyramid(load_image())
+            self.memory += pyramid.memory
+            self.signatures.setdefault(source[0], image_signature(source[0]))
+        self.pyramids.move_to_end(source)
+        pyramid_memory = pyramid.memory
+        width, height = size
+        image = pyramid.level_for(width, height).resize(size)
+        self.memory += pyramid.memory - pyramid_memory
+        return image
+
+    def trim(self, source):
+        r'''Drops the least recently used images, then pyramids, until self.memory is
+        within the memory budget.
+
+        Always keeps the last image, and the pyramid for `source`.
+        '''
+        while self.memory > self.memory_budget and len(self.images) > 1:
+            _, old_image = self.images.popitem(last=False)
+            self.memory -= image_bytes(old_image)
+        while self.memory > self.memory_budget and next(iter(self.pyramids)) != source:
+            _, old_pyramid = self.pyramids.popitem(last=False)
+            self.memory -= old_pyramid.memory
+
+    def forget_changed(self):
+        r'''Drops everything made from the image files that have changed since they
+        were loaded.
+
+        Returns the set of image files that changed.
+        '''
+        changed = {image_file for image_file, signature in self.signatures.items()
+                              if image_signature(image_file) != signature}
+        for image_file in changed:
+            self.forget(image_file)
+        return changed
+
+    def forget(self, image_file):
+        r'''Drops everything made from `image_file`.
+        '''
+        self.signatures.pop(image_file, None)
+        for source in [source for source in self.pyramids if source[0] == image_file]:
+            self.memory -= self.pyramids.pop(source).memory
+        for key in [key for key in self.images if key[0][0] == image_file]:
+            self.memory -= image_bytes(self.images.pop(key))
+
+    def clear(self):
+        self.pyramids.clear()
+        self.images.clear()
+        self.signatures.clear()
+        self.memory = 0
+
+
+Images = Image_cache()
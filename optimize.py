@@ -0,0 +1,171 @@
+# optimize.py
+
+r'''Searches for the plan alignment that leaves the fewest slivers and cuts.
+
+    python optimize.py [--step N] [--span N] [--angles A ...] [--jobs N] [--fast] wall plan
+
+This tries the plan's alignment with each x_offset and y_offset from the plan's
+current offsets up to (but not including) the current offsets + span, in steps of
+`step`, at each of the `angles` (default just the plan's current angle).  For each
+one, the plan is laid out (without Tk) and cut to fit the wall (see cuts.cut_tiles),
+and scored by:
+
+    smallest_cut - the smallest width (or height) of what's left of a cut tile
+    cuts         - the number of tiles that have to be cut
+
+The best candidates have the widest smallest_cut, then the fewest cuts.
+
+The layout is compiled once, before the candidates are spread over a pool of
+processes (see batch.py).
+'''
+
+import io
+import contextlib
+from math import inf
+from time import perf_counter
+from collections import namedtuple
+from multiprocessing import Pool
+
+import app
+from utils import f_to_str
+from render import lay_out
+from cuts import cut_tiles, Area_tolerance
+from batch import load_data
+
+
+# smallest_cut is None if no tiles have to be cut.
+Candidate = namedtuple('Candidate', 'x_offset y_offset angle smallest_cut cuts')
+
+
+def candidates(alignment, span, step, angles=None):
+    r'''Returns [(x_offset, y_offset, angle)] to try for `alignment`.
+    '''
+    def offsets(start):
+        ans = []
+        i = 0
+        while i * step < span:
+            ans.append(start + i * step)
+            i += 1
+        return ans
+
+    if angles is None:
+        angles = [alignment.angle]
+    return [(x, y, angle)
+            for angle in angles
+            for x in offsets(alignment.x_offset)
+            for y in offsets(alignment.y_offset)]
+
+
+def evaluate(wall, plan, x_offset, y_offset, angle):
+    r'''Lays out `plan` on `wall` with its alignment set to `x_offset`, `y_offset` and
+    `angle`, returning a Candidate.
+
+    The plan is laid out from scratch every time (giving lay_out `constants` skips
+    Plan.create's Layout_cache), so that the score doesn't depend on which candidates
+    were tried before.  The plan's alignment is put back afterwards.
+    '''
+    alignment = plan.alignment
+    hold = alignment.x_offset, alignment.y_offset, alignment.angle
+    try:
+        alignment.x_offset = x_offset
+        alignment.y_offset = y_offset
+        alignment.set_angle(angle)
+        with contextlib.redirect_stdout(io.StringIO()):
+            canvas = lay_out(wall, plan, constants={})
+    finally:
+        alignment.x_offset, alignment.y_offset = hold[:2]
+        alignment.set_angle(hold[2])
+    cuts = [cut for cut in cut_tiles(canvas, wall) if cut.cut_area > Area_tolerance]
+    if not cuts:
+        return Candidate(x_offset, y_offset, angle, None, 0)
+    return Candidate(x_offset, y_offset, angle, min(min(cut.dims) for cut in cuts),
+                     len(cuts))
+
+
+def rank(candidate):
+    r'''Sort key putting the best candidates first.
+    '''
+    smallest_cut = inf if candidate.smallest_cut is None else candidate.smallest_cut
+    return -smallest_cut, candidate.cuts
+
+
+def optimize(wall_name, plan_name, to_try, jobs=None, exact=None):
+    r'''Returns a Candidate for each (x_offset, y_offset, angle) in `to_try`, best
+    first.
+
+    Uses `jobs` processes (default os.cpu_count()), or just this process if `jobs`
+    is 1.
+    '''
+    load_data(exact)
+    plan = app.Settings['wall_settings'][wall_name]['plans'][plan_name]
+    if plan.program is None:
+        # compile the layout here, so that the workers don't each have to
+        evaluate(app.Walls[wall_name], plan,
+                 plan.alignment.x_offset, plan.alignment.y_offset, plan.alignment.angle)
+    args = [(wall_name, plan_name, x, y, angle) for x, y, angle in to_try]
+    if jobs == 1:
+        results = [evaluate_args(arg) for arg in args]
+    else:
+        with Pool(jobs, initializer=load_data, initargs=(exact,)) as pool:
+            results = pool.map(evaluate_args, args)
+    return sorted(results, key=rank)
+
+
+def evaluate_args(args):
+    wall_name, plan_name, x_offset, y_offset, angle = args
+    return evaluate(app.Walls[wall_name],
+                    app.Settings['wall_settings'][wall_name]['plans'][plan_name],
+                    x_offset, y_offset, angle)
+
+
+def print_candidate(candidate):
+    smallest_cut = '-' if candidate.smallest_cut is None \
+                       else f"{candidate.smallest_cut:.3f}"
+    print(f"x_offset {f_to_str(candidate.x_offset):>8} "
+          f"y_offset {f_to_str(candidate.y_offset):>8} "
+          f"angle {f_to_str(candidate.angle):>6} "
+          f"smallest cut {smallest_cut:>7} cuts {candidate.cuts:5}")
+
+
+
+if __name__ == "__main__":
+    import argparse
+    from fractions import Fraction
+
+    from utils import fraction
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--step", type=fraction, default=Fraction(1, 4),
+                        help="offset step in inches, default 1/4")
+    parser.add_argument("--span", type=fraction, default=4,
+                        help="how far to move each offset, in inches, default 4")
+    parser.add_argument("--angles", type=fraction, nargs='+',
+                        help="angles to try, default the plan's angle")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="number of processes, default one per cpu")
+    parser.add_argument("--top", type=int, default=10,
+                        help="number of candidates to show, default 10")
+    parser.add_argument("--fast", action="store_true",
+                        help="place tiles using floats rather than Fractions")
+    parser.add_argument("wall")
+    parser.add_argument("plan")
+
+    args = parser.parse_args()
+    exact = False if args.fast else None
+
+    start = perf_counter()
+    load_data(exact)
+    plan = app.Settings['wall_settings'][args.wall]['plans'][args.plan]
+    to_try = candidates(plan.alignment, args.span, args.step, args.angles)
+    print(f"trying {len(to_try)} alignments")
+    results = optimize(args.wall, args.plan, to_try, args.jobs, exact)
+    print()
+    print("current:")
+    alignment = plan.alignment
+    print_candidate(evaluate(app.Walls[args.wall], plan,
+                             alignment.x_offset, alignment.y_offset, alignment.angle))
+    print()
+    print("best:")
+    for candidate in results[:args.top]:
+        print_candidate(candidate)
+    print(f"done in {perf_counter() - start:.1f} seconds")
@@ -7,12 +7,13 @@ from utils import f_to_str
 In_per_char = 8
 
 
-def pt_init():
+def pt_init(trace=()):
     global Diag, Wall_stats
     Diag = int((app.canvas.diagonal + 30) // In_per_char)
     Wall_stats = [[0] * 2 * Diag for _ in range(2 * Diag)]
-    print(f"pt_init: diagonal={app.canvas.diagonal}, {len(Wall_stats)=}, "
-          f"{len(Wall_stats[0])=}")
+    if 'place_trace' in trace:
+        print(f"pt_init: diagonal={app.canvas.diagonal}, {len(Wall_stats)=}, "
+              f"{len(Wall_stats[0])=}")
 
 
 def place(offset, visible):
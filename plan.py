@@ -1,21 +1,215 @@
 # plan.py
 
-from collections import ChainMap, Counter
+import re
+from collections import ChainMap, Counter, namedtuple
+from collections.abc import Mapping
 from itertools import count
+from fractions import Fraction
+from math import floor, hypot
 
 import app
-from utils import my_eval, eval_pair, eval_color, eval_tile, format, f_to_str, pick, unpick
-from tile import erase_tiles
+from utils import (my_eval, eval_color, format, f_to_str, pick, unpick, child_constants,
+                   Lru_cache)
 from alignment import Alignment
 from place_trace import pt_init, place
+from steps import compile_step, Place_step
+from render import Placed_tile, Recorder, replay
+
+
+# The tiles (and section grout) drawn by Plan.create for the last few plans drawn,
+# so that going back to one of them just draws them again.  See Plan.layout_key.
+#
+# {layout_key: (calls recorded by render.Recorder, data the plan was laid out from)}
+Layout_cache = Lru_cache(20)
+
+# The tile patterns of the last few plans that have been moved or turned (had their
+# alignment changed), laid out with no alignment over more than the wall, so that
+# moving or turning the plan again just aligns these tiles.  See Plan.aligned_pattern.
+#
+# {pattern_key: Pattern, or None if the plan's tiles can't just be aligned}
+Pattern_cache = Lru_cache(5)
+
+# How far (in inches) past the wall the pattern is laid out, so that the plan can be
+# moved that far before the pattern has to be laid out again.
+Pattern_margin = 24
+
+# The calls recorded by render.Recorder laying out the pattern, the `area` (left,
+# bottom, right, top) that it was laid out over, and the data it was laid out from.
+Pattern = namedtuple('Pattern', 'calls area data')
+
+
+def steps_back(x, inc, low, high):
+    r'''The number of times `inc` is taken off `x` to get `x` before the `low`, `high`
+    range (going backwards).
+
+    Returns None if that never happens (`inc` is 0 and `x` is in range).
+
+    This is done in exact arithmetic, so that it agrees with stepping `x` back one `inc`
+    at a time.
+    '''
+    if inc == 0:
+        return None if low <= x <= high else 0
+    if inc > 0:
+        if x < low:
+            return 0
+        return floor((Fraction(x) - Fraction(low)) / Fraction(inc)) + 1
+    if x > high:
+        return 0
+    return floor((Fraction(high) - Fraction(x)) / -Fraction(inc)) + 1
+
+
+def steps_forward(x, inc, low, high):
+    r'''The number of times that `x`, `x + inc`, `x + 2*inc`, ... are still in the `low`,
+    `high` range going forward.
+
+    Returns None if there's no limit (`inc` is 0 and `x` is in range).
+    '''
+    if inc == 0:
+        return None if low <= x <= high else 0
+    if inc > 0:
+        if x > high:
+            return 0
+        return floor((Fraction(high) - Fraction(x)) / Fraction(inc)) + 1
+    if x < low:
+        return 0
+    return floor((Fraction(x) - Fraction(low)) / -Fraction(inc)) + 1
+
+
+def min_steps(x_steps, y_steps):
+    r'''Min of `x_steps` and `y_steps`, where None means no limit.
+    '''
+    if x_steps is None:
+        return y_steps
+    if y_steps is None:
+        return x_steps
+    return min(x_steps, y_steps)
+
+
+def max_steps(x_steps, y_steps):
+    r'''Max of `x_steps` and `y_steps`, where None means no limit.
+    '''
+    if x_steps is None:
+        return y_steps
+    if y_steps is None:
+        return x_steps
+    return max(x_steps, y_steps)
+
+
+class Recording_constants(Mapping):
+    r'''Passes lookups on to `constants`, remembering which names were looked up and
+    what was found.
+
+    This is how get_inc_xy knows what a step's measurement depends on.
+    '''
+    def __init__(self, constants):
+        self.constants = constants
+        self.present = {}     # {name: True/False} for `name in constants`
+        self.values = {}      # {name: value} for `constants[name]`
+        self.complete = True  # False if all of the constants were looked at
+
+    def __getitem__(self, name):
+        try:
+            value = self.constants[name]
+        except KeyError:
+            self.present[name] = False
+            raise
+        self.values[name] = value
+        return value
+
+    def __contains__(self, name):
+        ans = name in self.constants
+        self.present[name] = ans
+        return ans
+
+    def __iter__(self):
+        self.complete = False
+        return iter(self.constants)
+
+    def __len__(self):
+        self.complete = False
+        return len(self.constants)
+
+    def matches(self, constants):
+        r'''True if `constants` has the same values for everything looked up here.
+        '''
+        for name, present in self.present.items():
+            if (name in constants) != present:
+                return False
+        for name, value in self.values.items():
+            if name not in constants or not same(constants[name], value):
+                return False
+        return True
+
+
+def same(a, b):
+    if a is b:
+        return True
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, (tuple, list)):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def loaded_data():
+    r'''The wall, and the data loaded from the data files, that plans are laid out from.
+    '''
+    return tuple(getattr(app, name, None)
+                 for name in ('Wall', 'Tiles', 'Layouts', 'Colors', 'Shapes'))
+
+
+def depends_on_position(layout, seen=None):
+    r'''True if the tiles placed by `layout` (as loaded from the yaml) may depend on
+    where the plan is on the wall: if any expression in it (or in the layouts from
+    layouts.yaml that it uses) mentions an alignment (for example
+    plan.alignment.x_offset), or it picks with index_by_counter (which only counts the
+    tiles that are visible).
+    '''
+    if seen is None:
+        seen = set()
+    if isinstance(layout, str):
+        return re.search(r'\balignment\b', layout) is not None
+    if isinstance(layout, Mapping):
+        if 'index_by_counter' in layout:
+            return True
+        name = layout.get('type')
+        if isinstance(name, str) and name in app.Layouts and name not in seen:
+            seen.add(name)
+            if depends_on_position(app.Layouts[name], seen):
+                return True
+        return any(depends_on_position(value, seen) for value in layout.values())
+    if isinstance(layout, (list, tuple)):
+        return any(depends_on_position(value, seen) for value in layout)
+    return False
+
+
+def all_exact(*points):
+    r'''True if all of the coordinates of `points` are ints or Fractions.
+    '''
+    return all(isinstance(x, (int, Fraction)) and isinstance(y, (int, Fraction))
+               for x, y in points)
 
 
 class Plan:
     attrs = 'grout_gap,grout_color,alignment,layout'.split(',')
 
+    # If False, the offsets and tile measurements are done in floats, rather than
+    # Fractions, while placing tiles.  This is exact for measurements in halves,
+    # quarters, eighths, etc of an inch, but not for thirds, etc, which may add or
+    # drop tiles that just touch the edge of the wall.  See render.compare_modes to
+    # check that a plan places the tiles in the same places either way.
+    exact = True
+
+    # If False, the traces asked for in the yaml files (trace: [...] in a step or
+    # layout, and get_inc_xy's location) are ignored.  See batch.py.
+    traces = True
+
     def __init__(self, name, plan, canvas, constants):
         self.name = name
         self.canvas = canvas
+        self.program = None    # compiled layout, see create
+        self.last_layout = None  # (pattern_key, alignment, calls) last drawn, see create
+        self.inexact = None      # True if a tile isn't placed exactly, see record_pattern
         for attr in self.attrs:
             try:
                 value = plan[attr]
@@ -29,15 +223,20 @@ class Plan:
             elif attr == 'grout_gap':
                 value = my_eval(value, constants, f"<Plan({name}): {attr}>")
             setattr(self, attr, value)
+        if 'exact' in plan:
+            self.exact = plan['exact']
 
     def __repr__(self):
         return f"<Plan: {self.name}>"
 
     def dump(self):
-        return {attr: (format(getattr(self, attr)) 
-                       if attr != 'alignment'
-                       else getattr(self, attr).dump())
-                for attr in self.attrs}
+        ans = {attr: (format(getattr(self, attr)) 
+                      if attr != 'alignment'
+                      else getattr(self, attr).dump())
+               for attr in self.attrs}
+        if 'exact' in self.__dict__:
+            ans['exact'] = self.exact
+        return ans
 
     def set_grout_color(self, color):
         assert self.grout_color is not None, f"Plan({self.name}) does not have a grout_color"
@@ -46,39 +245,283 @@ class Plan:
 
     def display_grout_color(self):
         if app.Plan == self:
-            color = eval_color(self.grout_color)
-            self.canvas.itemconfig("grout", fill=color)
-            self.canvas.current_grout_color = color
-            def do_sections(canvas):
-                for item in canvas.find_withtag('section'):
-                    section = app.root.nametowidget(canvas.itemcget(item, 'window'))
-                    print("section", section)
-                    print(dir(section))
-                    section.configure(bg=color)
-                    section.current_grout_color = color
-                    do_sections(section)
-            do_sections(self.canvas)
-
-    def create(self, constants=None, trace=()):
-        erase_tiles(self.canvas)
+            self.canvas.set_grout_color(eval_color(self.grout_color))
+
+    def create(self, constants=None, trace=(), realigned=False):
+        r'''Draws the plan's tiles on self.canvas.
+
+        `realigned` is True when the only thing changed since the plan was last drawn
+        is its alignment (see doit.run_set_angle, etc).  Then the tiles may be aligned
+        from the plan's Pattern, rather than laid out again (see realigned_layout).
+        '''
+        self.canvas.erase_tiles()
         self.display_grout_color()
-        pt_init()
-        app.Counters = Counter()
+        pt_init(trace)
+
+        # Tiles completely hidden behind a wall panel aren't drawn.  The panels are
+        # in wall coordinates, so this is only done when drawing on the wall itself.
+        if app.Wall is not None and self.canvas is app.canvas:
+            self.panel_index = app.Wall.panel_index
+        else:
+            self.panel_index = None
+
+        if constants is not None or trace:
+            self.place_tiles(constants, trace)
+            return
+        calls, _ = Layout_cache.get(self.layout_key(),
+                                    self.realigned_layout if realigned
+                                                          else self.record_layout)
+        replay(calls, self.canvas)
+        alignment = self.alignment
+        self.last_layout = (self.pattern_key(),
+                            (alignment.angle, alignment.x_offset, alignment.y_offset),
+                            calls)
+
+    def realigned_layout(self):
+        r'''Returns the Layout_cache entry for the plan, after its alignment has been
+        changed.
+
+        If the plan has a Pattern in Pattern_cache, or was just drawn with another
+        alignment, its tiles are aligned from the pattern, rather than laid out again.
+        '''
+        key = self.pattern_key()
+        if key in Pattern_cache or \
+           self.last_layout is not None and self.last_layout[0] == key:
+            calls = self.aligned_pattern(key)
+            if calls is not None:
+                return calls, loaded_data()
+        return self.record_layout()
+
+    def record_layout(self):
+        r'''Lays out the plan on a render.Recorder, returning the Layout_cache entry.
+        '''
+        canvas = self.canvas
+        self.canvas = recorder = Recorder(canvas)
+        try:
+            self.place_tiles()
+        finally:
+            self.canvas = canvas
+        return recorder.calls, loaded_data()
+
+    def aligned_pattern(self, key):
+        r'''Returns the calls to draw the plan, aligned from its Pattern.
+
+        Returns None if the plan's tiles can't just be aligned (see record_pattern).
+        '''
+        pattern = Pattern_cache.get(key, self.record_pattern)
+        if pattern is not None and not self.in_pattern(pattern):
+            pattern = self.record_pattern()
+            Pattern_cache.put(key, pattern)
+        if pattern is None:
+            return None
+        return self.align_pattern(pattern, self.alignment)
+
+    def in_pattern(self, pattern):
+        r'''True if the wall, unaligned by the plan's alignment, is within the area of
+        `pattern`.
+        '''
+        left, bottom, right, top = pattern.area
+        return all(left <= x <= right and bottom <= y <= top
+                   for x, y in self.alignment.unalign(self.canvas.boundary))
+
+    def record_pattern(self):
+        r'''Lays out the plan with no alignment on a render.Recorder, over the
+        pattern_area, without dropping the tiles behind the wall panels.
+
+        Aligning the pattern draws the same tiles as place_tiles would, so long as
+        the tiles are placed the same no matter where the wall is:
+
+            - the layout doesn't depend on where the plan is (see depends_on_position),
+            - the tiles are placed in exact arithmetic (Fractions), so that where each
+              tile is placed doesn't depend on where its repeats started, and
+            - the repeats place every tile that shows (see repeat).
+
+        Steps are still measured on the wall itself (see measure).
+
+        Returns a Pattern, or None if the pattern can't be used: if the tiles aren't
+        placed exactly, or the layout depends on where the plan is, or if (to make
+        sure) aligning the pattern the way the plan was last drawn doesn't draw what
+        was drawn then.
+        '''
+        if self.last_layout is None or self.last_layout[0] != self.pattern_key() or \
+           not self.exact or \
+           depends_on_position(self.layout):
+            return None
+        _, last, last_calls = self.last_layout
+        last_alignment = Alignment(dict(zip(Alignment.attrs, last)), {})
+        area = self.pattern_area(last_alignment)
+        canvas, panel_index, alignment = self.canvas, self.panel_index, self.alignment
+        self.canvas = recorder = Recorder(canvas, area)
+        self.panel_index = None
+        self.alignment = Alignment(dict(angle=0, x_offset=0, y_offset=0), {})
+        self.inexact = False
+        try:
+            self.place_tiles()
+        finally:
+            self.canvas, self.panel_index, self.alignment = canvas, panel_index, alignment
+            inexact, self.inexact = self.inexact, None
+        pattern = Pattern(recorder.calls, area, loaded_data())
+        if inexact or self.align_pattern(pattern, last_alignment) != last_calls:
+            return None
+        return pattern
+
+    def pattern_area(self, last_alignment):
+        r'''Returns the area (left, bottom, right, top) to lay out the pattern over.
+
+        This covers the wall plus Pattern_margin all around, unaligned by both the
+        plan's alignment and `last_alignment`.  If the angle has changed, it covers
+        the wall turned to any angle (a circle around (0, 0) out to the wall's
+        farthest corner), so that turning the plan again just turns the pattern.
+        '''
+        width, height = self.canvas.width_in, self.canvas.height_in
+        alignments = self.alignment, last_alignment
+        if self.alignment.angle == last_alignment.angle:
+            margin = Pattern_margin
+            boundary = ((-margin, -margin), (width + margin, -margin),
+                        (width + margin, height + margin), (-margin, height + margin))
+            points = [pt for alignment in alignments for pt in alignment.unalign(boundary)]
+        else:
+            radius = max(hypot(x - alignment.x_offset, y - alignment.y_offset)
+                         for alignment in alignments
+                         for x, y in self.canvas.boundary) + Pattern_margin
+            points = [(-radius, -radius), (radius, radius)]
+        return (min(x for x, _ in points), min(y for _, y in points),
+                max(x for x, _ in points), max(y for _, y in points))
+
+    def align_pattern(self, pattern, alignment):
+        r'''Returns the calls to draw `pattern` with the plan at `alignment`.  The tiles
+        in sections stay where they are.
+        '''
+        calls = []
+        for name, args in pattern.calls:
+            if name == 'create_tiles' and not args[1]:
+                args = self.align_tiles(args[0], alignment), False
+            calls.append((name, args))
+        return calls
+
+    def align_tiles(self, placed_tiles, alignment):
+        r'''Returns the `placed_tiles` (laid out with no alignment) aligned by
+        `alignment`, leaving out those that aren't visible or are behind a wall panel.
+
+        The tiles are aligned with one Alignment.align_array for each number of points.
+        '''
+        groups = {}
+        for i, placed in enumerate(placed_tiles):
+            groups.setdefault(len(placed.points), []).append(i)
+        aligned = [None] * len(placed_tiles)
+        origin, size = self.canvas.visible_area()
+        for group in groups.values():
+            aligned_points, mask = alignment.align_array(
+                                     [placed_tiles[i].points for i in group],
+                                     None, size, origin)
+            for i, points, tile_visible in zip(group, aligned_points, mask):
+                if tile_visible:
+                    aligned[i] = [tuple(pt) for pt in points]
+        return [placed._replace(angle=alignment.angle if placed.color is not None
+                                                      else placed.angle + alignment.angle,
+                                points=points)
+                for placed, points in zip(placed_tiles, aligned)
+                 if points is not None and
+                    (self.panel_index is None or not self.panel_index.covers(points))]
+
+    def layout_key(self):
+        r'''The key for this plan's layout in Layout_cache.
+
+        This is everything that the layout depends on: the wall, the plan's settings,
+        the size of the canvas, and the data loaded from the data files.  Since
+        doit.load replaces the tiles, layouts, etc whenever their files change, the
+        data is identified by the objects loaded.  The Layout_cache entry keeps these
+        objects, so that their ids aren't reused while they're in the cache.
+        '''
+        return (tuple(map(id, loaded_data())), repr(self.dump()), self.exact,
+                self.canvas.width_in, self.canvas.height_in, self.panel_index is not None)
+
+    def pattern_key(self):
+        r'''The key for this plan's Pattern in Pattern_cache.
+
+        This is the layout_key, without the plan's alignment.
+        '''
+        alignment = self.alignment
+        hold = alignment.angle, alignment.x_offset, alignment.y_offset
+        try:
+            alignment.angle = alignment.x_offset = alignment.y_offset = None
+            return self.layout_key()
+        finally:
+            alignment.angle, alignment.x_offset, alignment.y_offset = hold
+
+    def place_tiles(self, constants=None, trace=()):
+        r'''Places the tiles on self.canvas.
+        '''
         #new_constants = dict(plan=self, offset=(-self.canvas.diagonal,
         #                                        -self.canvas.diagonal)))
-        new_constants = dict(wall=app.Wall, plan=self, offset=(0, 0))
+        app.Counters = Counter()
+        if self.exact:
+            self.gap = self.grout_gap         # grout_gap used to place tiles
+            offset = 0, 0
+        else:
+            self.gap = float(self.grout_gap)
+            offset = 0.0, 0.0
+        new_constants = dict(wall=app.Wall, plan=self, offset=offset)
         if constants is not None:
-            new_constants = ChainMap(new_constants, constants)
-        self.do_step(f"Plan({self.name})", self.layout, new_constants, trace=trace)
+            new_constants = child_constants(constants, new_constants)
+        if self.program is None:
+            self.program = compile_step(self.layout, f"Plan({self.name})")
+        self.placed_tiles = []
+        self.inc_xy_cache = {}   # {steps: [(Recording_constants, (inc_x, inc_y))]}
+        self.do_step(f"Plan({self.name})", self.program, new_constants, trace=trace)
+        self.flush()
+
+    def flush(self):
+        r'''Sends all of the tiles placed so far to the canvas.
+        '''
+        self.canvas.create_tiles(self.placed_tiles)
+        self.placed_tiles = []
 
     def get_inc_xy(self, steps, constants, location=None):
         r'''Includes grout gaps up to (but not beyond) the final edge.
+
+        The answers are remembered for the rest of the create, along with the constants
+        that each measurement looked at (see Recording_constants).  So asking again
+        for the same steps with the same values for those constants doesn't measure
+        them again.
+        '''
+        if not isinstance(steps, (tuple, list)):
+            steps = [steps]
+        steps = [compile_step(step, "get_inc_xy") for step in steps]
+        key = tuple(tuple(step) if isinstance(step, list) else step for step in steps)
+        entries = self.inc_xy_cache.setdefault(key, [])
+        for recording, ans in entries:
+            if recording.matches(constants):
+                inc_x, inc_y = ans
+                break
+        else:
+            recording = Recording_constants(constants)
+            counters = dict(app.Counters)
+            num_placed = len(self.placed_tiles)
+            inc_x, inc_y = self.measure(steps, recording, location)
+            if recording.complete and dict(app.Counters) == counters and \
+               len(self.placed_tiles) == num_placed:
+                entries.append((recording, (inc_x, inc_y)))
+        if location is not None and self.traces:
+            print(f"get_inc_xy {location=}: "
+                  f"inc_x={f_to_str(inc_x)}, inc_y={f_to_str(inc_y)}")
+        return inc_x, inc_y
+
+    def measure(self, steps, constants, location):
+        r'''Does the `steps` without drawing anything to get their inc_x, inc_y.
+
+        Returns inc_x, inc_y.
         '''
         hold_alignment = self.alignment
         self.alignment = Alignment(dict(angle=0,x_offset=0,y_offset=0), {})
+
+        # Steps are measured on the wall, even while laying out a pattern over more
+        # than the wall (see record_pattern), so that they measure the same.
+        hold_canvas = self.canvas
+        if isinstance(hold_canvas, Recorder) and hold_canvas.area is not None:
+            self.canvas = Recorder(hold_canvas.target)
+            self.canvas.calls = hold_canvas.calls
         temp_constants = ChainMap(dict(plan=self, offset=(0, 0), skip=True), constants)
-        if not isinstance(steps, (tuple, list)):
-            steps = [steps]
         inc_x = inc_y = None
         x_dead = y_dead = False
         for step in steps:
@@ -97,10 +540,8 @@ class Plan:
                 y_dead = True
         assert not x_dead and not y_dead, \
                f"get_inc_xy {location}: {x_dead=}, {y_dead=}"
-        if location is not None:
-            print(f"get_inc_xy {location=}: "
-                  f"inc_x={f_to_str(inc_x)}, inc_y={f_to_str(inc_y)}")
         self.alignment = hold_alignment
+        self.canvas = hold_canvas
         return inc_x, inc_y
 
     def align(self, points, offset):
@@ -108,34 +549,28 @@ class Plan:
 
         If the aligned points are not visible, returns None.
         '''
+        if self.inexact is False and not all_exact(offset, *points):
+            self.inexact = True
         aligned_points = self.alignment.align((x + offset[0], y + offset[1])
                                               for x, y in points)
         if self.canvas.visible(aligned_points):
             return aligned_points
         return None
 
-    def create_polygon(self, points, offset, color, skip):
-        r'''Does nothing if the points are not visible.
-
-        Returns True if the points are visible, False otherwise.
-
-        The `offset` is added to each point, and then the points are aligned
-        before checking for visibility.
+    def create_polygon(self, tile, color, aligned_points):
+        r'''The polygon isn't drawn until the plan is flushed, and isn't drawn at all
+        if it's hidden behind a wall panel.
         '''
-        aligned_points = self.align(points, offset)
-        if aligned_points is None:
-            return False
-        if not skip:
-            item = self.canvas.create_my_polygon("plan", color, *aligned_points,
-                                                 tags=('tile',))
-            if self.canvas.find_withtag("topmost"):
-                self.canvas.tag_lower(item, "topmost")
-        return True
+        if self.panel_index is not None and self.panel_index.covers(aligned_points):
+            return
+        self.placed_tiles.append(Placed_tile(tile, color, self.alignment.angle,
+                                             aligned_points))
 
-    def create_image(self, image, sw_offset, pos):
-        item = self.canvas.create_my_image("plan", image, sw_offset, pos, tags=('tile',))
-        if self.canvas.find_withtag("topmost"):
-            self.canvas.tag_lower(item, "topmost")
+    def create_image(self, tile, angle, points):
+        if self.panel_index is not None and self.panel_index.covers(points):
+            return
+        self.placed_tiles.append(Placed_tile(tile, None, angle + self.alignment.angle,
+                                             points))
 
     def place(self, step_name, tile, angle, constants, trace=()):
         r'''Returns True if displayed, False if not visible.
@@ -145,19 +580,21 @@ class Plan:
         if 'place' in trace:
             print(f"{step_name}.place(tile={tile}, angle={angle}, "
                   f"offset={f_to_str(constants['offset'])})")
-        the_tile = pick(tile, constants, 'tile')
-        visible = the_tile.place_at(constants['offset'], pick(angle, constants, 'angle'), self,
+        the_tile = pick(tile, constants, 'tile', trace=trace)
+        visible = the_tile.place_at(constants['offset'],
+                                    pick(angle, constants, 'angle', trace=trace), self,
                                     constants.get('skip', False))
         place(constants['offset'], visible)
         if visible:
-            constants['inc_x'] = the_tile.skip_x + self.grout_gap
-            constants['inc_y'] = the_tile.skip_y + self.grout_gap
+            _, skip_x, skip_y = the_tile.measurements(self.exact)
+            constants['inc_x'] = skip_x + self.gap
+            constants['inc_y'] = skip_y + self.gap
             if 'place' in trace or 'place_true' in trace:
                 print(f"{step_name}.place {the_tile.name=} -> True, "
                       f"offset={f_to_str(constants['offset'])}")
             return True
-        unpick(constants, 'tile')
-        unpick(constants, 'angle')
+        unpick(constants, 'tile', trace=trace)
+        unpick(constants, 'angle', trace=trace)
         if 'place' in trace:
             print(f"{step_name}.place -> False")
         return False
@@ -183,14 +620,14 @@ class Plan:
                   f"initial_x={f_to_str(initial_x)}, initial_y={f_to_str(initial_y)}")
 
         # These are passed on from one step to the next with save/use.
-        my_constants = ChainMap({}, constants)
+        my_constants = child_constants(constants)
         my_constants['initial_x'] = initial_x
         my_constants['initial_y'] = initial_y
 
         for i, step in enumerate(steps, 1):
             #print(f"{step_name}.sequence: step {i}, {step=}, {constants=}")
-            step = pick(step, constants, 'step')
-            if my_eval(step.get('skip', False), constants, f"<{step_name}.sequence: skip"):
+            step = pick(step, constants, 'step', trace=trace)
+            if step.skip(constants):
                 continue
             step_constants = my_constants.new_child()
             step_constants['offset'] = initial_x, initial_y
@@ -210,7 +647,7 @@ class Plan:
                         print(f"{step_name}.sequence step {i}: inc_y set to {f_to_str(inc_y)}")
                 visible = True
             else:
-                unpick(constants, 'step')
+                unpick(constants, 'step', trace=trace)
             #else:
             #    print(f"{step_name}.sequence step {i}: not visible")
         if visible:
@@ -227,6 +664,11 @@ class Plan:
                step_width_limit, step_height_limit, index_start, trace=()):
         r'''Repeat step `times` times (infinite in both directions if times is None).
 
+        If `times` is None, the range of repetitions covering the (unaligned) canvas, plus
+        step_width_limit/step_height_limit, is calculated directly, and then extended
+        (both ways) for as long as the step is still visible.  This catches steps that
+        reach further than the limits, like rows running across a turned wall.
+
         `increment` is added to the offset after each repetition.
 
         Returns True if any repetition is visible, False if nothing is visible.
@@ -255,6 +697,8 @@ class Plan:
         visible = False
         inc_x = inc_y = None
         x_inc, y_inc = increment
+        if not self.exact:
+            x_inc, y_inc = float(x_inc), float(y_inc)
         if 'xy_inc' in trace:
             print(f"{step_name} x_inc={f_to_str(x_inc)}, "
                   f"min_x={f_to_str(min_x)}, max_x={f_to_str(max_x)}")
@@ -263,34 +707,83 @@ class Plan:
         x, y = constants['offset']
         if 'xy' in trace:
             print(f"{step_name} initial offset: x={f_to_str(x)}, y={f_to_str(y)}")
-        if times is None:
-            # Back up x, y until they're before min/max ranges.
-            #
-            # Use index to also back up index_start.
-            for index in count(0):
-                keep_going = (x_inc == 0 and min_x <= x <= max_x or
-                              x_inc > 0 and x >= min_x or \
-                              x_inc < 0 and x <= max_x) and \
-                             (y_inc == 0 and min_y <= y <= max_y or
-                              y_inc > 0 and y >= min_y or \
-                              y_inc < 0 and y <= max_y)
-                if not keep_going:
-                    break
-                x, y = x - x_inc, y - y_inc
-                if index > 100:
-                    print(f"{step_name}: x={f_to_str(x)}, x_inc={f_to_str(x_inc)}")
-                    print(f"{step_name}: y={f_to_str(y)}, y_inc={f_to_str(y_inc)}")
-                    raise AssertionError(f"{step_name}: {index=} out of bounds backing up")
-            index_start -= index
+        extend = times is None
+        if extend:
+            # Back up x, y until they're before min/max ranges, then figure out how
+            # many times we have to go forward to get past them again.  After that,
+            # keep going for as long as the step is visible.
+            if x_inc == 0 and not min_x <= x <= max_x or \
+               y_inc == 0 and not min_y <= y <= max_y:
+                # never in range
+                back_up = times = 0
+            else:
+                # Where both x and y are in range.  If they never are at the same time,
+                # the step may still reach the canvas with only one of them in range
+                # (like a row of a diagonal pattern laid out far from its origin), so
+                # then where either one is.
+                for steps in min_steps, max_steps:
+                    back_up = steps(steps_back(x, x_inc, min_x, max_x),
+                                    steps_back(y, y_inc, min_y, max_y))
+                    assert back_up is not None, \
+                           f"{step_name}: repeat with increment={f_to_str(increment)} " \
+                           "never ends"
+                    times = steps(steps_forward(x - back_up * x_inc, x_inc, min_x, max_x),
+                                  steps_forward(y - back_up * y_inc, y_inc, min_y, max_y))
+                    if times:
+                        break
+                x, y = x - back_up * x_inc, y - back_up * y_inc
+                index_start -= back_up
             if 'xy' in trace:
-                print(f"{step_name} adjusted starting offset: x={f_to_str(x)}, y={f_to_str(y)}, {index_start=}")
-        offset = starting_offset = x, y
-
-        for index in (range(times) if times is not None else count(0)):
-            #print(f"{step_name} {index=}, offset={f_to_str(offset)}")
-            constants['offset'] = offset
+                print(f"{step_name} adjusted starting offset: x={f_to_str(x)}, "
+                      f"y={f_to_str(y)}, {index_start=}, {times=}")
+
+            # Then go back from there for as long as the step is still visible.  These
+            # steps are placed in reverse order, so their tiles are set aside and added
+            # in order afterwards.
+            before = []
+            for index in count(-1, -1):
+                constants['offset'] = x + index * x_inc, y + index * y_inc
+                constants['index'] = index + index_start
+                placed_tiles, self.placed_tiles = self.placed_tiles, []
+                step_visible = self.do_step(f"repeat {index=}",
+                                            pick(step, constants, 'step', trace=trace),
+                                            constants)
+                placed_tiles, self.placed_tiles = self.placed_tiles, placed_tiles
+                if not step_visible:
+                    unpick(constants, 'step', trace=trace)
+                    break
+                before.append(placed_tiles)
+                step_inc_x = constants['inc_x'] + index * x_inc
+                step_inc_y = constants['inc_y'] + index * y_inc
+                if inc_x is None or step_inc_x > inc_x:
+                    inc_x = step_inc_x
+                if inc_y is None or step_inc_y > inc_y:
+                    inc_y = step_inc_y
+                visible = True
+            for placed_tiles in reversed(before):
+                self.placed_tiles.extend(placed_tiles)
+
+        first = 0
+        if times and not trace and self.can_batch(step, constants):
+            batch_visible, batch_inc_x, batch_inc_y = \
+              self.repeat_places(constants, step, (x, y), increment, times, index_start)
+            if batch_visible:
+                visible = True
+                if inc_x is None or batch_inc_x > inc_x:
+                    inc_x = batch_inc_x
+                if inc_y is None or batch_inc_y > inc_y:
+                    inc_y = batch_inc_y
+            x, y = x + times * x_inc, y + times * y_inc
+            first = times
+
+        for index in count(first):
+            if index >= times and not extend:
+                break
+            #print(f"{step_name} {index=}, offset={f_to_str((x, y))}")
+            constants['offset'] = x, y
             constants['index'] = index + index_start
-            step_visible = self.do_step(f"repeat {index=}", pick(step, constants, 'step'),
+            step_visible = self.do_step(f"repeat {index=}",
+                                        pick(step, constants, 'step', trace=trace),
                                         constants, trace=(trace if index < 3 else ()))
             if step_visible:
                 step_inc_x = constants['inc_x'] + index * x_inc
@@ -301,24 +794,10 @@ class Plan:
                     inc_y = step_inc_y
                 visible = True
             else:
-                unpick(constants, 'step')
-            if times is None:
-                keep_going = step_visible or \
-                             (x_inc == 0 and min_x <= x <= max_x or
-                              x_inc > 0 and x <= max_x or \
-                              x_inc < 0 and x >= min_x) and \
-                             (y_inc == 0 and min_y <= y <= max_y or
-                              y_inc > 0 and y <= max_y or \
-                              y_inc < 0 and y >= min_y)
-                if not keep_going:
+                unpick(constants, 'step', trace=trace)
+                if index >= times:
                     break
-            if index > 100:
-                print(f"{step_name} x={f_to_str(x)}, x_inc={f_to_str(x_inc)}, "
-                      f"min_x={f_to_str(min_x)}, max_x={f_to_str(max_x)}")
-                print(f"{step_name} y={f_to_str(y)}, y_inc={f_to_str(y_inc)}, "
-                      f"min_y={f_to_str(min_y)}, max_y={f_to_str(max_y)}")
-                raise AssertionError(f"{step_name}: {index=} out of bounds, {step_visible=}")
-            x, y = offset = x + x_inc, y + y_inc
+            x, y = x + x_inc, y + y_inc
             if 'xy' in trace:
                 print(f"{step_name} x={f_to_str(x)}, y={f_to_str(y)}, {step_visible=}, {index=}")
         if visible:
@@ -330,19 +809,100 @@ class Plan:
             print(f"{step_name} -> {visible=}")
         return visible
 
+    def can_batch(self, step, constants):
+        r'''True if `step` (a step or list of steps to pick from) can be done by
+        repeat_places.
+
+        These must be simple place steps, with no tracing or index_by_counter.
+        '''
+        if 'index_by_counter' in constants:
+            return False
+        for s in (step if isinstance(step, (tuple, list)) else [step]):
+            s = compile_step(s, "can_batch")
+            if not isinstance(s, Place_step) or s.trace is not None or \
+               s.has_index_by_counter:
+                return False
+        return True
+
+    def repeat_places(self, constants, step, offset, increment, times, index_start):
+        r'''Does a repeat of place steps `times` times, aligning and checking the
+        visibility of all of the tiles together with Alignment.align_array.
+
+        Returns visible, inc_x, inc_y.
+        '''
+        x, y = offset
+        x_inc, y_inc = increment
+
+        # First figure out what goes where: [(index, tile, angle, offset, skip)]
+        placements = []
+        for index in range(times):
+            constants['offset'] = x, y
+            constants['index'] = index + index_start
+            place_step, _, new_constants, _ = \
+              self.begin_step(f"repeat {index=}", pick(step, constants, 'step'), constants)
+            placements.append((index,
+                               pick(place_step.tile(new_constants), new_constants, 'tile'),
+                               pick(place_step.angle(new_constants), new_constants, 'angle'),
+                               constants['offset'],
+                               new_constants.get('skip', False)))
+            x, y = x + x_inc, y + y_inc
+
+        if self.inexact is False and \
+           not all(all_exact(offset, *tile.measurements(self.exact)[0])
+                   for _, tile, _, offset, _ in placements):
+            self.inexact = True
+
+        # Then align them, grouped by number of points (so they fit in one array).
+        groups = {}
+        for i, (_, tile, _, _, _) in enumerate(placements):
+            groups.setdefault(len(tile.points), []).append(i)
+        aligned = [None] * len(placements)
+        origin, size = self.canvas.visible_area()
+        for group in groups.values():
+            aligned_points, mask = self.alignment.align_array(
+                                     [placements[i][1].measurements(self.exact)[0]
+                                      for i in group],
+                                     [placements[i][3] for i in group],
+                                     size, origin)
+            for i, tile_points, tile_visible in zip(group, aligned_points, mask):
+                if tile_visible:
+                    aligned[i] = [tuple(pt) for pt in tile_points]
+
+        # And finally, place the visible tiles in order.
+        visible = False
+        inc_x = inc_y = None
+        for (index, tile, angle, offset, skip), aligned_points in zip(placements, aligned):
+            place(offset, aligned_points is not None)
+            if aligned_points is None:
+                continue
+            if not skip:
+                tile.draw_at(angle, aligned_points, self)
+            _, skip_x, skip_y = tile.measurements(self.exact)
+            step_inc_x = skip_x + self.gap + index * x_inc
+            step_inc_y = skip_y + self.gap + index * y_inc
+            if inc_x is None or step_inc_x > inc_x:
+                inc_x = step_inc_x
+            if inc_y is None or step_inc_y > inc_y:
+                inc_y = step_inc_y
+            visible = True
+        return visible, inc_x, inc_y
+
     def section(self, step_name, step, pos, size, constants, trace=()):
-        print(f"section {step_name=}, pos={f_to_str(pos)}, size={f_to_str(size)}")
+        if 'section' in trace:
+            print(f"section {step_name=}, pos={f_to_str(pos)}, size={f_to_str(size)}")
         if not isinstance(step, dict):
             print(f"section got {step=}, expected dict")
-        canvas, item = self.canvas.create_canvas("section", pos, size, tags=('section',))
-        if self.canvas.find_withtag("topmost"):
-            self.canvas.tag_lower(item, "topmost")
+        canvas = self.canvas.create_section(pos, size)   # a render.Section
         plan = Plan(step_name, step, canvas, constants)
+        if 'exact' not in step:
+            plan.exact = self.exact
         plan.create(constants, trace=trace)
 
     def do_step(self, step_name, step, constants, trace=()):
         r'''Returns True if the step is visible, False otherwise.
 
+        `step` may be a compiled Step, or the step's yaml (which is compiled here).
+
         `offset` is the final position to place the lower-left corner of the step.  This can be
         specified directly in the step to completely override the offset it was given.
 
@@ -351,184 +911,48 @@ class Plan:
 
         Do not specify `offset`, `delta`, `delta_x` or `delta_y` in `constants`.
         '''
-        if 'trace' in step:
-            trace = tuple(step['trace'])
-        if 'name' in step:
-            step_name = step['name']
+        step, step_name, new_constants, trace = \
+          self.begin_step(step_name, step, constants, trace)
+        visible = step.run(self, step_name, new_constants, trace)
+        if visible:
+            constants['inc_x'] = new_constants['inc_x']
+            constants['inc_y'] = new_constants['inc_y']
+            if 'inc_x' in trace:
+                print(f"do_step {step_name}: inc_x={f_to_str(constants['inc_x'])}")
+            if 'inc_y' in trace:
+                print(f"do_step {step_name}: inc_y={f_to_str(constants['inc_y'])}")
+        return visible
+
+    def begin_step(self, step_name, step, constants, trace=()):
+        r'''Does everything in do_step up to running the step.
+
+        Returns the compiled step, step_name, new_constants and trace to run it with.
+        '''
+        step = compile_step(step, step_name)
+        if step.trace is not None and self.traces:
+            trace = step.trace
+        if step.name is not None:
+            step_name = step.name
         if 'do_step' in trace:
-            print(f"{self.name}.do_step({step_name=}, {step=})")
+            print(f"{self.name}.do_step({step_name=}, step={step.step})")
         if 'inc_x' in constants:
             constants['inc_x'] = None
         if 'inc_y' in constants:
             constants['inc_y'] = None
         if 'index_by_counter' in constants:
             constants['index_by_counter'] = None
-        new_constants = ChainMap({}, constants)
-        if 'index_by_counter' in step:
-            new_constants['index_by_counter'] = step['index_by_counter']
-        self.load_constants(new_constants, step, f"do_step {step_name} load_constants", trace)
-        if 'offset' in step:
-            constants['offset'] = eval_pair(step['offset'], new_constants,
-                                            f"<{step_name}.do_step: offset>")
+        new_constants = child_constants(constants)
+        if step.has_index_by_counter:
+            new_constants['index_by_counter'] = step.index_by_counter
+        step.constants.load(new_constants, f"do_step {step_name} load_constants", trace)
+        if step.offset is not None:
+            constants['offset'] = step.offset(new_constants)
         else:
-            if 'delta' in step:
-                delta = eval_pair(step['delta'], new_constants, f"<{step_name}.do_step: delta>")
-            else:
-                delta = (my_eval(step.get('delta_x', 0), new_constants,
-                                 f"<{step_name}.do_step: delta_x>"),
-                         my_eval(step.get('delta_y', 0), new_constants,
-                                 f"<{step_name}.do_step: delta_y>"))
+            delta = step.delta(new_constants)
             if 'delta' in trace:
                 print(f"do_step {step_name}: delta={f_to_str(delta)}")
-            constants['offset'] = (constants['offset'][0] + delta[0], 
+            constants['offset'] = (constants['offset'][0] + delta[0],
                                    constants['offset'][1] + delta[1])
         if 'offset' in trace:
             print(f"do_step {step_name}: offset={f_to_str(constants['offset'])}")
-        if step['type'] == 'place':
-            visible = self.place(step_name, eval_tile(step['tile'], new_constants),
-                                 my_eval(step.get('angle', 0), new_constants,
-                                         f"<{step_name}.do_step: place angle>"),
-                                 new_constants, trace=trace)
-            if visible:
-                constants['inc_x'] = new_constants['inc_x']
-                constants['inc_y'] = new_constants['inc_y']
-                if 'inc_x' in trace:
-                    print(f"do_step {step_name}: inc_x={f_to_str(constants['inc_x'])}")
-                if 'inc_y' in trace:
-                    print(f"do_step {step_name}: inc_y={f_to_str(constants['inc_y'])}")
-            return visible
-        if step['type'] == 'sequence':
-            visible = self.sequence(step_name, new_constants, *step['steps'], trace=trace)
-            if visible:
-                constants['inc_x'] = new_constants['inc_x']
-                constants['inc_y'] = new_constants['inc_y']
-                if 'inc_x' in trace:
-                    print(f"do_step {step_name}: inc_x={f_to_str(constants['inc_x'])}")
-                if 'inc_y' in trace:
-                    print(f"do_step {step_name}: inc_y={f_to_str(constants['inc_y'])}")
-            return visible
-        if step['type'] == 'repeat':
-            x, y = my_eval(step.get('start', (0, 0)), new_constants,
-                           f"<{step_name}.do_step: repeat start>")
-            x_off, y_off = new_constants['offset']
-            #print(f"do_step: repeat in {step_name} "
-            #      f"x={f_to_str(x)}, y={f_to_str(y)}, "
-            #      f"x_off={f_to_str(x_off)}, y_off={f_to_str(y_off)}")
-            new_constants['offset'] = x_off + x, y_off + y
-            visible = self.repeat(step_name, new_constants,
-                                  my_eval(step['step'], new_constants,
-                                    f"{step_name} repeat step"),
-                                  my_eval(step['increment'], new_constants,
-                                    f"<{step_name}.do_step: repeat increment>"),
-                                  my_eval(step.get('times', None), new_constants,
-                                    f"<{step_name}.do_step: repeat times>"),
-                                  my_eval(step.get('step_width_limit', 24), new_constants,
-                                    f"<{step_name}.do_step: repeat "
-                                    "step_width_limit>"),
-                                  my_eval(step.get('step_height_limit', 24), new_constants,
-                                    f"<{step_name}.do_step: repeat step_height_limit>"),
-                                  my_eval(step.get('index_start', 0), new_constants,
-                                    f"<{step_name}.do_step: repeat index_start>"),
-                                  trace=trace)
-            if visible:
-                constants['inc_x'] = new_constants['inc_x']
-                constants['inc_y'] = new_constants['inc_y']
-                if 'inc_x' in trace:
-                    print(f"do_step {step_name}: inc_x={f_to_str(constants['inc_x'])}")
-                if 'inc_y' in trace:
-                    print(f"do_step {step_name}: inc_y={f_to_str(constants['inc_y'])}")
-            return visible
-        if step['type'] == 'section':
-            visible = self.section(step_name, step,
-                                   eval_pair(step['pos'], new_constants,
-                                     f"<{step_name}.do_step: section pos>"),
-                                   eval_pair(step['size'], new_constants,
-                                     f"<{step_name}.do_step: section size>"),
-                                   new_constants, trace=trace)
-            if visible:
-                constants['inc_x'] = new_constants['inc_x']
-                constants['inc_y'] = new_constants['inc_y']
-                if 'inc_x' in trace:
-                    print(f"do_step {step_name}: inc_x={f_to_str(constants['inc_x'])}")
-                if 'inc_y' in trace:
-                    print(f"do_step {step_name}: inc_y={f_to_str(constants['inc_y'])}")
-            return visible
-
-        # else it's a call to a layout
-        new_step = app.Layouts[step['type']]
-        if 'trace' in new_step:
-            trace += tuple(new_step['trace'])
-        def lookup(param, defaults):
-            if param in step:
-                if param in ('tile', 'tiles') or param.startswith('tile_'):
-                    if 'lookup' in trace:
-                        print(f"{step_name}.lookup({param}) in step -- tile! "
-                              f"-- value is {step[param]}")
-                    ans = eval_tile(step[param], new_constants)
-                    #print(f"{step['type']}: setting {param=}, {step[param]=} to {ans}")
-                else:
-                    if 'lookup' in trace:
-                        print(f"{step_name}.lookup({param}) in step -- "
-                              f"value is {step[param]}")
-                    ans = my_eval(step[param], new_constants,
-                                  f"<{step_name}.do_step: layout {step['type']} "
-                                  f"{param}>")
-            #elif param in new_constants:
-            #    if 'lookup' in trace:
-            #        print(f"{step_name}.lookup({param}) in constants "
-            #              f"-- value is {f_to_str(constants[param])}")
-            #    ans = constants[param]
-            elif param in defaults:
-                ans = my_eval(defaults[param], new_constants,
-                              f"<{step_name}.do_step: layout {step['type']} "
-                              f"defaults {param}>")
-            else:
-                ans = None
-            if 'lookup' in trace:
-                print(f"{step['type']}: setting parameter {param} to {f_to_str(ans)}")
-            return ans
-        if 'defaults' in new_step:
-            defaults = new_step['defaults']
-        else:
-            defaults = {}
-        #print(f"{step['type']} {defaults=}")
-        for param in new_step.get('parameters', ()):
-            new_constants[param] = lookup(param, defaults)
-        #new_constants['plan'] = self
-        #new_constants['offset'] = constants['offset']
-        self.load_constants(new_constants, new_step, f"layout {step['type']} load_constants", trace)
-        visible = self.do_step(step['type'], new_step, new_constants, trace=trace)
-        if visible:
-            constants['inc_x'] = new_constants['inc_x']
-            constants['inc_y'] = new_constants['inc_y']
-            if 'inc_x' in trace:
-                print(f"do_step {step_name}: inc_x={f_to_str(constants['inc_x'])}")
-            if 'inc_y' in trace:
-                print(f"do_step {step_name}: inc_y={f_to_str(constants['inc_y'])}")
-        return visible
-
-    def load_constants(self, new_constants, step, location, trace):
-        if 'constants' in step:
-            def add_constants(constants):
-                for name, value in constants.items():
-                    if name == 'conditionals':
-                        for conditional in value:
-                            test = my_eval(conditional['test'], new_constants,
-                                           location + "conditionals test")
-                            if 'constants' in trace:
-                                print(f"{location}: add_constants got "
-                                      f"{conditional=}, {test=!r}")
-                            if test in conditional:
-                                add_constants(conditional[test])
-                            else:
-                                add_constants(conditional['else'])
-                    else:
-                        if name in ('tile', 'tiles') or name.startswith('tile_'):
-                            new_constants[name] = eval_tile(value, new_constants)
-                        else:
-                            new_constants[name] = my_eval(value, new_constants,
-                                                    location + f"{name}>")
-                        if 'constants' in trace or name in trace:
-                            print(f"{location} adding {name=}, value={f_to_str(new_constants[name])}")
-            add_constants(step['constants'])
-        #print(f"{location}: new_constants={f_to_str(new_constants)}")
+        return step, step_name, new_constants, trace
@@ -0,0 +1,344 @@
+# render.py
+
+r'''Render targets.
+
+A render target is what Walls and Plans draw on.  The Tk canvas in app.py
+(MyCanvas) is a render target, as is Memory_canvas here, which just records what's
+drawn in plain lists so that layouts can be done without Tk (e.g., in tests, or in
+batch jobs with no display).
+
+All measurements are in inches.  Render targets provide:
+
+    width_in, height_in, diagonal, boundary
+    current_grout_color
+    set_scale(width_in, height_in)
+    visible(points)
+    visible_area() -> (left, bottom), (width, height) that visible checks
+    erase_all()
+    erase_tiles()
+    set_grout_color(color)
+    clip_to_wall(width_in, height_in)
+    create_my_rectangle(caller, left_x, bottom_y, width, height, color, tags=())
+    create_my_circle(caller, color, pos, diameter, tags=())
+    create_panel_image(caller, panel, tags=())
+    create_tiles(placed_tiles, section=False)
+    create_section_grout(pos, size)
+    create_section(pos, size) -> render target for the section (see Section)
+
+Plans buffer the tiles that they place as Placed_tiles, and hand them all to the
+render target at once with create_tiles when the plan is done.
+
+Sections are drawn on the same render target as the rest of the wall, clipped to the
+section's rectangle, and over the tiles that aren't in sections.
+'''
+
+from math import hypot, floor, ceil
+from collections import namedtuple
+
+from utils import f_to_str
+from clip import clip_to_rect
+
+
+# `color` is None for image tiles.  The `angle` is how far the tile is turned on the
+# wall (for polygon tiles, just the plan's alignment angle).  The `points` are the
+# aligned points.  Image tiles in sections aren't clipped to the section's rectangle
+# like polygons are, so `clip` is the rectangle (left, bottom, right, top) that they
+# have to be cropped to when they're drawn (see clip_image), None to draw them whole.
+Placed_tile = namedtuple('Placed_tile', 'tile color angle points clip', defaults=(None,))
+
+
+def clip_image(image, sw_corner, scale, clip):
+    r'''Crops `image`, with its SW corner at `sw_corner` (x, y inches) and `scale`
+    pixels/inch, to the `clip` rectangle (left, bottom, right, top inches).
+
+    Returns the cropped image and its SW corner, or None if none of it is in `clip`.
+    Pixels partly in `clip` are kept.
+    '''
+    left, bottom, right, top = map(float, clip)
+    image_left = float(sw_corner[0])
+    image_top = float(sw_corner[1]) + image.height / scale
+    x0 = max(floor((left - image_left) * scale), 0)
+    x1 = min(ceil((right - image_left) * scale), image.width)
+    y0 = max(floor((image_top - top) * scale), 0)
+    y1 = min(ceil((image_top - bottom) * scale), image.height)
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return image.crop((x0, y0, x1, y1)), (image_left + x0 / scale, image_top - y1 / scale)
+
+
+class Render_target:
+    r'''The geometry common to all render targets.
+    '''
+    def set_size(self, width_in, height_in):
+        self.width_in = width_in
+        self.height_in = height_in
+        self.diagonal = hypot(width_in, height_in)
+        self.boundary = (0, 0), (width_in, 0), (width_in, height_in), (0, height_in)
+
+    def visible(self, points):
+        r'''True if there are points to the right of 0, left of width_in,
+        above 0, and below height_in.
+
+        These don't have to be the same point.  For example one point might be x < 0,
+        which counts for left of width_in, but not right of 0.  Another point might
+        be > width_in, which counts the other way.
+        '''
+        to_right = to_left = to_top = to_bottom = False
+        for x, y in points:
+            if x > 0: to_right = True
+            if x < self.width_in: to_left = True
+            if y > 0: to_top = True
+            if y < self.height_in: to_bottom = True
+        return all((to_left, to_right, to_top, to_bottom))
+
+    def visible_area(self):
+        return (0, 0), (self.width_in, self.height_in)
+
+    def create_section(self, pos, size):
+        return Section(self, pos, size)
+
+
+class Section(Render_target):
+    r'''The render target for a section step's plan.
+
+    The section has its own coordinates, with (0, 0) at `pos` on its parent.  What's
+    drawn here is moved to where it goes on the render target under all of the
+    sections (self.target), and clipped to the section's rectangle (intersected with
+    the rectangles of the sections that it's in).
+    '''
+    def __init__(self, parent, pos, size):
+        self.set_size(min(size[0], parent.width_in), min(size[1], parent.height_in))
+        if isinstance(parent, Section):
+            self.target = parent.target
+            self.pos = parent.pos[0] + pos[0], parent.pos[1] + pos[1]
+            left, bottom, right, top = parent.clip
+            self.clip = (max(left, self.pos[0]), max(bottom, self.pos[1]),
+                         min(right, self.pos[0] + size[0]), min(top, self.pos[1] + size[1]))
+        else:
+            self.target = parent
+            self.pos = pos
+            self.clip = pos[0], pos[1], pos[0] + size[0], pos[1] + size[1]
+        self.current_grout_color = self.target.current_grout_color
+        left, bottom, right, top = self.clip
+        if right > left and top > bottom:
+            self.target.create_section_grout((left, bottom), (right - left, top - bottom))
+
+    def __repr__(self):
+        return f"<Section: pos={f_to_str(self.pos)}, clip={f_to_str(self.clip)}>"
+
+    def erase_tiles(self):
+        r'''Erasing the tiles on self.target erases the sections too.
+        '''
+        pass
+
+    def set_grout_color(self, color):
+        self.current_grout_color = color
+
+    def create_tiles(self, placed_tiles, section=True):
+        r'''Image tiles are moved, but not clipped.  They're given the section's clip
+        rectangle, to be cropped to when they're drawn.
+        '''
+        x_pos, y_pos = self.pos
+        moved = []
+        for placed in placed_tiles:
+            points = [(x + x_pos, y + y_pos) for x, y in placed.points]
+            clipped = clip_to_rect(points, *self.clip)
+            if clipped is None:
+                continue
+            if placed.color is None:
+                moved.append(placed._replace(points=points, clip=self.clip))
+            else:
+                moved.append(placed._replace(points=clipped))
+        self.target.create_tiles(moved, section=True)
+
+
+class Recorder(Render_target):
+    r'''Records the tiles and section grout drawn on it, rather than drawing them, so
+    that they can be drawn on `target` (or drawn again) later (see replay).
+
+    Everything else is just `target`'s, except that if `area` (left, bottom, right,
+    top) is given, the tiles are laid out over `area` rather than over `target`
+    (which may be bigger or smaller).  Sections are still sized to fit `target`.
+    '''
+    def __init__(self, target, area=None):
+        self.target = target
+        self.area = area
+        self.calls = []     # [(method name, args)]
+        if area is not None:
+            left, bottom, right, top = area
+            self.boundary = (left, bottom), (right, bottom), (right, top), (left, top)
+            self.diagonal = hypot(right - left, top - bottom)
+
+    def __repr__(self):
+        return f"<Recorder: {len(self.calls)} calls for {self.target}>"
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
+
+    def visible(self, points):
+        if self.area is None:
+            return self.target.visible(points)
+        left, bottom, right, top = self.area
+        return any(x > left for x, _ in points) and any(x < right for x, _ in points) \
+           and any(y > bottom for _, y in points) and any(y < top for _, y in points)
+
+    def visible_area(self):
+        if self.area is None:
+            return self.target.visible_area()
+        left, bottom, right, top = self.area
+        return (left, bottom), (right - left, top - bottom)
+
+    def create_tiles(self, placed_tiles, section=False):
+        self.calls.append(('create_tiles', (placed_tiles, section)))
+
+    def create_section_grout(self, pos, size):
+        self.calls.append(('create_section_grout', (pos, size)))
+
+
+def replay(calls, target):
+    r'''Draws the `calls` recorded by a Recorder on `target`.
+    '''
+    for name, args in calls:
+        getattr(target, name)(*args)
+
+
+class Memory_canvas(Render_target):
+    r'''Records everything drawn on it in plain lists:
+
+        panels:   [(caller, shape, color, pos, size)], shape is 'rect', 'circle' or 'image'
+                  (color is the image file for 'image')
+        tiles:    [Placed_tile], in drawing order
+        sections: [(pos, size)] of the grout under each section
+
+    and provides these views of `tiles`:
+
+        polygons: [(color, points)]
+        images:   [(tile, angle, points)]
+
+    The `points` are the aligned points in inches.  The tiles in sections are included
+    in `tiles` (moved to where they go here), after (over) the tiles that aren't.
+    '''
+    def __init__(self, width_in=0, height_in=0, grout_color='black'):
+        self.set_size(width_in, height_in)
+        self.current_grout_color = grout_color
+        self.erase_all()
+
+    def __repr__(self):
+        return f"<Memory_canvas: {len(self.tiles)} tiles, {len(self.sections)} sections>"
+
+    def set_scale(self, width_in, height_in):
+        self.set_size(width_in, height_in)
+
+    def erase_all(self):
+        self.panels = []
+        self.erase_tiles()
+
+    def erase_tiles(self):
+        self.tiles = []
+        self.sections = []
+        self.num_unsectioned = 0       # tiles that aren't in sections
+
+    @property
+    def polygons(self):
+        return [(placed.color, placed.points) for placed in self.tiles
+                                              if placed.color is not None]
+
+    @property
+    def images(self):
+        return [(placed.tile, placed.angle, placed.points) for placed in self.tiles
+                                                            if placed.color is None]
+
+    def set_grout_color(self, color):
+        self.current_grout_color = color
+
+    def clip_to_wall(self, width_in, height_in):
+        pass
+
+    def create_my_rectangle(self, caller, left_x, bottom_y, width, height, color,
+                            tags=()):
+        self.panels.append((caller, 'rect', color, (left_x, bottom_y), (width, height)))
+
+    def create_my_circle(self, caller, color, pos, diameter, tags=()):
+        self.panels.append((caller, 'circle', color, pos, diameter))
+
+    def create_panel_image(self, caller, panel, tags=()):
+        self.panels.append((caller, 'image', panel.image_file, panel.pos, panel.size))
+
+    def create_tiles(self, placed_tiles, section=False):
+        tiles = [placed._replace(points=tuple(placed.points)) for placed in placed_tiles]
+        if section:
+            self.tiles.extend(tiles)
+        else:
+            self.tiles[self.num_unsectioned:self.num_unsectioned] = tiles
+            self.num_unsectioned += len(tiles)
+
+    def create_section_grout(self, pos, size):
+        self.sections.append((pos, size))
+
+
+def lay_out(wall, plan, canvas=None, constants=None, trace=()):
+    r'''Lays out `plan` on `wall` without needing Tk.
+
+    The data files must already be loaded (see doit.load).
+
+    Returns the `canvas` (a new Memory_canvas by default).
+    '''
+    if canvas is None:
+        canvas = Memory_canvas()
+    app.canvas = canvas
+    app.Wall_name = wall.name
+    app.Wall = wall
+    app.Plan_name = plan.name
+    app.Plan = plan
+    plan.canvas = canvas
+    wall.create()
+    plan.create(constants, trace=trace)
+    return canvas
+
+
+def compare_modes(wall, plan, tolerance=1e-6):
+    r'''Lays out `plan` on `wall` both exact (in Fractions) and not (in floats).
+
+    Returns a list of the differences in where the tiles were placed as
+    (what, exact, not_exact).  An empty list means the two modes placed the same tiles
+    in the same places (to within `tolerance` inches).
+    '''
+    hold_exact = plan.__dict__.get('exact')
+    try:
+        plan.exact = True
+        exact = lay_out(wall, plan)
+        plan.exact = False
+        not_exact = lay_out(wall, plan)
+    finally:
+        if hold_exact is None:
+            del plan.exact
+        else:
+            plan.exact = hold_exact
+    differences = []
+    compare_canvases(exact, not_exact, tolerance, differences)
+    return differences
+
+
+def compare_canvases(a, b, tolerance, differences):
+    def same_points(a_points, b_points):
+        return len(a_points) == len(b_points) and \
+               all(abs(a_x - b_x) <= tolerance and abs(a_y - b_y) <= tolerance
+                   for (a_x, a_y), (b_x, b_y) in zip(a_points, b_points))
+
+    for what, a_list, b_list in (('polygons', a.polygons, b.polygons),
+                                 ('images', a.images, b.images),
+                                 ('sections', a.sections, b.sections)):
+        if len(a_list) != len(b_list):
+            differences.append((f"number of {what}", len(a_list), len(b_list)))
+    for i, (a_polygon, b_polygon) in enumerate(zip(a.polygons, b.polygons)):
+        if a_polygon[0] != b_polygon[0] or not same_points(a_polygon[1], b_polygon[1]):
+            differences.append((f"polygon {i}", a_polygon, b_polygon))
+    for i, (a_image, b_image) in enumerate(zip(a.images, b.images)):
+        if a_image[0] is not b_image[0] or a_image[1] != b_image[1] or \
+           not same_points(a_image[2], b_image[2]):
+            differences.append((f"image {i}", a_image, b_image))
+    for i, (a_section, b_section) in enumerate(zip(a.sections, b.sections)):
+        if not same_points(a_section, b_section):
+            differences.append((f"section {i}", a_section, b_section))
+
+import app
@@ -7,13 +7,23 @@ from plan import Plan
 
 Settings_filename = "settings.yaml"
 
-def read_settings(filename=Settings_filename):
-    return init_settings(read_yaml(filename))
+def read_settings(filename=Settings_filename, old_settings=None):
+    return init_settings(read_yaml(filename), old_settings)
 
-def init_settings(settings):
+def init_settings(settings, old_settings=None):
+    r'''Plans in `old_settings` whose layout hasn't changed pass their compiled layout
+    on to the new Plan.
+    '''
     for wall_name, ws in settings['wall_settings'].items():
+        old_plans = {}
+        if old_settings is not None and wall_name in old_settings['wall_settings']:
+            old_plans = old_settings['wall_settings'][wall_name]['plans']
         for plan_name, plan in ws['plans'].items():
-            ws['plans'][plan_name] = Plan(plan_name, plan, app.canvas, {})
+            new_plan = Plan(plan_name, plan, app.canvas, {})
+            old_plan = old_plans.get(plan_name)
+            if old_plan is not None and old_plan.layout == new_plan.layout:
+                new_plan.program = old_plan.program
+            ws['plans'][plan_name] = new_plan
     return settings
 
 def dump(settings):
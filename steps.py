@@ -0,0 +1,273 @@
+# steps.py
+
+r'''Compiles the layout steps in settings.yaml and layouts.yaml into Step objects.
+
+Each step dict is compiled once into a Step with all of its expressions already
+compiled (see utils.compile_value), and each layout in layouts.yaml is compiled once
+the first time it's used.  Plan.do_step then runs these Steps, rather than
+re-interpreting the raw yaml dicts for every tile placed.
+
+The compiled steps are cached here, so clear_cache must be called whenever
+layouts.yaml or settings.yaml are (re)loaded.
+'''
+
+import app
+from utils import compile_value, compile_tile, f_to_str
+
+
+Step_cache = {}     # {id(step dict): (step dict, Step)}
+Layout_cache = {}   # {layout name: Layout}
+
+
+def clear_cache():
+    Step_cache.clear()
+    Layout_cache.clear()
+
+
+def compile_step(step, location):
+    r'''Compiles `step`, which may also be a list of steps (to pick from).
+
+    Steps that have already been compiled are returned as is.
+    '''
+    if isinstance(step, Step):
+        return step
+    if isinstance(step, (tuple, list)):
+        return [compile_step(s, location) for s in step]
+    cached = Step_cache.get(id(step))
+    if cached is not None and cached[0] is step:
+        return cached[1]
+    ans = Step_types.get(step['type'], Layout_step)(step, location)
+    Step_cache[id(step)] = step, ans
+    return ans
+
+
+def get_layout(name):
+    if name not in Layout_cache:
+        Layout_cache[name] = Layout(name)
+    return Layout_cache[name]
+
+
+def is_tile_param(name):
+    return name in ('tile', 'tiles') or name.startswith('tile_')
+
+
+def compile_arg(value, location):
+    r'''Like utils.compile_value, except that steps passed as values are compiled into
+    Steps.
+    '''
+    if isinstance(value, dict) and 'type' in value:
+        step = compile_step(value, location)
+        return lambda constants: step
+    if isinstance(value, list):
+        fns = tuple(compile_arg(x, location) for x in value)
+        return lambda constants: [fn(constants) for fn in fns]
+    return compile_value(value, location)
+
+
+def compile_pair(s, location):
+    assert isinstance(s, (tuple, list)) and len(s) == 2, \
+           f"{location} expected list of 2 exps, got {s!r}"
+    x, y = (compile_value(exp, location) for exp in s)
+    return lambda constants: (x(constants), y(constants))
+
+
+class Constants:
+    r'''The compiled `constants` of a step or layout, including `conditionals`.
+    '''
+    def __init__(self, constants, location):
+        # [(name, fn)] or [(None, (test_fn, {test_value: Constants}))], in yaml order
+        self.entries = []
+        for name, value in constants.items():
+            if name == 'conditionals':
+                for conditional in value:
+                    branches = {test: Constants(consts, location)
+                                for test, consts in conditional.items()
+                                if test != 'test'}
+                    self.entries.append(
+                      (None, (compile_value(conditional['test'],
+                                            f"<{location} conditionals test>"),
+                              branches)))
+            elif is_tile_param(name):
+                self.entries.append((name, compile_tile(value, f"<{location} {name}>")))
+            else:
+                self.entries.append((name, compile_value(value, f"<{location} {name}>")))
+
+    def load(self, new_constants, location, trace):
+        for name, fn in self.entries:
+            if name is None:
+                test_fn, branches = fn
+                test = test_fn(new_constants)
+                if 'constants' in trace:
+                    print(f"{location}: add_constants got {test=!r}")
+                if test in branches:
+                    branches[test].load(new_constants, location, trace)
+                else:
+                    branches['else'].load(new_constants, location, trace)
+            else:
+                new_constants[name] = fn(new_constants)
+                if 'constants' in trace or name in trace:
+                    print(f"{location} adding {name=}, "
+                          f"value={f_to_str(new_constants[name])}")
+
+
+class Step:
+    r'''The parts common to all steps.  The original yaml is in self.step.
+
+    Each kind of step (see Step_types and Layout_step) has a
+    run(plan, step_name, new_constants, trace) method, called by Plan.do_step, which
+    does the step on `plan` and returns True if the step is visible, False otherwise.
+
+    self.location names the step in error messages (see where), as "name: type", with
+    the `location` passed in standing in for the name if the step doesn't have one.
+    '''
+    def __init__(self, step, location):
+        self.step = step
+        self.type = step['type']
+        self.name = step.get('name')
+        self.location = f"{self.name or location}: {self.type}"
+        self.trace = tuple(step['trace']) if 'trace' in step else None
+        self.has_index_by_counter = 'index_by_counter' in step
+        self.index_by_counter = step.get('index_by_counter')
+        self.constants = Constants(step.get('constants', {}),
+                                   f"{self.location} constants")
+        self.skip = compile_value(step.get('skip', False), self.where("skip"))
+        self.offset = self.delta = None
+        if 'offset' in step:
+            self.offset = compile_pair(step['offset'], self.where("offset"))
+        elif 'delta' in step:
+            self.delta = compile_pair(step['delta'], self.where("delta"))
+        else:
+            self.delta = compile_pair((step.get('delta_x', 0), step.get('delta_y', 0)),
+                                      self.where("delta_x/delta_y"))
+
+    def where(self, what):
+        r'''The location of `what` in this step, for compile_value, etc.
+        '''
+        return f"<{self.location} {what}>"
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}: {self.name or self.type}>"
+
+
+class Place_step(Step):
+    def __init__(self, step, location):
+        super().__init__(step, location)
+        self.tile = compile_tile(step['tile'], self.where("tile"))
+        self.angle = compile_value(step.get('angle', 0), self.where("angle"))
+
+    def run(self, plan, step_name, new_constants, trace):
+        return plan.place(step_name, self.tile(new_constants), self.angle(new_constants),
+                          new_constants, trace=trace)
+
+
+class Sequence_step(Step):
+    def __init__(self, step, location):
+        super().__init__(step, location)
+        self.steps = [compile_step(s, self.location) for s in step['steps']]
+
+    def run(self, plan, step_name, new_constants, trace):
+        return plan.sequence(step_name, new_constants, *self.steps, trace=trace)
+
+
+class Repeat_step(Step):
+    def __init__(self, step, location):
+        super().__init__(step, location)
+        self.start = compile_value(step.get('start', (0, 0)), self.where("start"))
+        self.repeat_step = compile_arg(step['step'], self.where("step"))
+        self.increment = compile_value(step['increment'], self.where("increment"))
+        self.times = compile_value(step.get('times', None), self.where("times"))
+        self.step_width_limit = compile_value(step.get('step_width_limit', 24),
+                                              self.where("step_width_limit"))
+        self.step_height_limit = compile_value(step.get('step_height_limit', 24),
+                                               self.where("step_height_limit"))
+        self.index_start = compile_value(step.get('index_start', 0),
+                                         self.where("index_start"))
+
+    def run(self, plan, step_name, new_constants, trace):
+        x, y = self.start(new_constants)
+        x_off, y_off = new_constants['offset']
+        new_constants['offset'] = x_off + x, y_off + y
+        return plan.repeat(step_name, new_constants,
+                           self.repeat_step(new_constants),
+                           self.increment(new_constants),
+                           self.times(new_constants),
+                           self.step_width_limit(new_constants),
+                           self.step_height_limit(new_constants),
+                           self.index_start(new_constants),
+                           trace=trace)
+
+
+class Section_step(Step):
+    def __init__(self, step, location):
+        super().__init__(step, location)
+        self.pos = compile_pair(step['pos'], self.where("pos"))
+        self.size = compile_pair(step['size'], self.where("size"))
+
+    def run(self, plan, step_name, new_constants, trace):
+        return plan.section(step_name, self.step, self.pos(new_constants),
+                            self.size(new_constants), new_constants, trace=trace)
+
+
+class Layout_step(Step):
+    r'''A call to a layout in layouts.yaml.
+
+    The layout is looked up (and its arguments compiled) the first time the step is run.
+    '''
+    def __init__(self, step, location):
+        super().__init__(step, location)
+        self.args = None
+
+    def get_args(self, layout):
+        if self.args is None:
+            self.args = {}
+            for param in layout.parameters:
+                if param in self.step:
+                    if is_tile_param(param):
+                        self.args[param] = compile_tile(self.step[param],
+                                                        self.where(param))
+                    else:
+                        self.args[param] = compile_arg(self.step[param],
+                                                       self.where(param))
+        return self.args
+
+    def run(self, plan, step_name, new_constants, trace):
+        layout = get_layout(self.type)
+        if plan.traces:
+            trace += layout.trace
+        args = self.get_args(layout)
+        for param in layout.parameters:
+            if param in args:
+                if 'lookup' in trace:
+                    print(f"{step_name}.lookup({param}) in step -- "
+                          f"value is {self.step[param]}")
+                ans = args[param](new_constants)
+            elif param in layout.defaults:
+                ans = layout.defaults[param](new_constants)
+            else:
+                ans = None
+            if 'lookup' in trace:
+                print(f"{self.type}: setting parameter {param} to {f_to_str(ans)}")
+            new_constants[param] = ans
+        layout.body.constants.load(new_constants, f"layout {self.type} load_constants", trace)
+        return plan.do_step(self.type, layout.body, new_constants, trace=trace)
+
+
+Step_types = dict(
+    place=Place_step,
+    sequence=Sequence_step,
+    repeat=Repeat_step,
+    section=Section_step,
+)
+
+
+class Layout:
+    r'''A compiled layout from layouts.yaml.
+    '''
+    def __init__(self, name):
+        layout = app.Layouts[name]
+        self.name = name
+        self.parameters = tuple(layout.get('parameters', ()))
+        self.trace = tuple(layout['trace']) if 'trace' in layout else ()
+        self.defaults = {param: compile_value(exp, f"<layout {name} defaults {param}>")
+                         for param, exp in layout.get('defaults', {}).items()}
+        self.body = compile_step(layout, f"layout {name}")
@@ -0,0 +1,127 @@
+# takeoff.py
+
+r'''Material takeoff: how many of each tile a plan uses.
+
+The plan is laid out without Tk (see render.lay_out), then cut to fit the wall (see
+cuts.cut_tiles).  Each tile name (including the -flipped, -clipped, -mitred and
+with_color variants) is counted separately, along with its color (or image file), as:
+
+    whole - the number of tiles used whole
+    cut   - the number of tiles that have to be cut
+    area  - the area (square inches) of tile on the wall
+    waste - the area (square inches) cut off of the cut tiles
+
+The -clipped and -mitred tiles are counted as whole unless they have to be cut
+again, since they're smaller tiles to begin with.
+'''
+
+from time import perf_counter
+
+from utils import f_to_str
+from render import lay_out
+from cuts import cut_tiles
+
+
+class Tile_count:
+    def __init__(self, name, color):
+        self.name = name
+        self.color = color
+        self.whole = 0
+        self.cut = 0
+        self.area = 0
+        self.waste = 0
+
+    def __repr__(self):
+        return f"<Tile_count({self.name}, {self.color}): whole={self.whole}, " \
+               f"cut={self.cut}, area={f_to_str(float(self.area))}, " \
+               f"waste={f_to_str(float(self.waste))}>"
+
+    def add(self, cut):
+        r'''Adds a cuts.Cut for this tile.
+        '''
+        if cut.cut_area > 0:
+            self.cut += 1
+            self.waste += cut.cut_area
+        else:
+            self.whole += 1
+        self.area += cut.area
+
+
+def takeoff(wall, plan):
+    r'''Lays out `plan` on `wall`, and returns [Tile_count] sorted by tile name.
+    '''
+    return count_tiles(lay_out(wall, plan), wall)
+
+
+def count_tiles(canvas, wall):
+    r'''Returns [Tile_count] sorted by tile name for what's laid out on `canvas`.
+    '''
+    counts = {}   # {(name, color): Tile_count}
+    for cut in cut_tiles(canvas, wall):
+        tile = cut.placed.tile
+        color = cut.placed.color
+        if color is None:
+            color = tile.image_file
+        key = tile.name, color
+        if key not in counts:
+            counts[key] = Tile_count(tile.name, color)
+        counts[key].add(cut)
+    return sorted(counts.values(), key=lambda count: (count.name, count.color))
+
+
+def print_takeoff(counts):
+    name_width = max([len('tile')] + [len(count.name) for count in counts])
+    color_width = max([len('color')] + [len(count.color) for count in counts])
+    print(f"    {'tile':{name_width}} {'color':{color_width}} {'whole':>6} {'cut':>6} "
+          f"{'area sq in':>11} {'waste sq in':>12}")
+    for count in counts:
+        print(f"    {count.name:{name_width}} {count.color:{color_width}} "
+              f"{count.whole:6} {count.cut:6} "
+              f"{float(count.area):11.1f} {float(count.waste):12.1f}")
+    total_area = sum(count.area for count in counts)
+    total_waste = sum(count.waste for count in counts)
+    print(f"    total: {sum(count.whole for count in counts)} whole, "
+          f"{sum(count.cut for count in counts)} cut, "
+          f"{float(total_area) / 144:.2f} sq ft, "
+          f"{float(total_waste) / 144:.2f} sq ft waste")
+
+
+
+if __name__ == "__main__":
+    import argparse
+    import io
+    import contextlib
+
+    import app
+    import doit
+    from render import Memory_canvas
+    from plan import Plan
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fast", action="store_true",
+                        help="place tiles using floats rather than Fractions")
+    parser.add_argument("wall", nargs='?', help="default all walls")
+    parser.add_argument("plan", nargs='?', help="default all plans")
+
+    args = parser.parse_args()
+    if args.fast:
+        Plan.exact = False
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        doit.load(Memory_canvas())
+    start = perf_counter()
+    for wall_name, wall_settings in app.Settings['wall_settings'].items():
+        if args.wall is not None and wall_name != args.wall:
+            continue
+        for plan_name, plan in wall_settings['plans'].items():
+            if args.plan is not None and plan_name != args.plan:
+                continue
+            print(f"{wall_name}: {plan_name}")
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    counts = takeoff(app.Walls[wall_name], plan)
+            except Exception as e:
+                print(f"    failed: {e!r}")
+                continue
+            print_takeoff(counts)
+    print(f"done in {perf_counter() - start:.1f} seconds")
@@ -59,6 +59,13 @@ def test_rotate(pt, angle, value):
             assert alignment.unalign_pt(aligned) == approx(pt)
 
 
+@pytest.mark.parametrize("angle", (0, 45, -90))
+def test_set_angle(angle):
+    alignment = mk_alignment()
+    alignment.set_angle(angle)
+    assert alignment.rotate((1, 1)) == approx(mk_alignment(angle=angle).rotate((1, 1)))
+
+
 @pytest.mark.parametrize("x", (0, 1, -1))
 @pytest.mark.parametrize("y", (0, 1, -1))
 @pytest.mark.parametrize("x_offset", (0, 0.5, -0.5))
@@ -70,3 +77,26 @@ def test_offset(x, y, x_offset, y_offset):
     assert aligned == approx((x + x_offset, y + y_offset))
     assert alignment.unalign_pt(aligned) == approx(pt)
 
+
+
+@pytest.mark.parametrize("use_numpy", (True, False))
+@pytest.mark.parametrize("angle", (0, 30, -45, 90))
+def test_align_array(use_numpy, angle, monkeypatch):
+    import alignment as alignment_module
+    if use_numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(alignment_module, "np", None)
+    alignment = mk_alignment(angle=angle, offset=(0.5, -0.5))
+    tiles = [((0, 0), (0, 1), (1, 1), (1, 0)), ((2, 3), (-1, 4), (5, -2), (0, 0))]
+    offsets = [(0, 0), (10, -3)]
+    aligned_points, mask = alignment.align_array(tiles, offsets, (4, 4))
+    for tile, (x_off, y_off), tile_points, tile_visible \
+     in zip(tiles, offsets, aligned_points, mask):
+        expected = alignment.align((x + x_off, y + y_off) for x, y in tile)
+        for pt, expected_pt in zip(tile_points, expected):
+            assert tuple(pt) == approx(expected_pt)
+        assert tile_visible == alignment_module.visible(expected, (4, 4))
+    unaligned = alignment.unalign_array(aligned_points)
+    for pt, expected_pt in zip(unaligned[0], tiles[0]):
+        assert tuple(pt) == approx(expected_pt)
@@ -0,0 +1,116 @@
+# test_app.py
+
+import pytest
+
+from app import MyCanvas
+
+
+class Fake_canvas(MyCanvas):
+    r'''A MyCanvas that records the Tk calls made on it, rather than making them.
+
+    So it doesn't need a display.
+    '''
+    def __init__(self, width, height, scale=10):
+        self.my_width, self.my_height = width, height
+        self.my_scale = scale
+        self.image_items = {}
+        self.resize_job = None
+        self.calls = []
+
+    def record(self, *call):
+        self.calls.append(call)
+
+    def config(self, **kwargs):
+        self.record('config', kwargs)
+
+    def cget(self, option):
+        return "#777"
+
+    def winfo_reqwidth(self):
+        return self.my_width
+
+    def winfo_reqheight(self):
+        return self.my_height
+
+    def delete(self, *args):
+        self.record('delete', *args)
+
+    def scale(self, *args):
+        self.record('scale', *args)
+
+    def move(self, *args):
+        self.record('move', *args)
+
+    def itemconfig(self, item, **kwargs):
+        self.record('itemconfig', item, kwargs)
+
+    def create_rectangle(self, *args, **kwargs):
+        self.record('create_rectangle', *args, kwargs)
+
+    def after(self, ms, fn):
+        self.record('after', ms, fn)
+        return f"job{len(self.calls)}"
+
+    def after_cancel(self, job):
+        self.record('after_cancel', job)
+
+
+class Event:
+    def __init__(self, width, height):
+        self.width, self.height = width, height
+
+
+@pytest.mark.parametrize("size, scale", (
+    ((200, 100), 10),
+    ((400, 100), 10),
+    ((400, 300), 20),
+    ((100, 100), 5),
+))
+def test_fit_scale(size, scale):
+    canvas = Fake_canvas(*size)
+    canvas.set_size(20, 10)
+    canvas.fit_scale()
+    assert canvas.my_scale == scale
+
+
+def test_resized_nothing_drawn():
+    canvas = Fake_canvas(200, 100)
+    canvas.resize_job = "job"
+    canvas.new_size = 400, 300
+    canvas.resized()
+    assert canvas.size() == (400, 300)
+    assert canvas.my_scale == 10
+    assert canvas.resize_job is None
+    assert canvas.calls == [('config', dict(width=400, height=300))]
+
+
+def test_resized():
+    canvas = Fake_canvas(200, 100)
+    canvas.set_size(20, 10)
+    canvas.image_items = {7: lambda: "image at 20"}
+    canvas.new_size = 500, 200
+    canvas.resized()
+    assert canvas.size() == (500, 200)
+    assert canvas.my_scale == 20
+    assert canvas.calls[:5] == [
+        ('config', dict(width=500, height=200)),
+        ('delete', "clip"),
+        ('scale', "all", 0, 100, 2, 2),
+        ('itemconfig', 7, dict(image="image at 20")),
+        ('move', "all", 0, 100),
+    ]
+    # the wall is 400 x 200 pixels, so only the canvas to the right of it is covered
+    (name, corner1, corner2, kwargs), = canvas.calls[5:]
+    assert (name, corner1, corner2) == ('create_rectangle', (400, 200), (500, 0))
+    assert kwargs['tags'] == ("background", "topmost", "clip", "math")
+
+
+def test_on_resize():
+    canvas = Fake_canvas(200, 100)
+    canvas.on_resize(Event(300, 150))
+    canvas.on_resize(Event(400, 200))
+    assert canvas.new_size == (400, 200)
+    assert canvas.calls == [('after', 100, canvas.resized),
+                            ('after_cancel', "job1"),
+                            ('after', 100, canvas.resized)]
+    assert canvas.resize_job == "job3"
@@ -0,0 +1,60 @@
+# test_clip.py
+
+from fractions import Fraction
+import pytest
+
+from clip import clip_to_rect, cut_out, area
+
+
+Square = ((0, 0), (0, 4), (4, 4), (4, 0))
+
+
+@pytest.mark.parametrize("points, clipped", (
+    (Square, Square),
+    (((2, 2), (2, 6), (6, 6), (6, 2)), [(2, 4), (4, 4), (4, 2), (2, 2)]),
+    (((-2, 1), (-2, 3), (2, 3), (2, 1)), [(0, 1), (0, 3), (2, 3), (2, 1)]),
+    (((5, 1), (5, 3), (7, 3), (7, 1)), None),
+    (((4, 1), (4, 3), (7, 3), (7, 1)), None),
+    (((2, -2), (-2, 2), (2, 6), (6, 2)), [(0, 0), (0, 4), (4, 4), (4, 0)]),
+))
+def test_clip_to_rect(points, clipped):
+    ans = clip_to_rect(points, 0, 0, 4, 4)
+    if clipped is None:
+        assert ans is None
+    else:
+        assert sorted(ans) == sorted(clipped)
+
+
+def test_clip_exact():
+    points = ((0, 0), (Fraction(1, 3), 1), (1, 0))
+    ans = clip_to_rect(points, 0, 0, 1, Fraction(1, 2))
+    assert area(ans) == Fraction(1, 2) - Fraction(1, 8)
+    assert all(isinstance(x, (int, Fraction)) and isinstance(y, (int, Fraction))
+               for x, y in ans)
+
+
+@pytest.mark.parametrize("points, value", (
+    (Square, 16),
+    (((0, 0), (4, 0), (0, 3)), 6),
+    (((0, 0), (1, 1), (2, 2)), 0),
+))
+def test_area(points, value):
+    assert area(points) == value
+
+
+@pytest.mark.parametrize("hole, pieces_area", (
+    (((1, 1), (2, 1), (2, 2), (1, 2)), 15),
+    (((3, -1), (6, -1), (6, 2), (3, 2)), 14),
+    (((-1, -1), (6, -1), (6, 5), (-1, 5)), 0),
+))
+def test_cut_out(hole, pieces_area):
+    pieces = cut_out(list(Square), list(hole))
+    assert sum(area(piece) for piece in pieces) == pieces_area
+
+
+@pytest.mark.parametrize("hole", (
+    ((4, 0), (6, 0), (6, 4), (4, 4)),
+    ((5, -1), (6, -1), (6, 5), (5, 5)),
+))
+def test_cut_out_untouched(hole):
+    assert cut_out(Square, hole) == [Square]
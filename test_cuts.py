@@ -0,0 +1,82 @@
+# test_cuts.py
+
+import pytest
+
+pytest.importorskip("PIL")
+
+import app
+from render import lay_out
+from tile import Tile
+from walls import Wall
+from plan import Plan
+from steps import clear_cache
+from cuts import cut_tiles, dims
+
+
+@pytest.fixture
+def wall():
+    clear_cache()
+    app.Colors = {}
+    app.Layouts = {}
+    app.Tiles = {'white': Tile('white', ((0, 0), (0, 4), (4, 4), (4, 0)), 4, 4, 'white')}
+    return Wall("test", dict(grout=[22, 12], cabinet=dict(pos=[0, 8], size=[6, 4],
+                                                          color='brown')), {})
+
+
+def mk_plan(layout):
+    return Plan("test", dict(alignment=dict(angle=0, x_offset=0, y_offset=0),
+                             grout_gap=0, grout_color='black', layout=layout),
+                None, {})
+
+
+Stacked = dict(type='repeat',
+               step=dict(type='repeat',
+                         step=dict(type='place', tile='white'),
+                         increment=[4, 0]),
+               increment=[0, 4])
+
+
+def test_cut_tiles(wall):
+    cuts = cut_tiles(lay_out(wall, mk_plan(Stacked)), wall)
+    # the tile under the cabinet isn't drawn
+    assert len(cuts) == 6 * 3 - 1
+    whole = [cut for cut in cuts if not cut.cut_area]
+    assert len(whole) == 5 * 3 - 2
+    cut = {cut.placed.points[0]: cut for cut in cuts if cut.cut_area}
+    assert sorted(cut) == [(4, 8), (20, 0), (20, 4), (20, 8)]
+    assert cut[4, 8].dims == (2, 4) and cut[4, 8].area == 8 and cut[4, 8].cut_area == 8
+    assert cut[20, 0].dims == (2, 4) and cut[20, 0].area == 8
+
+
+def test_cut_tiles_section(wall):
+    # the section's tiles are clipped to the section before they get to cut_tiles
+    section = dict(type='section', pos=[8, 2], size=[6, 4], grout_gap=0,
+                   alignment=dict(angle=0, x_offset=0, y_offset=0), layout=Stacked)
+    canvas = lay_out(wall, mk_plan(dict(type='sequence', steps=[Stacked, section])))
+    cuts = cut_tiles(canvas, wall)
+    in_section = {min(cut.placed.points): cut for cut in cuts[canvas.num_unsectioned:]}
+    assert sorted(in_section) == [(8, 2), (12, 2)]
+    assert not in_section[8, 2].cut_area
+    assert in_section[12, 2].dims == (2, 4) and in_section[12, 2].cut_area == 8
+    # and the tiles under the section have it cut out of them
+    under = {min(cut.placed.points): cut for cut in cuts[:canvas.num_unsectioned]}
+    assert under[8, 0].area == 8 and under[8, 0].cut_area == 8
+
+
+def test_cut_tiles_slivers(wall):
+    # float noise along the wall's edge doesn't make the tile cut
+    canvas = lay_out(wall, mk_plan(Stacked))
+    placed = canvas.tiles[0]
+    canvas.tiles[0] = placed._replace(points=tuple((x - 1e-12, y)
+                                                   for x, y in placed.points))
+    cut = cut_tiles(canvas, wall)[0]
+    assert cut.cut_area == 0 and len(cut.pieces) == 1
+
+
+@pytest.mark.parametrize("points, angle, value", (
+    (((0, 0), (0, 4), (2, 4), (2, 0)), 0, (2, 4)),
+    (((0, 0), (-4, 0), (-4, 2), (0, 2)), 90, (2, 4)),
+    (((0, 0), (-1, 1), (1, 3), (2, 2)), 45, (2 ** 1.5, 2 ** 0.5)),
+))
+def test_dims(points, angle, value):
+    assert dims(points, angle) == pytest.approx(value)
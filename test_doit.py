@@ -0,0 +1,158 @@
+# test_doit.py
+
+import os
+import pytest
+
+pytest.importorskip("PIL")
+
+import app
+import utils
+import doit
+from render import Memory_canvas
+
+
+Files = {
+    'colors.csv': "Name, value\nwhite,#ffffff\nblue,#0000ff\n",
+    'shapes.yaml': """
+square:
+    type: polygon
+    parameters: [width]
+    points: [[0, 0], [0, width], [width, width], [width, 0]]
+    skip_x: width
+    skip_y: width
+rectangle:
+    type: polygon
+    parameters: [width, height]
+    points: [[0, 0], [0, height], [width, height], [width, 0]]
+    flipped:
+        arguments: [height, width]
+    skip_x: width
+    skip_y: height
+""",
+    'tiles.yaml': """
+white square:
+    shape: square
+    width: 4
+    color: white
+blue square:
+    shape: square
+    width: 2
+    color: blue
+stick:
+    shape: rectangle
+    width: 6
+    height: 1
+    color: blue
+""",
+    'layouts.yaml': """
+lay_row:
+    parameters: [step]
+    type: repeat
+    step: step
+    increment: [4, 0]
+""",
+    'walls.yaml': """
+Wall:
+    grout: [24, 12]
+Other:
+    grout: [12, 12]
+""",
+    'settings.yaml': """
+wall_settings:
+    Wall:
+        plans:
+            row:
+                alignment: {angle: 0, x_offset: 0, y_offset: 0}
+                grout_gap: 0
+                layout:
+                    type: lay_row
+                    step: {type: place, tile: white square}
+""",
+}
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "Data_dir", str(tmp_path))
+    monkeypatch.setattr(doit, "File_signatures", {})
+    for filename, contents in Files.items():
+        (tmp_path / filename).write_text(contents)
+    return tmp_path
+
+
+def rewrite(path, contents):
+    path.write_text(contents)
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_reload(data_dir):
+    doit.load(Memory_canvas())
+    tiles, walls = app.Tiles, app.Walls
+    assert sorted(tiles) == ['blue square', 'stick', 'stick-flipped', 'white square']
+    assert not tiles.tiles                 # nothing generated until looked up
+    assert tiles['stick-flipped'].skip_x == 1
+    assert sorted(tiles.tiles) == ['stick', 'stick-flipped']
+    tiles = dict(tiles)
+    plan = app.Settings['wall_settings']['Wall']['plans']['row']
+    plan.program = "compiled"
+
+    rewrite(data_dir / 'tiles.yaml', Files['tiles.yaml'].replace("width: 2", "width: 3"))
+    doit.load()
+    assert app.Tiles['white square'] is tiles['white square']
+    assert app.Tiles['blue square'] is not tiles['blue square']
+    assert app.Tiles['blue square'].skip_x == 3
+    assert app.Walls is walls
+    new_plan = app.Settings['wall_settings']['Wall']['plans']['row']
+    assert new_plan is not plan and new_plan.program == "compiled"
+
+    rewrite(data_dir / 'walls.yaml', Files['walls.yaml'].replace("[12, 12]", "[12, 10]"))
+    rewrite(data_dir / 'layouts.yaml', Files['layouts.yaml'] + "\n")
+    doit.load()
+    assert app.Walls['Wall'] is walls['Wall']
+    assert app.Walls['Other'].grout == (12, 10)
+    assert app.Settings['wall_settings']['Wall']['plans']['row'].program is None
+
+
+def test_reload_image(data_dir, monkeypatch):
+    from PIL import Image
+    from image_cache import Images
+
+    monkeypatch.chdir(data_dir)
+    (data_dir / 'images').mkdir()
+    Image.new('RGBA', (8, 8), 'red').save(data_dir / 'images' / 'pic.png')
+    rewrite(data_dir / 'tiles.yaml', Files['tiles.yaml'] + """
+picture:
+    shape: square
+    width: 4
+    image: pic.png
+""")
+    rewrite(data_dir / 'walls.yaml', Files['walls.yaml'] + """
+Pictured:
+    grout: [12, 12]
+    picture: {pos: [0, 0], size: [4, 4], image: pic.png}
+""")
+    Images.clear()
+    doit.load(Memory_canvas())
+    tile, white = app.Tiles['picture'], app.Tiles['white square']
+    walls = dict(app.Walls)
+
+    def pixel():
+        tile = app.Tiles['picture']
+        image = Images.get((tile.image_file, tile.rotation), tile.load_image, (4, 4))
+        return image.getpixel((2, 2))
+
+    assert pixel() == (255, 0, 0, 255)
+    doit.load()
+    assert app.Tiles['picture'] is tile and pixel() == (255, 0, 0, 255)
+
+    path = data_dir / 'images' / 'pic.png'
+    Image.new('RGBA', (8, 8), 'blue').save(path)
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    doit.load()
+    assert app.Tiles['picture'] is not tile and app.Tiles['white square'] is white
+    assert app.Walls['Pictured'] is not walls['Pictured']
+    assert app.Walls['Wall'] is walls['Wall']
+    assert pixel() == (0, 0, 255, 255)
+    Images.clear()
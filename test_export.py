@@ -0,0 +1,174 @@
+# test_export.py
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+import xml.etree.ElementTree as ET
+
+import app
+from render import lay_out
+from tile import Tile, Image_tile
+from walls import Wall
+from plan import Plan
+from steps import clear_cache
+from export import export_png, export_tiff, export_svg, export_pdf, rgb
+
+
+@pytest.fixture
+def wall():
+    clear_cache()
+    app.Colors = {}
+    app.Layouts = {}
+    app.Tiles = {'white': Tile('white', ((0, 0), (0, 4), (4, 4), (4, 0)), 4, 4, 'white')}
+    return Wall("test", dict(grout=[24, 12], cabinet=dict(pos=[0, 8], size=[6, 4],
+                                                          color='brown')), {})
+
+
+def mk_plan(tile='white', grout_color='black', angle=0):
+    layout = dict(type='repeat',
+                  step=dict(type='repeat', step=dict(type='place', tile=tile),
+                            increment=[5, 0]),
+                  increment=[0, 5])
+    return Plan("test", dict(alignment=dict(angle=angle, x_offset=0, y_offset=0),
+                             grout_gap=0, grout_color=grout_color, layout=layout),
+                None, {})
+
+
+def test_export_png(wall, tmp_path):
+    plan = mk_plan()
+    filename = tmp_path / "test.png"
+    export_png(lay_out(wall, plan), filename, scale=2)
+    image = Image.open(filename)
+    assert image.size == (48, 24)
+    assert image.getpixel((3, 21)) == rgb('white')      # tile at (1.5, 1.5)
+    assert image.getpixel((9, 21)) == rgb('black')      # grout at (4.5, 1.5)
+    assert image.getpixel((3, 1)) == rgb('brown')       # cabinet at (1.5, 11.5)
+    assert image.info['dpi'] == pytest.approx((2, 2), abs=0.01)
+
+
+@pytest.mark.parametrize("strip_height", (1, 7, 50))
+@pytest.mark.parametrize("jobs", (1, 2))
+def test_strips(wall, tmp_path, strip_height, jobs):
+    # turned tiles stick out of the strips, and the sink is drawn across strips
+    wall = Wall("test", dict(grout=[24, 12], sink=dict(pos=[9.3, 5.1], size=7.7,
+                                                       color='white')), {})
+    canvas = lay_out(wall, mk_plan(angle=20))
+    export_png(canvas, tmp_path / "whole.png", scale=3.3, strip_height=1000)
+    whole = Image.open(tmp_path / "whole.png")
+    export_png(canvas, tmp_path / "strips.png", scale=3.3, strip_height=strip_height,
+               jobs=jobs)
+    assert Image.open(tmp_path / "strips.png").tobytes() == whole.tobytes()
+    export_tiff(canvas, tmp_path / "strips.tif", scale=3.3, strip_height=strip_height,
+                jobs=jobs)
+    tiff = Image.open(tmp_path / "strips.tif")
+    assert tiff.info['dpi'] == pytest.approx((3.3, 3.3))
+    assert tiff.tobytes() == whole.tobytes()
+
+
+def test_export_svg(wall, tmp_path):
+    filename = tmp_path / "test.svg"
+    export_svg(wall, mk_plan(grout_color='gray'), filename)
+    svg = ET.parse(filename).getroot()
+    ns = '{http://www.w3.org/2000/svg}'
+    assert (svg.get('width'), svg.get('height')) == ('24in', '12in')
+    assert svg.find(f'{ns}style').text == '.grout { fill: #808080 }'
+    style, defs, grout, *tiles, cabinet = svg
+    assert grout.get('class') == 'grout'
+    assert cabinet.get('fill') == '#a52a2a'
+    assert len(tiles) == 5 * 3
+    assert all(tile.get('fill') == '#ffffff' for tile in tiles)
+    assert tiles[0].get('points') == "0,12 0,8 4,8 4,12"
+
+
+def test_export_svg_images(wall, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'images').mkdir()
+    Image.new('RGB', (40, 40), 'red').save(tmp_path / 'images' / 'red.png')
+    app.Tiles['red'] = Image_tile('red', ((0, 0), (0, 4), (4, 4), (4, 0)), 4, 4,
+                                  'red.png', 0)
+    filename = tmp_path / "test.svg"
+    export_svg(wall, mk_plan('red'), filename, image_scale=5)
+    svg = ET.parse(filename).getroot()
+    ns = '{http://www.w3.org/2000/svg}'
+    image, = svg.find(f'{ns}defs')
+    assert (image.get('width'), image.get('height')) == ('4', '4')
+    uses = svg.findall(f'{ns}use')
+    assert len(uses) == 5 * 3
+    assert (uses[0].get('x'), uses[0].get('y')) == ('0', '8')
+
+
+def mk_section_plan():
+    # red image tiles in a section that ends halfway across the second one
+    app.Tiles['red'] = Image_tile('red', ((0, 0), (0, 4), (4, 4), (4, 0)), 4, 4,
+                                  'red.png', 0)
+    section = dict(type='section', pos=[4, 4], size=[6, 4], grout_gap=0,
+                   alignment=dict(angle=0, x_offset=0, y_offset=0),
+                   layout=dict(type='repeat', step=dict(type='place', tile='red'),
+                               increment=[4, 0]))
+    return Plan("test", dict(alignment=dict(angle=0, x_offset=0, y_offset=0),
+                             grout_gap=0, grout_color='black',
+                             layout=dict(type='sequence',
+                                         steps=[mk_plan().layout, section])),
+                None, {})
+
+
+@pytest.fixture
+def red_png(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'images').mkdir()
+    Image.new('RGB', (40, 40), 'red').save(tmp_path / 'images' / 'red.png')
+
+
+def test_export_png_section_images(wall, tmp_path, red_png):
+    filename = tmp_path / "test.png"
+    export_png(lay_out(wall, mk_section_plan()), filename, scale=2)
+    image = Image.open(filename)
+    assert image.getpixel((19, 11)) == rgb('red')       # (9.5, 6.5) in the section
+    assert image.getpixel((21, 11)) == rgb('white')     # (10.5, 6.5) past its end
+
+
+def test_export_svg_section_images(wall, tmp_path, red_png):
+    filename = tmp_path / "test.svg"
+    export_svg(wall, mk_section_plan(), filename, image_scale=5)
+    ns = '{http://www.w3.org/2000/svg}'
+    widths = sorted(image.get('width')
+                    for image in ET.parse(filename).getroot().find(f'{ns}defs'))
+    assert widths == ['2', '4']
+
+
+def test_export_pdf(wall, tmp_path):
+    filename = tmp_path / "test.pdf"
+    export_pdf(wall, mk_plan(grout_color='gray'), filename)
+    pdf = filename.read_bytes()
+    assert pdf.startswith(b"%PDF-")
+    assert b"/MediaBox [0 0 1728 864]" in pdf
+    assert pdf.count(b"h f\n") == 5 * 3
+    assert b"% grout" not in pdf
+    xref = int(pdf.split(b"startxref\n")[1].split()[0])
+    assert pdf[xref:].startswith(b"xref\n0 ")
+    objects = pdf[xref:].split(b"\n")[3:]
+    for number, line in enumerate(objects, 1):
+        if line.startswith(b"trailer"):
+            break
+        offset = int(line[:10])
+        assert pdf[offset:].startswith(f"{number} 0 obj".encode())
+    assert list(tmp_path.iterdir()) == [filename]
+
+
+def test_export_pdf_fails(wall, tmp_path):
+    # nothing is written if the layout fails
+    filename = tmp_path / "test.pdf"
+    with pytest.raises(KeyError):
+        export_pdf(wall, mk_plan(tile='missing'), filename)
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("color, value", (
+    ('white', (255, 255, 255)),
+    ('#671906', (0x67, 0x19, 0x06)),
+    ('#CCC', (0xcc, 0xcc, 0xcc)),
+    ('not a color', (128, 128, 128)),
+))
+def test_rgb(color, value):
+    assert rgb(color) == value
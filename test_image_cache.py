@@ -0,0 +1,99 @@
+# test_image_cache.py
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from image_cache import Pyramid, Image_cache, image_bytes
+
+
+@pytest.mark.parametrize("size, level_width", (
+    ((1000, 800), 1000),
+    ((501, 400), 1000),
+    ((500, 400), 500),
+    ((300, 100), 500),
+    ((250, 200), 250),
+    ((100, 80), 125),
+    ((1, 1), 1),
+))
+def test_level_for(size, level_width):
+    pyramid = Pyramid(Image.new('RGBA', (1000, 800)))
+    assert pyramid.level_for(*size).width == level_width
+
+
+def test_get():
+    loads = []
+    def load():
+        loads.append(1)
+        return Image.new('RGBA', (400, 200), (10, 20, 30, 255))
+    cache = Image_cache()
+    image = cache.get('a', load, (100, 50))
+    assert image.size == (100, 50)
+    assert image.getpixel((50, 25)) == (10, 20, 30, 255)
+    assert cache.get('a', load, (100, 50)) is image
+    assert cache.get('a', load, (100, 50), 90).size == (50, 100)
+    assert cache.get('a', load, (300, 150)).size == (300, 150)
+    assert len(loads) == 1
+    assert cache.hits == 1
+    assert cache.misses == 3
+
+
+def test_resized_from_level():
+    # a window resize makes a new image from the same pyramid level, and only the
+    # last recent_images images are kept
+    cache = Image_cache(recent_images=2)
+    cache.get(('a',), lambda: Image.new('RGBA', (1000, 800)), (300, 240))
+    assert [level.width for level in cache.pyramids[('a',)].levels] == [1000, 500]
+    for width in range(301, 310):
+        assert cache.get(('a',), None, (width, 240)).size == (width, 240)
+    assert [level.width for level in cache.pyramids[('a',)].levels] == [1000, 500]
+    assert list(cache.images) == [(('a',), (308, 240), 0), (('a',), (309, 240), 0)]
+    assert cache.memory == 1000 * 800 * 4 + 500 * 400 * 4 + (308 + 309) * 240 * 4
+
+
+def test_memory_budget():
+    def load():
+        return Image.new('RGBA', (100, 100))
+    # the pyramid (100x100 and 50x50) and two 50x50 images
+    pyramid_bytes = 100 * 100 * 4 + 50 * 50 * 4
+    cache = Image_cache(memory_budget=pyramid_bytes + 2 * 50 * 50 * 4)
+    first = cache.get(('a',), load, (50, 50))
+    cache.get(('a',), load, (50, 50), 180)
+    assert cache.memory == pyramid_bytes + 2 * image_bytes(first)
+    cache.get(('a',), load, (50, 50), 90)
+    assert len(cache.images) == 2
+    assert cache.memory == pyramid_bytes + 2 * image_bytes(first)
+    assert (('a',), (50, 50), 0) not in cache.images
+
+
+def test_memory_budget_pyramids():
+    loads = []
+    def load():
+        loads.append(1)
+        return Image.new('RGBA', (100, 100))
+    cache = Image_cache(memory_budget=3 * 100 * 100 * 4 - 1)
+    cache.get(('a',), load, (100, 100))
+    cache.get(('b',), load, (100, 100))
+    # 'a' is dropped, then its pyramid
+    assert list(cache.pyramids) == [('b',)]
+    assert list(cache.images) == [(('b',), (100, 100), 0)]
+    assert cache.memory == 2 * 100 * 100 * 4
+    cache.get(('a',), load, (100, 100))
+    assert len(loads) == 3
+
+
+def test_forget():
+    loads = []
+    def load():
+        loads.append(1)
+        return Image.new('RGBA', (40, 20))
+    cache = Image_cache()
+    cache.get(('a.png', 0), load, (20, 10))
+    cache.get(('a.png', 90), load, (20, 10), 45)
+    kept = cache.get(('b.png', 0), load, (20, 10))
+    cache.forget('a.png')
+    assert list(cache.pyramids) == [('b.png', 0)]
+    # b.png's pyramid (40x20 and 20x10) and its 20x10 image
+    assert cache.memory == 40 * 20 * 4 + 2 * image_bytes(kept)
+    cache.get(('a.png', 0), load, (20, 10))
+    assert len(loads) == 4
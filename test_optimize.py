@@ -0,0 +1,67 @@
+# test_optimize.py
+
+import pytest
+
+pytest.importorskip("PIL")
+
+import app
+from tile import Tile
+from walls import Wall
+from plan import Plan, Layout_cache
+from steps import clear_cache
+from optimize import candidates, evaluate, rank
+
+
+@pytest.fixture
+def wall():
+    clear_cache()
+    app.Colors = {}
+    app.Layouts = {}
+    app.Tiles = {'white': Tile('white', ((0, 0), (0, 4), (4, 4), (4, 0)), 4, 4, 'white')}
+    return Wall("test", dict(grout=[22, 12]), {})
+
+
+@pytest.fixture
+def plan():
+    stacked = dict(type='repeat',
+                   step=dict(type='repeat',
+                             step=dict(type='place', tile='white'),
+                             increment=[4, 0]),
+                   increment=[0, 4])
+    return Plan("test", dict(alignment=dict(angle=0, x_offset=0, y_offset=0),
+                             grout_gap=0, grout_color='black', layout=stacked),
+                None, {})
+
+
+def test_candidates(plan):
+    assert candidates(plan.alignment, 2, 1) == [(0, 0, 0), (0, 1, 0), (1, 0, 0), (1, 1, 0)]
+    assert len(candidates(plan.alignment, 4, 1, angles=[0, 45])) == 32
+
+
+@pytest.mark.parametrize("x_offset, smallest_cut, cuts", (
+    (0, 2, 3),
+    (1, 1, 6),
+    (2, 2, 3),
+    (3, 3, 6),
+))
+def test_evaluate(wall, plan, x_offset, smallest_cut, cuts):
+    candidate = evaluate(wall, plan, x_offset, 0, 0)
+    assert candidate.smallest_cut == pytest.approx(smallest_cut)
+    assert candidate.cuts == cuts
+    assert plan.alignment.x_offset == 0
+
+
+def test_evaluate_uncached(wall, plan):
+    Layout_cache.clear()
+    turned = evaluate(wall, plan, 1, 0, 45)
+    evaluate(wall, plan, 1, 0, 0)
+    assert evaluate(wall, plan, 1, 0, 45) == turned
+    assert len(Layout_cache) == 0
+    assert plan.last_layout is None
+
+
+def test_rank(wall, plan):
+    results = sorted((evaluate(wall, plan, x, 0, 0) for x in range(4)), key=rank)
+    assert [candidate.x_offset for candidate in results] == [3, 0, 2, 1]
+    assert rank(evaluate(wall, plan, 0, 0, 0)._replace(smallest_cut=None, cuts=0)) \
+           < rank(results[0])
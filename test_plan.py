@@ -0,0 +1,79 @@
+# test_plan.py
+
+from fractions import Fraction
+import pytest
+
+import app
+from plan import (steps_back, steps_forward, min_steps, max_steps,
+                  depends_on_position)
+
+
+def in_range(x, low, high):
+    return low <= x <= high
+
+
+@pytest.mark.parametrize("x", (0, 5, Fraction(7, 3), -20, 20, 10.5))
+@pytest.mark.parametrize("inc", (1, -1, Fraction(3, 4), -2.5, 0))
+def test_steps_back(x, inc):
+    low, high = -10, 10.25
+    if inc == 0:
+        assert steps_back(x, inc, low, high) == (None if in_range(x, low, high) else 0)
+        return
+    steps = 0
+    while (x >= low if inc > 0 else x <= high):
+        x -= inc
+        steps += 1
+    assert steps_back(x + steps * inc, inc, low, high) == steps
+
+
+@pytest.mark.parametrize("x", (0, 5, Fraction(7, 3), -20, 20, 10.5))
+@pytest.mark.parametrize("inc", (1, -1, Fraction(3, 4), -2.5, 0))
+def test_steps_forward(x, inc):
+    low, high = -10, 10.25
+    if inc == 0:
+        assert steps_forward(x, inc, low, high) == (None if in_range(x, low, high) else 0)
+        return
+    steps = 0
+    while (x + steps * inc <= high if inc > 0 else x + steps * inc >= low):
+        steps += 1
+    assert steps_forward(x, inc, low, high) == steps
+
+
+@pytest.mark.parametrize("x_steps, y_steps, value", (
+    (None, None, None),
+    (None, 3, 3),
+    (4, None, 4),
+    (4, 3, 3),
+    (0, 3, 0),
+))
+def test_min_steps(x_steps, y_steps, value):
+    assert min_steps(x_steps, y_steps) == value
+
+
+@pytest.mark.parametrize("x_steps, y_steps, value", (
+    (None, None, None),
+    (None, 3, 3),
+    (4, None, 4),
+    (4, 3, 4),
+    (0, 3, 3),
+))
+def test_max_steps(x_steps, y_steps, value):
+    assert max_steps(x_steps, y_steps) == value
+
+
+@pytest.mark.parametrize("layout, depends", (
+    (dict(type='place', tile='white'), False),
+    (dict(type='section', alignment=dict(angle=0, x_offset=0, y_offset=0)), False),
+    (dict(type='sequence', steps=[dict(constants=dict(left='10 - plan.alignment.x_offset'))]),
+     True),
+    (dict(type='place', tile=['white', 'black'], index_by_counter='color'), True),
+    (dict(type='counted', tile='white'), True),
+    (dict(type='stacked', tile='white'), False),
+))
+def test_depends_on_position(layout, depends, monkeypatch):
+    monkeypatch.setattr(app, 'Layouts',
+                        dict(counted=dict(type='place', tile='tile', index_by_counter='c'),
+                             stacked=dict(type='repeat', step=dict(type='place', tile='tile'),
+                                          increment=[4, 0])),
+                        raising=False)
+    assert depends_on_position(layout) == depends
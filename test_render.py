@@ -0,0 +1,346 @@
+# test_render.py
+
+from fractions import Fraction
+import pytest
+
+pytest.importorskip("PIL")
+
+import app
+import render
+from render import Memory_canvas, lay_out
+from tile import Tile, Image_tile
+from walls import Wall
+import plan as plan_module
+from plan import Plan
+from clip import clip_to_rect, area
+from steps import clear_cache
+
+
+@pytest.fixture
+def wall():
+    clear_cache()
+    app.Colors = {}
+    app.Layouts = {}
+    app.Tiles = {'white': Tile('white', ((0, 0), (0, 4), (4, 4), (4, 0)), 4, 4, 'white')}
+    return Wall("test", dict(grout=[24, 12], cabinet=dict(pos=[0, 8], size=[6, 4],
+                                                          color='brown')), {})
+
+
+def mk_plan(layout, angle=0):
+    return Plan("test", dict(alignment=dict(angle=angle, x_offset=0, y_offset=0),
+                             grout_gap=0, grout_color='black', layout=layout),
+                None, {})
+
+
+Stacked = dict(type='repeat',
+               step=dict(type='repeat',
+                         step=dict(type='place', tile='white'),
+                         increment=[4, 0]),
+               increment=[0, 4])
+
+
+@pytest.mark.parametrize("points, visible", (
+    (((1, 1), (2, 2)), True),
+    (((-1, -1), (11, 11)), True),
+    (((-2, 1), (0, 2)), False),
+    (((10, 1), (12, 2)), False),
+    (((1, 10), (2, 12)), False),
+    (((-1, 5), (5, -1)), True),
+))
+def test_visible(points, visible):
+    assert Memory_canvas(10, 10).visible(points) == visible
+
+
+def test_lay_out(wall):
+    canvas = lay_out(wall, mk_plan(Stacked))
+    assert canvas.width_in == 24 and canvas.height_in == 12
+    assert canvas.panels[0] == ("grout_bg", 'rect', 'black', (0, 0), (24, 12))
+    assert canvas.panels[1] == ("wall", 'rect', 'brown', (0, 8), (6, 4))
+    # less the tile behind the cabinet
+    assert len(canvas.polygons) == 6 * 3 - 1
+    assert all(color == 'white' for color, _ in canvas.polygons)
+    assert ((0, 0), (0, 4), (4, 4), (4, 0)) in [points for _, points in canvas.polygons]
+    assert ((0, 8), (0, 12), (4, 12), (4, 8)) not in [points for _, points in canvas.polygons]
+    assert not canvas.images and not canvas.sections
+
+
+def test_lay_out_again(wall):
+    plan = mk_plan(Stacked)
+    canvas = lay_out(wall, plan)
+    assert len(lay_out(wall, plan, canvas).polygons) == 6 * 3 - 1
+
+
+def test_lay_out_times(wall):
+    # repeats of place steps with `times` go through Plan.repeat_places
+    rows = dict(type='repeat',
+                step=dict(type='repeat', step=dict(type='place', tile='white'),
+                          increment=[4, 0], times=7),
+                increment=[0, 4], times=3)
+    canvas = lay_out(wall, mk_plan(rows))
+    assert sorted(points for _, points in canvas.polygons) == \
+           sorted(points for _, points in lay_out(wall, mk_plan(Stacked)).polygons)
+
+
+def test_lay_out_small_tiles(wall):
+    # hundreds of repetitions per row
+    app.Tiles['dot'] = Tile('dot', ((0, 0), (0, 1/8), (1/8, 1/8), (1/8, 0)), 1/8, 1/8, 'red')
+    rows = dict(type='repeat',
+                step=dict(type='repeat', step=dict(type='place', tile='dot'),
+                          increment=['1/8', 0],
+                          step_width_limit='1/8', step_height_limit='1/8'),
+                increment=[0, '1/8'],
+                step_width_limit='1/8', step_height_limit='1/8')
+    assert len(lay_out(wall, mk_plan(rows)).polygons) == 24 * 8 * 12 * 8 - 6 * 8 * 4 * 8
+
+
+@pytest.mark.parametrize("traces", (True, False))
+def test_lay_out_traces(wall, traces, capsys, monkeypatch):
+    monkeypatch.setattr(Plan, 'traces', traces)
+    plan_module.Layout_cache.clear()
+    app.Tiles['black'] = Tile('black', ((0, 0), (0, 4), (4, 4), (4, 0)), 4, 4, 'black')
+    rows = dict(Stacked, trace=['repeat', 'pick'],
+                step=dict(Stacked['step'],
+                          step=dict(type='place', tile=['white', 'black'],
+                                    index_by_counter='color')))
+    lay_out(wall, mk_plan(rows))
+    out = capsys.readouterr().out
+    if traces:
+        assert "-> visible=True" in out and "got index_by_counter" in out
+    else:
+        assert out == ""
+
+
+@pytest.mark.parametrize("points, covered", (
+    (((0, 8), (0, 12), (4, 12), (4, 8)), True),
+    (((5, 11), (6, 12), (6, 11)), True),
+    (((5, 11), (7, 12), (6, 11)), False),
+    (((4, 6), (4, 10), (8, 10), (8, 6)), False),
+    (((19, 5), (19, 7), (21, 7), (21, 5)), True),
+    (((18, 5), (18, 7), (21, 7), (21, 5)), False),
+    (((12, 12), (12, 14), (14, 14)), False),
+))
+def test_panel_index(points, covered):
+    wall = Wall("test", dict(grout=[24, 12],
+                             cabinet=dict(pos=[0, 8], size=[6, 4], color='brown'),
+                             outlet=dict(pos=[20, 6], size=3, color='white'),
+                             window=dict(pos=[12, 12], size=[4, 4], color='blue',
+                                         skip=True)),
+                {})
+    assert wall.panel_index.covers(points) == covered
+
+
+def test_section(wall):
+    section = dict(type='section', pos=[4, 4], size=[8, 4], grout_gap=0,
+                   alignment=dict(angle=0, x_offset=0, y_offset=0), layout=Stacked)
+    canvas = lay_out(wall, mk_plan(section))
+    assert canvas.sections == [((4, 4), (8, 4))]
+    assert sorted(points[0] for _, points in canvas.polygons) == [(4, 4), (8, 4)]
+
+
+def test_section_clipped(wall):
+    # the section goes over the tiles placed after it, and is clipped to its size
+    section = dict(type='section', pos=[4, 4], size=[6, 4], grout_gap=0,
+                   alignment=dict(angle=0, x_offset=0, y_offset=0), layout=Stacked)
+    canvas = lay_out(wall, mk_plan(dict(type='sequence', steps=[section, Stacked])))
+    assert len(canvas.polygons) == 6 * 3 - 1 + 2
+    assert [sorted(points) for _, points in canvas.polygons[-2:]] == \
+           [[(4, 4), (4, 8), (8, 4), (8, 8)], [(8, 4), (8, 8), (10, 4), (10, 8)]]
+
+
+def test_section_images(wall):
+    # image tiles in a section are moved, and given the section's clip
+    app.Tiles['pic'] = Image_tile('pic', ((0, 0), (0, 4), (4, 4), (4, 0)), 4, 4,
+                                  'pic.png', 0)
+    section = dict(type='section', pos=[4, 4], size=[6, 4], grout_gap=0,
+                   alignment=dict(angle=0, x_offset=0, y_offset=0),
+                   layout=dict(type='repeat', step=dict(type='place', tile='pic'),
+                               increment=[4, 0]))
+    canvas = lay_out(wall, mk_plan(section))
+    assert [(placed.points[0], placed.clip) for placed in canvas.tiles] == \
+           [((4, 4), (4, 4, 10, 8)), ((8, 4), (4, 4, 10, 8))]
+
+
+def test_clipped_image_kept(monkeypatch):
+    # Tk drops an image when its PhotoImage is garbage collected, so the tile keeps it
+    from PIL import Image
+    import tile as tile_module
+    from image_cache import Images
+    monkeypatch.setattr(tile_module.ImageTk, 'PhotoImage', lambda image: [image])
+    monkeypatch.setattr(app, 'canvas', Memory_canvas(24, 12), raising=False)
+    app.canvas.my_scale = 10
+    app.canvas.in_to_px = lambda in_: float(in_) * app.canvas.my_scale
+    Images.clear()
+    pic = Image_tile('pic', ((0, 0), (0, 4), (4, 4), (4, 0)), 4, 4, 'pic.png', 0)
+    monkeypatch.setattr(pic, 'load_image', lambda: Image.new('RGBA', (40, 40)))
+    points = ((4, 4), (4, 8), (8, 8), (8, 4))
+    sw_corner, image = pic.get_clipped_image(0, points, (4, 4, 6, 8))
+    assert sw_corner == (4, 4) and image[0].size == (20, 40)
+    assert pic.get_clipped_image(0, list(points), (4, 4, 6, 8))[1] is image
+    assert pic.get_clipped_image(0, points, (10, 4, 12, 8)) is None
+    app.canvas.my_scale = 20
+    _, rescaled = pic.get_clipped_image(0, points, (4, 4, 6, 8))
+    assert rescaled is not image and rescaled[0].size == (40, 80)
+    Images.clear()
+
+
+@pytest.mark.parametrize("sw_corner, clip, box, new_corner", (
+    ((0, 0), (0, 0, 4, 2), (0, 0, 8, 4), (0, 0)),
+    ((0, 0), (1, 0, 4, 2), (2, 0, 8, 4), (1, 0)),
+    ((0, 0), (0, 0, 4, 1), (0, 2, 8, 4), (0, 0)),
+    ((0, 0), (-1, -1, 2.25, 1.25), (0, 1, 5, 4), (0, 0)),
+    ((10, 10), (11, 10, 20, 20), (2, 0, 8, 4), (11, 10)),
+    ((0, 0), (4, 0, 6, 2), None, None),
+))
+def test_clip_image(sw_corner, clip, box, new_corner):
+    # an 8x4 pixel image 4x2 inches
+    Image = pytest.importorskip("PIL.Image")
+    image = Image.new('L', (8, 4))
+    image.putdata(range(32))
+    clipped = render.clip_image(image, sw_corner, 2, clip)
+    if box is None:
+        assert clipped is None
+    else:
+        assert clipped[0].tobytes() == image.crop(box).tobytes()
+        assert clipped[1] == new_corner
+
+
+def test_layout_cache(wall):
+    section = dict(type='section', pos=[4, 4], size=[6, 4], grout_gap=0,
+                   alignment=dict(angle=0, x_offset=0, y_offset=0), layout=Stacked)
+    plan = mk_plan(dict(type='sequence', steps=[section, Stacked]))
+    first = lay_out(wall, plan)
+    hits, misses = plan_module.Layout_cache.hits, plan_module.Layout_cache.misses
+    again = lay_out(wall, plan)
+    assert plan_module.Layout_cache.hits == hits + 1
+    assert (again.tiles, again.num_unsectioned, again.sections) == \
+           (first.tiles, first.num_unsectioned, first.sections)
+
+    plan.alignment.x_offset = 1
+    moved = lay_out(wall, plan)
+    assert plan_module.Layout_cache.misses == misses + 1
+    assert moved.tiles != first.tiles
+    plan.alignment.x_offset = 0
+    assert lay_out(wall, plan).tiles == first.tiles
+    assert plan_module.Layout_cache.hits == hits + 2
+
+    # new tiles are new data
+    app.Tiles = dict(app.Tiles)
+    lay_out(wall, plan)
+    assert plan_module.Layout_cache.misses == misses + 2
+
+
+def realign(plan, angle, x_offset, y_offset):
+    r'''Changes the alignment of `plan`, last laid out with lay_out, like doit does.
+
+    Returns what's drawn as (tiles, num_unsectioned, sections).
+    '''
+    plan.alignment.set_angle(angle)
+    plan.alignment.x_offset, plan.alignment.y_offset = x_offset, y_offset
+    plan.create(realigned=True)
+    return plan.canvas.tiles, plan.canvas.num_unsectioned, plan.canvas.sections
+
+
+def full_layout(wall, plan):
+    plan_module.Layout_cache.clear()
+    canvas = lay_out(wall, plan)
+    return canvas.tiles, canvas.num_unsectioned, canvas.sections
+
+
+Basketweave = dict(type='repeat',
+                   step=dict(type='repeat',
+                             step=dict(type='sequence', steps=[
+                                 dict(type='place', tile='horz'),
+                                 dict(type='place', tile='horz', delta_y=2),
+                                 dict(type='place', tile='vert', delta_x=4),
+                                 dict(type='place', tile='vert', delta_x=6)]),
+                             increment=[8, 0]),
+                   increment=[4, 4], step_width_limit=8, step_height_limit=8)
+
+
+@pytest.mark.parametrize("layout", ('stacked', 'basketweave'))
+def test_aligned_pattern(wall, layout):
+    app.Tiles['horz'] = Tile('horz', ((0, 0), (0, 2), (4, 2), (4, 0)), 4, 2, 'white')
+    app.Tiles['vert'] = Tile('vert', ((0, 0), (0, 4), (2, 4), (2, 0)), 2, 4, 'black')
+    section = dict(type='section', pos=[4, 4], size=[6, 4], grout_gap=0,
+                   alignment=dict(angle=0, x_offset=0, y_offset=0), layout=Stacked)
+    if layout == 'stacked':
+        plan = mk_plan(dict(type='sequence', steps=[Stacked, section]), 30)
+    else:
+        plan = mk_plan(Basketweave)
+    lay_out(wall, plan)
+    for alignment in (30, Fraction(1, 8), 0), (30, Fraction(1, 8), Fraction(-5, 4)), \
+                     (30, -40, 0), (45, -40, 0), (45, 0, 0), (-10, 2, 3), (90, 0, 0):
+        aligned = realign(plan, *alignment)
+        assert plan.pattern_key() in plan_module.Pattern_cache
+        assert aligned == full_layout(wall, plan)
+
+
+def test_aligned_pattern_by_counter(wall):
+    app.Tiles['black'] = Tile('black', ((0, 0), (0, 4), (4, 4), (4, 0)), 4, 4, 'black')
+    rows = dict(Stacked, step=dict(Stacked['step'],
+                                   step=dict(type='place', tile=['white', 'black'],
+                                             index_by_counter='color')))
+    plan = mk_plan(rows)
+    lay_out(wall, plan)
+    tiles, _, _ = realign(plan, 0, 4, 0)
+    assert plan_module.Pattern_cache.get(plan.pattern_key(), lambda: 'missing') is None
+    assert tiles[0].color == 'white'
+
+
+def test_lay_out_never_realigns(wall):
+    plan = mk_plan(Stacked)
+    lay_out(wall, plan)
+    plan.alignment.x_offset = 1
+    lay_out(wall, plan)
+    assert plan.pattern_key() not in plan_module.Pattern_cache
+
+
+def test_get_inc_xy_cache(wall, monkeypatch):
+    app.Tiles['wide'] = Tile('wide', ((0, 0), (0, 4), (8, 4), (8, 0)), 8, 4, 'white')
+    plan = mk_plan(Stacked)
+    lay_out(wall, plan)
+    measured = []
+    measure = plan.measure
+    monkeypatch.setattr(plan, "measure", lambda *args: measured.append(1) or measure(*args))
+    step = dict(type='place', tile='tile')
+    assert plan.get_inc_xy(step, dict(tile='white', index=1)) == (4, 4)
+    assert plan.get_inc_xy(step, dict(tile='white', index=2)) == (4, 4)
+    assert len(measured) == 1
+    assert plan.get_inc_xy(step, dict(tile='wide', index=1)) == (8, 4)
+    assert len(measured) == 2
+
+
+# Rows running diagonally, so that the rows reach far past the limits of the repeat
+# of rows.
+Diagonal_rows = dict(type='repeat',
+                     step=dict(type='repeat', step=dict(type='place', tile='white'),
+                               increment=[4, 4]),
+                     increment=[4, 0], step_width_limit=4, step_height_limit=4)
+
+
+@pytest.mark.parametrize("angle", (0, 30, 45, -60))
+def test_repeat_covers_wall(wall, angle):
+    bare_wall = Wall("bare", dict(grout=[24, 12]), {})    # no panels to hide tiles
+    canvas = lay_out(bare_wall, mk_plan(Diagonal_rows, angle))
+    covered = sum(area(points) for points in
+                  (clip_to_rect([(float(x), float(y)) for x, y in placed.points],
+                                0, 0, 24, 12)
+                   for placed in canvas.tiles)
+                  if points is not None)
+    assert covered == pytest.approx(24 * 12)
+
+
+@pytest.mark.parametrize("angle", (0, 30, -45))
+def test_compare_modes(wall, angle):
+    app.Tiles['small'] = Tile('small', ((0, 0), (0, Fraction(5, 16)),
+                                        (Fraction(3, 8), Fraction(5, 16)), (Fraction(3, 8), 0)),
+                              Fraction(3, 8), Fraction(5, 16), 'white')
+    rows = dict(type='repeat',
+                step=dict(type='repeat', step=dict(type='place', tile='small'),
+                          increment=['3/8', 0],
+                          step_width_limit=1, step_height_limit=1),
+                increment=['3/16', '5/16'],
+                step_width_limit=1, step_height_limit=1)
+    plan = mk_plan(rows, angle)
+    assert render.compare_modes(wall, plan) == []
+    assert plan.exact
@@ -0,0 +1,151 @@
+# test_steps.py
+
+from fractions import Fraction
+import pytest
+
+import app
+from steps import (compile_step, clear_cache, Step_cache, Constants, Place_step,
+                   Sequence_step, Repeat_step, Section_step, Layout_step)
+
+
+@pytest.fixture(autouse=True)
+def data():
+    clear_cache()
+    app.Tiles = {'white': 'the white tile', 'black': 'the black tile'}
+    app.Layouts = {}
+
+
+class Fake_plan:
+    r'''Records the calls the steps make on their plan.
+    '''
+    traces = True
+
+    def __init__(self):
+        self.calls = []
+
+    def place(self, step_name, tile, angle, constants, trace=()):
+        self.calls.append(('place', step_name, tile, angle))
+        return True
+
+    def sequence(self, step_name, constants, *steps, trace=()):
+        self.calls.append(('sequence', step_name, steps))
+        return True
+
+    def repeat(self, step_name, constants, step, increment, times,
+               step_width_limit, step_height_limit, index_start, trace=()):
+        self.calls.append(('repeat', step_name, constants['offset'], step, increment,
+                           times, step_width_limit, step_height_limit, index_start))
+        return False
+
+    def section(self, step_name, step, pos, size, constants, trace=()):
+        self.calls.append(('section', step_name, step, pos, size))
+        return True
+
+    def do_step(self, step_name, step, constants, trace=()):
+        self.calls.append(('do_step', step_name, step, dict(constants)))
+        return True
+
+
+def test_compile_step():
+    place = dict(type='place', tile='white')
+    step = compile_step(place, "test")
+    assert isinstance(step, Place_step)
+    assert compile_step(place, "test") is step
+    assert compile_step(step, "test") is step
+    assert Step_cache[id(place)] == (place, step)
+    steps = compile_step([place, dict(type='place', tile='black')], "test")
+    assert steps[0] is step and isinstance(steps[1], Place_step)
+    assert isinstance(compile_step(dict(type='my_layout'), "test"), Layout_step)
+    # an equal dict is a different step
+    assert compile_step(dict(place), "test") is not step
+
+
+def test_step():
+    step = compile_step(dict(type='place', tile='white', name='first', trace=['xy'],
+                             index_by_counter='color', delta_x=1, delta_y='a'), "test")
+    assert (step.type, step.name, step.trace) == ('place', 'first', ('xy',))
+    assert step.has_index_by_counter and step.index_by_counter == 'color'
+    assert step.offset is None and step.delta(dict(a=2)) == (1, 2)
+    assert step.skip({}) is False
+    step = compile_step(dict(type='place', tile='white', offset=[1, '1/2']), "test")
+    assert step.offset({}) == (1, Fraction(1, 2)) and step.delta is None
+
+
+@pytest.mark.parametrize("step, attr, location", (
+    (dict(type='place', tile='white', name='first', skip='oops'), 'skip',
+     "<first: place skip>"),
+    (dict(type='place', tile='white', name='first', angle='oops'), 'angle',
+     "<first: place angle>"),
+    (dict(type='repeat', step=dict(type='place', tile='white'), increment='oops'),
+     'increment', "<test: repeat increment>"),
+    (dict(type='section', pos=['oops', 0], size=[1, 1]), 'pos', "<test: section pos>"),
+))
+def test_step_location(step, attr, location):
+    # the base Step and its subclasses name the step the same way
+    with pytest.raises(NameError) as excinfo:
+        getattr(compile_step(step, "test"), attr)({})
+    assert excinfo.traceback[-1].frame.code.raw.co_filename == location
+
+
+def test_constants():
+    constants = Constants(dict(a=1, b='a + 1', tile='black',
+                               conditionals=[{'test': 'b', 2: dict(c='b * 2'),
+                                              'else': dict(c=0)}]),
+                          "test")
+    new_constants = {}
+    constants.load(new_constants, "test", ())
+    assert new_constants == dict(a=1, b=2, tile='the black tile', c=4)
+
+
+def test_place_step():
+    plan = Fake_plan()
+    step = compile_step(dict(type='place', tile='tile', angle='a * 2'), "test")
+    assert step.run(plan, "place", dict(tile='white', a=45), ())
+    assert plan.calls == [('place', "place", 'the white tile', 90)]
+
+
+def test_sequence_step():
+    plan = Fake_plan()
+    steps = [dict(type='place', tile='white'), dict(type='place', tile='black')]
+    step = compile_step(dict(type='sequence', steps=steps), "test")
+    assert isinstance(step, Sequence_step)
+    assert step.run(plan, "sequence", {}, ())
+    (name, step_name, compiled), = plan.calls
+    assert (name, step_name) == ('sequence', "sequence")
+    assert compiled == tuple(compile_step(steps, "test"))
+
+
+def test_repeat_step():
+    plan = Fake_plan()
+    place = dict(type='place', tile='white')
+    step = compile_step(dict(type='repeat', step=place, start=[1, 2],
+                             increment=['w', 0], times=3, step_height_limit=8), "test")
+    assert isinstance(step, Repeat_step)
+    assert not step.run(plan, "repeat", dict(offset=(10, 20), w=4), ())
+    assert plan.calls == [('repeat', "repeat", (11, 22), compile_step(place, "test"),
+                           [4, 0], 3, 24, 8, 0)]
+
+
+def test_section_step():
+    plan = Fake_plan()
+    section = dict(type='section', pos=[1, 'y'], size=[6, 4], layout={})
+    step = compile_step(section, "test")
+    assert isinstance(step, Section_step)
+    assert step.run(plan, "section", dict(y=2), ())
+    assert plan.calls == [('section', "section", section, (1, 2), (6, 4))]
+
+
+def test_layout_step():
+    app.Layouts = dict(rows=dict(parameters=['tile', 'width', 'height', 'row'],
+                                 defaults=dict(height='width / 2'),
+                                 constants=dict(area='width * height'),
+                                 type='place', tile='tile'))
+    plan = Fake_plan()
+    step = compile_step(dict(type='rows', tile='black', width=4,
+                             row=dict(type='place', tile='white')), "test")
+    assert step.run(plan, "rows", {}, ())
+    (name, step_name, body, constants), = plan.calls
+    assert (name, step_name) == ('do_step', 'rows')
+    assert isinstance(body, Place_step) and body.step is app.Layouts['rows']
+    assert constants == dict(tile='the black tile', width=4, height=2, area=8,
+                             row=compile_step(step.step['row'], "test"))
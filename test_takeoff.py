@@ -0,0 +1,61 @@
+# test_takeoff.py
+
+import pytest
+
+pytest.importorskip("PIL")
+
+import app
+from tile import Tile
+from walls import Wall
+from plan import Plan
+from steps import clear_cache
+from takeoff import takeoff
+
+
+@pytest.fixture
+def wall():
+    clear_cache()
+    app.Colors = {}
+    app.Layouts = {}
+    white = Tile('white', ((0, 0), (0, 4), (4, 4), (4, 0)), 4, 4, 'white')
+    app.Tiles = {'white': white, 'white-blue': white.with_color('blue')}
+    return Wall("test", dict(grout=[22, 12], cabinet=dict(pos=[0, 8], size=[6, 4],
+                                                          color='brown')), {})
+
+
+Stacked = dict(type='repeat',
+               step=dict(type='repeat',
+                         step=dict(type='place', tile='white'),
+                         increment=[4, 0]),
+               increment=[0, 4])
+
+
+def mk_plan(section_size):
+    # a section of blue tiles over the white ones
+    blue = dict(type='section', pos=[8, 0], size=section_size, grout_gap=0,
+                alignment=dict(angle=0, x_offset=0, y_offset=0),
+                layout=dict(type='repeat', step=dict(type='place', tile='white-blue'),
+                            increment=[4, 0]))
+    return Plan("test", dict(alignment=dict(angle=0, x_offset=0, y_offset=0),
+                             grout_gap=0, grout_color='black',
+                             layout=dict(type='sequence', steps=[Stacked, blue])),
+                None, {})
+
+
+def test_takeoff(wall):
+    white, blue = takeoff(wall, mk_plan([8, 4]))
+    assert (white.name, white.color) == ('white', 'white')
+    assert (blue.name, blue.color) == ('white-blue', 'blue')
+    assert (white.whole, white.cut) == (6 * 3 - 1 - 2 - 4, 4)
+    assert (blue.whole, blue.cut) == (2, 0)
+    assert white.area + blue.area == 22 * 12 - 6 * 4
+    assert white.waste == 4 * 8 and blue.waste == 0
+
+
+def test_takeoff_clipped_section(wall):
+    # the section ends halfway across a tile, which is cut to fit it
+    white, blue = takeoff(wall, mk_plan([6, 4]))
+    assert (white.whole, white.cut) == (6 * 3 - 1 - 1 - 5, 5)
+    assert (blue.whole, blue.cut) == (1, 1)
+    assert white.area + blue.area == 22 * 12 - 6 * 4
+    assert white.waste == 5 * 8 and blue.waste == 8
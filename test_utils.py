@@ -1,6 +1,8 @@
 # test_utils.py
 
+import os
 from fractions import Fraction
+from collections import ChainMap
 import pytest
 from unittest.mock import Mock
 
@@ -88,6 +90,44 @@ def test_my_eval(s, constants, value):
     assert utils.my_eval(s, constants, "<test>") == value
 
 
+@pytest.mark.parametrize("s, value", (
+    ('b + 1.1/4 - a', Fraction(9, 4)),
+    ('constants["b"]', 2),
+    (123, 123),
+    (['a', 'b + 1/4'], [1, Fraction(9, 4)]),
+    (('a', 'b'), (1, 2)),
+))
+def test_compile_value(s, constants, value):
+    fn = utils.compile_value(s, "<test>")
+    assert fn(constants) == value
+    assert fn(dict(a=1, b=2)) == utils.my_eval(s, dict(a=1, b=2), "<test>")
+
+
+@pytest.mark.parametrize("s, constants, value", (
+    ('a + b', ChainMap(dict(a=1), dict(b=2)), 3),
+    ('abs(b) + sqrt(4)', dict(b=-2), 4.0),
+    ('abs(b)', dict(abs=lambda x: 10, b=-2), 10),        # constant hides the builtin
+    ('a if a else undefined', dict(a=1), 1),
+    ('undefined if a else 2', dict(a=0), 2),
+    ('sum(x * 2 for x in (1, b))', dict(b=2), 6),       # binds its own name
+    ('constants["a"] + a', dict(a=1), 2),
+))
+def test_compile_fn(s, constants, value):
+    assert utils.compile_fn(s, "<test>")(constants) == value
+
+
+def test_compile_fn_undefined():
+    with pytest.raises(NameError):
+        utils.compile_fn("undefined + 1", "<test>")({})
+
+
+def test_child_constants():
+    constants = utils.child_constants(ChainMap(dict(a=1), dict(b=2)), dict(c=3))
+    assert len(constants.maps) == 3
+    constants.maps[1]['a'] = 4
+    assert (constants['a'], constants['b'], constants['c']) == (4, 2, 3)
+
+
 @pytest.mark.parametrize("s, relaxed, value", (
     (('1.1/4', 'a'), False, (Fraction(5, 4), 1)),
     (('a + 1/4', '79'), False, (Fraction(5, 4), 79)),
@@ -117,3 +157,95 @@ def test_eval_color(s, colors, value):
 ))
 def test_multi_getattr(value, ans):
     assert utils.multi_getattr(value, 'a') == ans
+
+
+def test_lru_cache():
+    cache = utils.Lru_cache(2)
+    assert cache.get('a', lambda: 1) == 1
+    assert cache.get('b', lambda: 2) == 2
+    assert cache.get('a', lambda: 3) == 1      # hit, and now most recently used
+    assert cache.get('c', lambda: 4) == 4      # drops 'b'
+    assert 'a' in cache and 'b' not in cache and len(cache) == 2
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_compile_fn_location():
+    utils.compile_fn("1 / zero", "<first>")
+    with pytest.raises(ZeroDivisionError) as excinfo:
+        utils.compile_fn("1 / zero", "<second>")(dict(zero=0))
+    assert excinfo.traceback[-1].frame.code.raw.co_filename == "<second>"
+
+
+def test_exp_cache_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "Data_dir", str(tmp_path))
+    monkeypatch.setattr(utils, "Exp_cache", utils.Lru_cache(100))
+    monkeypatch.setattr(utils, "Saved_exps", set())
+    utils.prewarm_exps(dict(description="Not an expression.",
+                            steps=[dict(x="a + 1/4", y="sum(i for i in (a, 1))")]),
+                       "<test>")
+    assert len(utils.Exp_cache) == 2
+    utils.save_exp_cache()
+    monkeypatch.setattr(utils, "Exp_cache", utils.Lru_cache(100))
+    utils.load_exp_cache()
+    assert len(utils.Exp_cache) == 2
+    assert utils.make_fn("a + 1/4", "<test>")(dict(a=1)) == Fraction(5, 4)
+    assert utils.make_fn("sum(i for i in (a, 1))", "<test>")(dict(a=1)) == 2
+
+
+def test_exp_cache_file_saved_when_changed(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "Data_dir", str(tmp_path))
+    monkeypatch.setattr(utils, "Exp_cache", utils.Lru_cache(100))
+    monkeypatch.setattr(utils, "Saved_exps", set())
+    path = tmp_path / utils.Cache_dir / utils.Exp_cache_file
+    utils.prewarm_exps(["a + 1"], "<test>")
+    utils.save_exp_cache()
+    path.unlink()
+    utils.save_exp_cache()
+    assert not path.exists()
+    utils.prewarm_exps(["a + 2"], "<test>")
+    utils.save_exp_cache()
+    assert path.exists()
+
+
+def test_read_yaml_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "Data_dir", str(tmp_path))
+    yaml_file = tmp_path / "test.yaml"
+    yaml_file.write_text("a: 1\nb: [x, y]\n")
+    assert utils.read_yaml("test.yaml") == dict(a=1, b=['x', 'y'])
+    assert (tmp_path / utils.Cache_dir / "test.yaml.pickle").exists()
+    data = utils.read_yaml("test.yaml")
+    data['a'] = 2                                  # doesn't change what's cached
+    assert utils.read_yaml("test.yaml") == dict(a=1, b=['x', 'y'])
+    yaml_file.write_text("a: 3\n")
+    os.utime(yaml_file, ns=(0, 10**9))
+    assert utils.read_yaml("test.yaml") == dict(a=3)
+    os.utime(yaml_file, ns=(0, 2 * 10**9))         # same contents, new mtime
+    assert utils.read_yaml("test.yaml") == dict(a=3)
+    monkeypatch.setattr(utils, "Cache_dir", None)
+    assert utils.read_yaml("test.yaml") == dict(a=3)
+
+
+@pytest.mark.parametrize("stale_pickle", (
+    b"cno_such_module\nThing\n.",           # ImportError
+    b"cutils\nNo_such_thing\n.",            # AttributeError
+))
+def test_read_yaml_stale_cache(tmp_path, monkeypatch, stale_pickle):
+    monkeypatch.setattr(utils, "Data_dir", str(tmp_path))
+    (tmp_path / "test.yaml").write_text("a: 1\n")
+    (tmp_path / utils.Cache_dir).mkdir()
+    (tmp_path / utils.Cache_dir / "test.yaml.pickle").write_bytes(stale_pickle)
+    assert utils.read_yaml("test.yaml") == dict(a=1)
+    assert utils.read_yaml("test.yaml") == dict(a=1)
+
+
+def test_cache_dir_unwritable(tmp_path, monkeypatch):
+    # Cache_dir can't be made, since there's a file in the way
+    monkeypatch.setattr(utils, "Data_dir", str(tmp_path))
+    (tmp_path / utils.Cache_dir).write_text("not a directory")
+    (tmp_path / "test.yaml").write_text("a: 1\n")
+    assert utils.read_yaml("test.yaml") == dict(a=1)
+    monkeypatch.setattr(utils, "Exp_cache", utils.Lru_cache(100))
+    monkeypatch.setattr(utils, "Saved_exps", set())
+    utils.prewarm_exps(["a + 1"], "<test>")
+    utils.save_exp_cache()
+    assert utils.Saved_exps == set()
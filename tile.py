@@ -7,12 +7,10 @@ from PIL import Image, ImageTk
 import app
 from utils import my_eval, eval_pair, eval_color, f_to_str
 from alignment import Alignment
+from image_cache import Images
+from render import clip_image
 
 
-def erase_tiles(canvas):
-    canvas.delete("section")
-    canvas.delete("tile")
-
 def generate_tile(name, shape, args, color, image, rotation=0):
     constants = args.copy()
     if 'constants' in shape:
@@ -55,6 +53,8 @@ class Base_tile:
         self.points = points
         self.skip_x = skip_x
         self.skip_y = skip_y
+        self.float_measurements = None
+        self.source = None    # set by tiles.read_tiles
 
     def __repr__(self):
         return f"<{self.__class__.__name__}: {self.name}>"
@@ -74,6 +74,28 @@ class Base_tile:
     def flip(self):
         return None
 
+    def measurements(self, exact=True):
+        r'''Returns points, skip_x, skip_y.
+
+        If not `exact`, these are converted to floats (once, then remembered).
+        '''
+        if exact:
+            return self.points, self.skip_x, self.skip_y
+        if self.float_measurements is None:
+            self.float_measurements = (tuple((float(x), float(y)) for x, y in self.points),
+                                       float(self.skip_x), float(self.skip_y))
+        return self.float_measurements
+
+    def place_at(self, offset, angle, plan, skip):
+        r'''Returns True if the tile is visible, False otherwise.
+        '''
+        aligned_points = plan.align(self.measurements(plan.exact)[0], offset)
+        if aligned_points is None:
+            return False
+        if not skip:
+            self.draw_at(angle, aligned_points, plan)
+        return True
+
 
 class Tile(Base_tile):
     r'''Polygon tiles.  Rectangles have a clip method.
@@ -246,21 +268,17 @@ class Tile(Base_tile):
                     abs(self.skip_y / alignment.cos),
                     self.color, is_rect=self.is_rect, is_square=self.is_square)
 
-    def place_at(self, offset, angle, plan, skip):
+    def draw_at(self, angle, aligned_points, plan):
         r'''The `angle` is ignored here.  Only used for Image_tiles.
         '''
-        return plan.create_polygon(self.points, offset, self.color, skip)
+        plan.create_polygon(self, self.color, aligned_points)
 
 
 class Image_tile(Base_tile):
     def __init__(self, name, points, skip_x, skip_y, image_file, rotation):
         super().__init__(name, points, skip_x, skip_y)
         self.image_file = image_file
-        self.image = Image.open(os.path.join('images', image_file))
-        if 'A' not in self.image.getbands():
-            self.image.putalpha(255)
-        if rotation:
-            self.image = self.image.rotate(rotation, expand=True)
+        self.rotation = rotation
 
         # offset from SW corner of image to first point in self.points
         self.sw_offset = self.get_sw_offset(self.points)
@@ -269,46 +287,61 @@ class Image_tile(Base_tile):
         self.in_width = max(p[0] for p in self.points) + self.sw_offset[0]
         self.in_height = max(p[1] for p in self.points) + self.sw_offset[1]
 
-        # The scaled image is stored in self.scaled_image based on current scale
+        # The scaled and rotated images are in self.cache for the current scale
         # in app.canvas.my_scale.  We can't scale now because the app is not fully
         # initialized yet when this is run.  Also, the scale will change if the
         # user resizes the window.  So we check the scale each time we're asked
-        # to place the image, and recalc as necessary.
+        # to place the image, and get the new images from image_cache.Images, which
+        # is shared by all of the tiles (and panels) using the same image file.
         self.scale = None
 
+    def load_image(self):
+        r'''Loads the image from self.image_file.
+
+        This is put off until the tile is actually drawn, since most tiles aren't.
+        Called by image_cache.Images the first time it needs this image.
+        '''
+        print(f"Image_tile({self.name}) loading {self.image_file}")
+        image = Image.open(os.path.join('images', self.image_file))
+        if 'A' not in image.getbands():
+            image.putalpha(255)
+        if self.rotation:
+            image = image.rotate(self.rotation, expand=True)
+        return image
+
     def get_sw_offset(self, points):
         return (points[0][0] - min(p[0] for p in points),
                 points[0][1] - min(p[1] for p in points))
 
-    def get_image(self, plan, angle, new_points):
+    def get_image(self, target_angle, new_points):
         r'''Returns sw_offset, image.
 
+        The `target_angle` is the angle the tile is placed at plus the plan's alignment
+        angle.
+
         The `sw_offset` is the offset from the SW corner of the image to the first
         point in self.points.
 
-        Checks self.scale and recalcs self.scaled_image as necessary.  Also manages
-        the cache of rotated images in self.cache, which is key-ed by the rotation
-        angle and stores the rotated (sw_offset, imageTk).
+        Checks self.scale and clears self.cache as necessary.  The cache of rotated
+        images in self.cache is key-ed by the rotation angle and stores the rotated
+        (sw_offset, imageTk).
         '''
-        # first, get self.scaled_image scaled to current app scale.
+        # first, forget the images for any prior app scale.
         if app.canvas.my_scale != self.scale:
-            print(f"Image_tile({self.name}).get_image creating scaled image")
             self.scale = app.canvas.my_scale
-            self.scaled_image = \
-              self.image.resize((int(round(app.canvas.in_to_px(self.in_width))),
-                                 int(round(app.canvas.in_to_px(self.in_height)))))
+            self.px_size = (int(round(app.canvas.in_to_px(self.in_width))),
+                            int(round(app.canvas.in_to_px(self.in_height))))
             self.cache = {}
 
         # then get rotated image
-        target_angle = angle + plan.alignment.angle
         if target_angle not in self.cache:
-            print(f"Image_tile({self.name}).get_image creating rotated image "
+            print(f"Image_tile({self.name}).get_image creating image "
                   f"for angle {target_angle}")
+            rotated_image = Images.get((self.image_file, self.rotation), self.load_image,
+                                       self.px_size, target_angle)
             if target_angle == 0:
-                rotated_image = self.scaled_image
                 sw_offset = self.sw_offset
             else:
-                rotated_image = self.scaled_image.rotate(target_angle, expand=True)
                 sw_offset = self.get_sw_offset(new_points)
             print(f"get_image: sw_offset=({sw_offset[0]:.2f}, {sw_offset[1]:.2f})")
             self.cache[target_angle] = sw_offset, ImageTk.PhotoImage(rotated_image)
@@ -316,11 +349,29 @@ class Image_tile(Base_tile):
         # return rotated image
         return self.cache[target_angle]
 
-    def place_at(self, offset, angle, plan, skip):
-        new_points = plan.align(self.points, offset)
-        if new_points is None:
-            return False
-        if not skip:
-            sw_offset, image = self.get_image(plan, angle, new_points)
-            plan.create_image(image, sw_offset, new_points[0])
-        return True
+    def get_clipped_image(self, target_angle, new_points, clip):
+        r'''Returns sw_corner, image: the image cropped to `clip` (left, bottom, right,
+        top in inches), as an ImageTk.PhotoImage, and where its SW corner goes.
+
+        Returns None if none of the image is in `clip` (see render.clip_image).
+
+        These are kept in self.cache too, key-ed by (target_angle, new_points, clip),
+        so that each PhotoImage lives as long as the canvas shows it (Tk drops the
+        image when the PhotoImage is garbage collected).
+        '''
+        sw_offset, _ = self.get_image(target_angle, new_points)
+        key = target_angle, tuple(tuple(point) for point in new_points), clip
+        if key not in self.cache:
+            image = Images.get((self.image_file, self.rotation), self.load_image,
+                               self.px_size, target_angle)
+            x, y = new_points[0]
+            clipped = clip_image(image, (x - sw_offset[0], y - sw_offset[1]),
+                                 app.canvas.my_scale, clip)
+            if clipped is not None:
+                image, sw_corner = clipped
+                clipped = sw_corner, ImageTk.PhotoImage(image)
+            self.cache[key] = clipped
+        return self.cache[key]
+
+    def draw_at(self, angle, aligned_points, plan):
+        plan.create_image(self, angle, aligned_points)
@@ -1,13 +1,76 @@
 # tiles.py
 
-from utils import read_yaml, f_to_str
+from collections.abc import Mapping
+
+import app
+from utils import read_yaml, f_to_str, eval_color
 from tile import gen_tile
+from image_cache import image_signature
+
+
+def read_tiles(filename="tiles.yaml", old_tiles=None):
+    return Tiles(read_yaml(filename), old_tiles)
+
+
+class Tiles(Mapping):
+    r'''{name: tile} for all of the tiles in tiles.yaml, including flipped tiles.
+
+    Each tile (with its flipped tile) is generated the first time it's looked up, since
+    most plans only use a few of the tiles.
+
+    Tiles in `old_tiles` (a prior Tiles) are reused if nothing that they were generated
+    from has changed (see tile_source).  This saves re-opening the image files for
+    Image_tiles, and keeps their scaled images.
+    '''
+    def __init__(self, tile_specs, old_tiles=None):
+        self.specs = {}     # {name: (tile_name, specs)}, name may be a flipped tile
+        for tile_name, specs in tile_specs.items():
+            self.specs[tile_name] = tile_name, specs
+            if 'color' in specs and 'flipped' in app.Shapes[specs['shape']]:
+                self.specs[f"{tile_name}-flipped"] = tile_name, specs
+        self.tiles = {}     # {name: tile} generated so far
+        self.old_tiles = old_tiles.tiles if isinstance(old_tiles, Tiles) else {}
+
+    def __repr__(self):
+        return f"<Tiles: {len(self.tiles)} of {len(self.specs)} generated>"
+
+    def __getitem__(self, name):
+        if name not in self.tiles:
+            tile_name, specs = self.specs[name]
+            self.generate(tile_name, specs)
+        return self.tiles[name]
+
+    def __contains__(self, name):
+        return name in self.specs
+
+    def __iter__(self):
+        return iter(self.specs)
+
+    def __len__(self):
+        return len(self.specs)
+
+    def generate(self, tile_name, specs):
+        source = tile_source(specs)
+        old_tile = self.old_tiles.get(tile_name)
+        if old_tile is not None and old_tile.source == source:
+            self.tiles[tile_name] = old_tile
+            if hasattr(old_tile, 'flipped'):
+                self.tiles[old_tile.flipped.name] = old_tile.flipped
+        else:
+            for name, tile in gen_tile(tile_name, specs):
+                self.tiles[name] = tile
+            self.tiles[tile_name].source = source
 
 
-def read_tiles(filename="tiles.yaml"):
-    return {name: tile
-            for tile_name, specs in read_yaml(filename).items()
-            for name, tile in gen_tile(tile_name, specs)}
+def tile_source(specs):
+    r'''Everything that a tile is generated from: its specs, its shape (and the shape
+    of its flipped tile), its color and its image file.
+    '''
+    shape = app.Shapes[specs['shape']]
+    flipped_shape = shape.get('flipped', {}).get('shape')
+    image = specs.get('image')
+    return (specs, shape, app.Shapes.get(flipped_shape), eval_color(specs.get('color')),
+            None if image is None else image_signature(image))
 
 
 
@@ -2,14 +2,25 @@
 
 import re
 import os
+import ast
+import builtins
+import marshal
+import pickle
+import hashlib
+from types import CodeType
+from importlib.util import MAGIC_NUMBER
 import os.path
 from fractions import Fraction
 from math import sqrt
-from collections import ChainMap
+from collections import ChainMap, OrderedDict, namedtuple
 from collections.abc import Mapping
 import csv
 
-from yaml import safe_load, dump
+from yaml import load, dump
+try:
+    from yaml import CSafeLoader as Yaml_loader
+except ImportError:
+    from yaml import SafeLoader as Yaml_loader
 
 
 Code_dir = os.path.dirname(__file__)
@@ -80,13 +91,186 @@ def format(x):
     return x
 
 
-Exp_cache = {}
+class Lru_cache:
+    r'''A dict limited to `max_size` entries, dropping the least recently used entry
+    when it gets too big.
 
-def compile_exp(exp_source, location):
+    Counts hits and misses.
+    '''
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = self.misses = 0
+
+    def __repr__(self):
+        return f"<Lru_cache: {len(self.entries)}/{self.max_size} entries, " \
+               f"{self.hits} hits, {self.misses} misses>"
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, make_value):
+        r'''Returns the value for `key`, calling make_value() to create it if necessary.
+        '''
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            value = make_value()
+            self.put(key, value)
+            return value
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def items(self):
+        return self.entries.items()
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+
+# The parts of a compiled expression:
+#
+#   code         - to eval the expression with the constants as locals
+#   global_names - names in the expression found in the globals here
+#   params       - the other names in the expression (except for 'constants')
+#   lambda_code  - for a lambda taking params + ('constants',) and returning the
+#                  expression, None if the expression binds names of its own
+Compiled_exp = namedtuple('Compiled_exp', 'code global_names params lambda_code')
+
+Exp_cache = Lru_cache(4000)    # {exp_source: Compiled_exp}
+Fn_cache = Lru_cache(8000)     # {(exp_source, location): fn(constants)}
+
+# Directory under Data_dir for caches kept between runs, None to not keep them.
+Cache_dir = '.cache'
+Exp_cache_file = 'expressions.marshal'
+Saved_exps = set()    # the exp_sources in Exp_cache_file, as of the last save or load
+
+
+def get_compiled_exp(exp_source, location):
     exp_source = str(exp_source)
-    if exp_source not in Exp_cache:
-        Exp_cache[exp_source] = compile(convert_exp(exp_source), location, 'eval')
-    return Exp_cache[exp_source]
+    return Exp_cache.get(exp_source, lambda: compile_parts(exp_source, location))
+
+
+def compile_parts(exp_source, location):
+    converted_exp = convert_exp(exp_source)
+    code = compile(converted_exp, location, 'eval')
+    names = []
+    for node in ast.walk(ast.parse(converted_exp, mode='eval')):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            if node.id not in names:
+                names.append(node.id)
+        elif isinstance(node, (ast.Name, ast.arg, ast.comprehension)):
+            # binds names of its own
+            return Compiled_exp(code, (), (), None)
+    global_names, params = split_names(names)
+    lambda_code = compile(f"lambda {', '.join(params + ('constants',))}: ({converted_exp})",
+                          location, 'eval')
+    return Compiled_exp(code, global_names, params, lambda_code)
+
+
+def split_names(names):
+    r'''Returns global_names, params (see Compiled_exp).
+    '''
+    global_names = tuple(name for name in names
+                         if name in globals() or hasattr(builtins, name))
+    params = tuple(name for name in names
+                   if name not in global_names and name != 'constants')
+    return global_names, params
+
+
+def relocate(code, location):
+    r'''Returns `code` (and the code nested in it) with `location` as its filename.
+
+    So that errors report where the expression is, even though it was compiled for
+    someplace else with the same expression.
+    '''
+    if code.co_filename == location:
+        return code
+    return code.replace(co_filename=location,
+                        co_consts=tuple(relocate(c, location) if isinstance(c, CodeType)
+                                                              else c
+                                        for c in code.co_consts))
+
+
+def compile_exp(exp_source, location):
+    return relocate(get_compiled_exp(exp_source, location).code, location)
+
+
+def prewarm_exps(data, location):
+    r'''Compiles all of the expressions in `data` (from a yaml file) into Exp_cache.
+
+    Strings that aren't expressions (e.g., descriptions) are skipped.
+    '''
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key != 'description':
+                prewarm_exps(value, location)
+    elif isinstance(data, (tuple, list)):
+        for value in data:
+            prewarm_exps(value, location)
+    elif isinstance(data, str) and data not in Exp_cache:
+        try:
+            get_compiled_exp(data, location)
+        except (SyntaxError, ValueError):
+            pass
+
+
+def save_exp_cache():
+    r'''Saves the compiled expressions in Exp_cache to Exp_cache_file in Cache_dir.
+
+    Does nothing unless Exp_cache has gained expressions since the last save or load,
+    or if Cache_dir can't be written to.
+    '''
+    global Saved_exps
+    if Cache_dir is None or Exp_cache.entries.keys() <= Saved_exps:
+        return
+    entries = {exp_source: tuple(exp) for exp_source, exp in Exp_cache.items()}
+    path = os.path.join(Data_dir, Cache_dir, Exp_cache_file)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as cache_file:
+            marshal.dump((MAGIC_NUMBER, entries), cache_file)
+        os.replace(path + '.tmp', path)
+    except OSError:
+        # can't write to Cache_dir, so just don't save them
+        return
+    Saved_exps = set(entries)
+
+
+def load_exp_cache():
+    r'''Loads the compiled expressions saved by save_exp_cache into Exp_cache.
+
+    Does nothing if they were saved by a different version of Python.
+    '''
+    global Saved_exps
+    if Cache_dir is None:
+        return
+    try:
+        with open(os.path.join(Data_dir, Cache_dir, Exp_cache_file), 'rb') as cache_file:
+            magic, entries = marshal.load(cache_file)
+    except (OSError, EOFError, ValueError, TypeError):
+        return
+    if magic != MAGIC_NUMBER:
+        return
+    Saved_exps = set()
+    for exp_source, parts in entries.items():
+        exp = Compiled_exp(*parts)
+        if exp.lambda_code is None or \
+           split_names(exp.global_names + exp.params) == (exp.global_names, exp.params):
+            Exp_cache.put(exp_source, exp)
+            Saved_exps.add(exp_source)
 
 
 def convert_exp(exp_source):
@@ -145,12 +329,75 @@ def my_eval(s, constants, location):
     elif not isinstance(s, str):
         ans = s
     else:
-        temp_constants = ChainMap(dict(constants=constants), constants)
-        ans = eval(compile_exp(s, location), globals(), temp_constants)
+        ans = compile_fn(s, location)(constants)
     #print(f"my_eval({s=}, {location=}) -> {ans}")
     return ans
 
 
+def compile_value(s, location):
+    r'''Returns a fn(constants) that does the same thing as my_eval(s, constants, location).
+
+    The expressions in `s` are compiled once here, rather than each time the fn is called.
+    '''
+    if isinstance(s, (tuple, list)):
+        fns = tuple(compile_value(x, location) for x in s)
+        container = type(s)
+        return lambda constants: container(fn(constants) for fn in fns)
+    if not isinstance(s, str):
+        return lambda constants: s
+    return compile_fn(s, location)
+
+
+def compile_fn(exp_source, location):
+    r'''Returns a fn(constants) that evaluates `exp_source` with `constants`.
+
+    The expression is compiled into a Python function taking the names it uses as
+    parameters, so each name is looked up in `constants` once per call and then used
+    as a local variable.  Names that aren't in `constants` are looked up in the
+    globals here (e.g., Fraction, sqrt).
+
+    This is done with eval when that won't work (a constant hides one of the globals,
+    a name isn't defined, or the expression binds names of its own).
+    '''
+    exp_source = str(exp_source)
+    return Fn_cache.get((exp_source, location), lambda: make_fn(exp_source, location))
+
+
+def make_fn(exp_source, location):
+    exp = get_compiled_exp(exp_source, location)
+    code = relocate(exp.code, location)
+    def slow_fn(constants):
+        return eval(code, globals(), ChainMap(dict(constants=constants), constants))
+    if exp.lambda_code is None:
+        return slow_fn
+
+    global_names, params = exp.global_names, exp.params
+    fast_fn = eval(relocate(exp.lambda_code, location), globals())
+
+    def eval_exp(constants):
+        for name in global_names:
+            if name in constants:
+                return slow_fn(constants)
+        try:
+            args = [constants[name] for name in params]
+        except KeyError:
+            return slow_fn(constants)
+        return fast_fn(*args, constants)
+    return eval_exp
+
+
+def child_constants(constants, new_constants=None):
+    r'''Returns a new ChainMap of `new_constants` (default {}) in front of `constants`.
+
+    If `constants` is already a ChainMap, its maps are added to the new ChainMap
+    directly (ChainMap.new_child), rather than nesting one ChainMap inside another.
+    This keeps name lookups from getting slower with each level of steps.
+    '''
+    if isinstance(constants, ChainMap):
+        return constants.new_child(new_constants)
+    return ChainMap({} if new_constants is None else new_constants, constants)
+
+
 def eval_pair(s, constants, location, relaxed=False):
     if relaxed and not isinstance(s, (tuple, list)):
         return my_eval(s, constants, location)
@@ -179,7 +426,7 @@ def eval_tile(s, constants):
         return [eval_tile(x, constants) for x in s]
     if '.' in s:
         attrs = s.split('.')
-        temp_constants = ChainMap({}, constants)
+        temp_constants = child_constants(constants)
         temp_s = s
         if attrs[0] not in constants:
             temp_constants['_placeholder_'] = app.Tiles[attrs[0]]
@@ -197,6 +444,40 @@ def eval_tile(s, constants):
     return ans
 
 
+def compile_tile(s, location):
+    r'''Returns a fn(constants) that does the same thing as eval_tile(s, constants).
+    '''
+    if s is None:
+        return lambda constants: None
+    if isinstance(s, (tuple, list)):
+        fns = tuple(compile_tile(x, location) for x in s)
+        return lambda constants: [fn(constants) for fn in fns]
+    if '.' in s:
+        # Tile names may have '.'s in them, so these are only compiled when needed.
+        attrs = s.split('.')
+        exps = {}
+        def get_exp(exp_source):
+            if exp_source not in exps:
+                exps[exp_source] = compile_value(exp_source, location)
+            return exps[exp_source]
+        def get_tile(constants):
+            if attrs[0] in constants:
+                ans = get_exp(s)(constants)
+            else:
+                ans = get_exp('_placeholder_.' + '.'.join(attrs[1:]))(
+                        child_constants(constants, dict(_placeholder_=app.Tiles[attrs[0]])))
+            if isinstance(ans, str):
+                ans = app.Tiles[ans]
+            return ans
+        return get_tile
+    def get_tile(constants):
+        ans = constants[s] if s in constants else s
+        if isinstance(ans, str):
+            ans = app.Tiles[ans]
+        return ans
+    return get_tile
+
+
 def multi_getattr(value, attr):
     if not isinstance(value, (tuple, list)):
         return getattr(value, attr)
@@ -206,7 +487,7 @@ def multi_getattr(value, attr):
     return ans
 
 
-def pick(value, constants, selector=None, reverse=False):
+def pick(value, constants, selector=None, reverse=False, trace=()):
     r'''Picks a value out of `value` list round robin based on 'index' in `constants`.
 
     If 'index_by_counter' is in `constants`, uses app.Counters[constants['index_by_counter'], selector].
@@ -220,16 +501,19 @@ def pick(value, constants, selector=None, reverse=False):
         if reverse and key not in app.Counters:
             app.Counters[key] = len(value) - 1
         ans = value[app.Counters[key] % len(value)]
-        print(f"pick({value}, , {selector=}, {reverse=}) got index_by_counter {key}, index {app.Counters[key]}, ans {ans}")
+        if 'pick' in trace:
+            print(f"pick({value}, , {selector=}, {reverse=}) got index_by_counter {key}, index {app.Counters[key]}, ans {ans}")
         if reverse:
             app.Counters[key] -= 1
         else:
             app.Counters[key] += 1
         return ans
+    if len(value) == 1:
+        return value[0]
     return value[constants.get('index', 0) % len(value)]
 
 
-def unpick(constants, selector=None, reverse=False):
+def unpick(constants, selector=None, reverse=False, trace=()):
     r'''Reverses a pick if it was 'index_by_counter'.
     '''
     if 'index_by_counter' in constants:
@@ -238,12 +522,59 @@ def unpick(constants, selector=None, reverse=False):
             app.Counters[key] += 1
         else:
             app.Counters[key] -= 1
-        print(f"unpick(, {selector=}, {reverse=}) got index_by_counter {key}, index {app.Counters[key]}")
+        if 'pick' in trace:
+            print(f"unpick(, {selector=}, {reverse=}) got index_by_counter {key}, index {app.Counters[key]}")
+
+
+def file_signature(path):
+    r'''Returns (mtime_ns, size) of the file at `path`, or None if there isn't one.
+
+    This changes when the file is changed.
+    '''
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
 
 
 def read_yaml(filename):
-    with open(os.path.join(Data_dir, filename), "r") as yaml_file:
-        return safe_load(yaml_file)
+    r'''Reads `filename` in Data_dir.
+
+    The parsed data is also pickled into Cache_dir, along with the file's mtime, size
+    and sha256 hash.  The next read uses the pickle if the file hasn't changed.  If
+    the pickle can't be read or written, the file is just parsed.
+    '''
+    path = os.path.join(Data_dir, filename)
+    if Cache_dir is None:
+        with open(path, "rb") as yaml_file:
+            return load(yaml_file, Loader=Yaml_loader)
+    cache_path = os.path.join(Data_dir, Cache_dir, filename + '.pickle')
+    stat = os.stat(path)
+    try:
+        with open(cache_path, "rb") as cache_file:
+            mtime, size, sha256, data = pickle.load(cache_file)
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError,
+            AttributeError, ImportError):
+        # no pickle, or it's from older code
+        mtime = size = sha256 = None
+    if (mtime, size) == (stat.st_mtime_ns, stat.st_size):
+        return data
+    with open(path, "rb") as yaml_file:
+        source = yaml_file.read()
+    new_sha256 = hashlib.sha256(source).hexdigest()
+    if new_sha256 != sha256:
+        data = load(source, Loader=Yaml_loader)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path + '.tmp', "wb") as cache_file:
+            pickle.dump((stat.st_mtime_ns, stat.st_size, new_sha256, data), cache_file,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(cache_path + '.tmp', cache_path)
+    except OSError:
+        # can't write to Cache_dir, so just don't cache it
+        pass
+    return data
 
 
 def write_yaml(data, filename):
@@ -1,20 +1,34 @@
 # walls.py
 
 import os.path
+from copy import deepcopy
+from math import cos, sin, pi
 from PIL import Image, ImageTk
 
 import app
 from utils import read_yaml, my_eval, eval_pair, eval_color, f_to_str
+from image_cache import Images, image_signature
 
 
-def read_walls(colors=None, filename='walls.yaml'):
-    return {name: Wall(name, specs, colors)
-            for name, specs in read_yaml(filename).items()}
+def read_walls(colors=None, filename='walls.yaml', old_walls=None):
+    r'''Walls in `old_walls` (from a prior read_walls with the same colors) are reused
+    if their specs (and the image files of their Image_panels) haven't changed.
+    '''
+    walls = {}
+    for name, specs in read_yaml(filename).items():
+        old_wall = None if old_walls is None else old_walls.get(name)
+        if old_wall is not None and old_wall.specs == specs and \
+           old_wall.image_signatures == old_wall.get_image_signatures():
+            walls[name] = old_wall
+        else:
+            walls[name] = Wall(name, specs, colors)
+    return walls
 
 
 class Wall:
     def __init__(self, name, specs, colors):
         self.name = name
+        self.specs = deepcopy(specs)   # specs is changed below
         self.constants = {}
         if 'constants' in specs:
             for name, exp in specs['constants'].items():
@@ -39,6 +53,14 @@ class Wall:
             return Circle_panel(name, pos, size, color, skip)
 
         self.panels = {name: create_panel(name, panel) for name, panel in specs.items()}
+        self.panel_index = Panel_index(self.panels.values())
+        self.image_signatures = self.get_image_signatures()
+
+    def get_image_signatures(self):
+        r'''Returns {image file: image_cache.image_signature} for the wall's Image_panels.
+        '''
+        return {panel.image_file: image_signature(panel.image_file)
+                for panel in self.panels.values() if isinstance(panel, Image_panel)}
 
     def grout_bg(self):
         width_in, height_in = self.grout
@@ -46,32 +68,68 @@ class Wall:
         app.canvas.create_my_rectangle("grout_bg", 0, 0, width_in, height_in, 'black',
                                        ("background", "grout"))
         app.canvas.current_grout_color = 'black'
-        bg_color = app.canvas.cget('background')
-
-        # clip above grout background, across entire canvas
-        if app.canvas.my_height > app.canvas.in_to_px(height_in):
-            app.canvas.create_my_rectangle(
-              "grout clip above", 0, height_in,
-              app.canvas.px_to_in(app.canvas.my_width),
-              app.canvas.px_to_in(app.canvas.my_height) - height_in,
-              bg_color, ("background", "topmost"))
-
-        # clip to the right of grout background
-        if app.canvas.my_width > app.canvas.in_to_px(width_in):
-            app.canvas.create_my_rectangle(
-              "grout clip right", width_in, 0,
-              app.canvas.px_to_in(app.canvas.my_width) - width_in, height_in,
-              bg_color, ("background", "topmost"))
+        app.canvas.clip_to_wall(width_in, height_in)
 
     def create(self):
-        app.canvas.delete("all")
+        app.canvas.erase_all()
         self.grout_bg()
         for p in self.panels.values():
             p.create()
 
 
+class Panel_index:
+    r'''A grid of the opaque panels on a wall, to quickly find whether a tile is
+    completely hidden behind one of them.
+
+    Each cell_size x cell_size cell of the grid lists the panels that overlap it.  A
+    panel covering a tile has to cover the tile's first point, so only the panels in
+    that point's cell need to be checked.
+    '''
+    cell_size = 12   # inches
+
+    def __init__(self, panels):
+        self.cells = {}     # {(col, row): [panel]}
+        for panel in panels:
+            if panel.opaque and not panel.skip:
+                for col in range(self.cell(panel.left), self.cell(panel.right) + 1):
+                    for row in range(self.cell(panel.bottom), self.cell(panel.top) + 1):
+                        self.cells.setdefault((col, row), []).append(panel)
+
+    def cell(self, coord):
+        return int(coord // self.cell_size)
+
+    def covers(self, points):
+        r'''True if some panel completely covers the polygon with these `points`.
+        '''
+        x, y = points[0]
+        for panel in self.cells.get((self.cell(x), self.cell(y)), ()):
+            if panel.covers(points):
+                return True
+        return False
+
+    def overlapping(self, points):
+        r'''Returns the panels that might overlap the polygon with these `points`.
+
+        These are the panels whose bounding box overlaps the polygon's.
+        '''
+        left = min(x for x, _ in points)
+        right = max(x for x, _ in points)
+        bottom = min(y for _, y in points)
+        top = max(y for _, y in points)
+        panels = []
+        for col in range(self.cell(left), self.cell(right) + 1):
+            for row in range(self.cell(bottom), self.cell(top) + 1):
+                for panel in self.cells.get((col, row), ()):
+                    if panel not in panels and \
+                       panel.left < right and left < panel.right and \
+                       panel.bottom < top and bottom < panel.top:
+                        panels.append(panel)
+        return panels
+
+
 class Panel:
     tags = "background", "topmost"
+    opaque = False      # True if tiles behind it can't be seen
 
     def __init__(self, name, pos, skip):
         self.name = name
@@ -80,6 +138,8 @@ class Panel:
 
 
 class Rect_panel(Panel):
+    opaque = True
+
     def __init__(self, name, pos, size, color, skip):
         super().__init__(name, pos, skip)
         self.size = size
@@ -94,6 +154,16 @@ class Rect_panel(Panel):
         return f"<Rect_panel({self.name}), pos: {f_to_str(self.pos)}, " \
                f"size: {f_to_str(self.size)}, color: {self.color}>"
 
+    def covers(self, points):
+        return all(self.left <= x <= self.right and self.bottom <= y <= self.top
+                   for x, y in points)
+
+    def outline(self):
+        r'''The points around the panel, counterclockwise.
+        '''
+        return [(self.left, self.bottom), (self.right, self.bottom),
+                (self.right, self.top), (self.left, self.top)]
+
     def create(self):
         if not self.skip:
             app.canvas.create_my_rectangle("wall",
@@ -103,6 +173,8 @@ class Rect_panel(Panel):
 
 
 class Circle_panel(Panel):
+    opaque = True
+
     def __init__(self, name, pos, diameter, color, skip):
         super().__init__(name, pos, skip)
         self.diameter = diameter
@@ -116,6 +188,23 @@ class Circle_panel(Panel):
         return f"<Circle_panel({self.name}), pos: {f_to_str(self.pos)}, " \
                f"diameter: {f_to_str(self.diameter)}, color: {self.color}>"
 
+    def covers(self, points):
+        r'''Since the circle is convex, it covers the polygon if it covers its points.
+        '''
+        x0, y0 = self.pos
+        r2 = (self.diameter / 2)**2
+        return all((x - x0)**2 + (y - y0)**2 <= r2 for x, y in points)
+
+    def outline(self, sides=64):
+        r'''The points around the panel, counterclockwise.
+
+        This is a polygon with `sides` sides, with its points on the circle.
+        '''
+        x0, y0 = self.pos
+        r = float(self.diameter) / 2
+        return [(x0 + r * cos(2 * pi * i / sides), y0 + r * sin(2 * pi * i / sides))
+                for i in range(sides)]
+
     def create(self):
         if not self.skip:
             app.canvas.create_my_circle("wall", self.color, self.pos, self.diameter,
@@ -127,7 +216,6 @@ class Image_panel(Panel):
         super().__init__(name, pos, skip)
         self.size = size
         self.image_file = image
-        self.image = Image.open(os.path.join('images', self.image_file))
         self.scale = None
         self.left = pos[0]
         self.bottom = pos[1]
@@ -138,16 +226,22 @@ class Image_panel(Panel):
         return f"<Image_panel({self.name}), pos: {f_to_str(self.pos)}, " \
                f"size: {f_to_str(self.size)}, image: {self.image_file}>"
 
+    def get_image(self, scale):
+        r'''Returns the image as an ImageTk.PhotoImage scaled to `scale` (pixels/inch).
+        '''
+        if scale != self.scale:
+            size = int(round(self.size[0] * scale)), int(round(self.size[1] * scale))
+            self.scaled_image = ImageTk.PhotoImage(
+                                  Images.get((self.image_file,), self.load_image, size))
+            self.scale = scale
+        return self.scaled_image
+
+    def load_image(self):
+        return Image.open(os.path.join('images', self.image_file))
+
     def create(self):
         if not self.skip:
-            if app.canvas.my_scale != self.scale:
-                px_width = app.canvas.in_to_px(self.size[0])
-                px_height = app.canvas.in_to_px(self.size[1])
-                self.scaled_image = ImageTk.PhotoImage(
-                                      self.image.resize((int(round(px_width)),
-                                                         int(round(px_height)))))
-                self.scale = app.canvas.my_scale
-            app.canvas.create_my_image("wall", self.scaled_image, (0, 0), self.pos, self.tags)
+            app.canvas.create_panel_image("wall", self, self.tags)
 
 
 